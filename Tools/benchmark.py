@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+# Benchmarks the reader and the compilers over the corpus and synthetic stress songs
+# (see pyralala/bench.py):
+#
+#   benchmark.py                      all of Lieder/, and the stress songs
+#   benchmark.py --save-baseline      store the results as baseline
+#   benchmark.py --profile bench.prof profile the timed runs (view with snakeviz or pstats)
+#
+# If a baseline exists (.cache/benchmark.json), stages whose throughput, p90
+# or peak memory got worse by more than the tolerance are reported and the
+# exit code is 1.
+
+import argparse
+import cProfile
+import glob
+import json
+import os
+import pstats
+import sys
+import tempfile
+
+from pyralala.bench import compare, run_suite, stress_songs
+from pyralala.export import FORMATS
+
+
+def read_songs(paths):
+    songs = []
+    for path in paths:
+        with open(path, "r") as song_file:
+            songs.append((path, song_file.read()))
+    return songs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the song reader and compilers.")
+    parser.add_argument("songs", nargs="*", help="Song files (default: Lieder/*.tex).")
+    parser.add_argument("-s", "--suite", action="append", choices=["corpus", "stress"],
+                        help="Suites to run (default: both).")
+    parser.add_argument("-f", "--format", action="append", choices=sorted(FORMATS),
+                        help="Compilers to benchmark (default: all).")
+    parser.add_argument("-n", "--repeat", type=int, default=3,
+                        help="Runs per song, the fastest counts.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory run.")
+    parser.add_argument("--profile", metavar="FILE", help="Write cProfile data of the timed runs.")
+    parser.add_argument("--baseline", default=".cache/benchmark.json", help="Baseline file.")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store the results as new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Relative slowdown reported as regression.")
+    args = parser.parse_args()
+
+    formats = args.format or sorted(FORMATS)
+    profile = cProfile.Profile() if args.profile else None
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        suites = {
+            "corpus": lambda: read_songs(sorted(args.songs or glob.glob("Lieder/*.tex"))),
+            "stress": lambda: stress_songs(tmp),
+        }
+        for suite in args.suite or ["corpus", "stress"]:
+            results[suite] = run_suite(suites[suite](), formats, args.repeat,
+                                       not args.no_memory, profile)
+
+    print("{:<8} {:<9} {:>6} {:>6} {:>10} {:>8} {:>8} {:>8} {:>9}".format(
+        "suite", "stage", "songs", "errors", "songs/s", "p50 ms", "p90 ms", "p99 ms", "peak kB"))
+    for suite, stages in results.items():
+        for stage, summary in stages.items():
+            if summary["songs"] == 0:
+                print("{:<8} {:<9} {:>6} {:>6}".format(suite, stage, 0, summary["errors"]))
+                continue
+            print("{:<8} {:<9} {:>6} {:>6} {:>10} {:>8.2f} {:>8.2f} {:>8.2f} {:>9.0f}".format(
+                suite, stage, summary["songs"], summary["errors"], summary["throughput"],
+                summary["p50"], summary["p90"], summary["p99"], summary["peak_kb"]))
+
+    if profile is not None:
+        profile.dump_stats(args.profile)
+        pstats.Stats(profile, stream=sys.stderr).sort_stats("cumulative").print_stats(20)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=1)
+        return
+    try:
+        with open(args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    for message in regressions:
+        print("regression: " + message, file=sys.stderr)
+    if len(regressions) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# Summarizes the telemetry of the last build (written by build.py) into a JSON report
+# and compares it with the previous report:
+#
+#   make Ausgaben/PfadiralalaIV.pdf && Tools/build-report.py
+#
+# The report lists per target the wall time, cache hit or miss, exit status,
+# pages, pdflatex passes, TeX memory usage and overfull boxes per song. Targets
+# that became slower (beyond --slowdown) or changed their page count are listed
+# as regressions. The telemetry file is emptied, so the next build starts a new
+# report; the previous report is kept next to the new one.
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+
+def read_telemetry(path):
+    entries = []
+    try:
+        with open(path, "r") as telemetry_file:
+            for line in telemetry_file:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue  # line of an interrupted build
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def summarize(entries):
+    targets, passes = {}, {}
+    for entry in sorted(entries, key=lambda e: e["start"]):
+        target = targets.setdefault(entry["target"], {"wall": 0.0, "runs": 0})
+        target["wall"] = round(target["wall"] + entry["wall"], 3)
+        target["runs"] += 1
+        target["cache"] = entry["cache"]
+        target["status"] = entry["status"]
+        log = entry.get("log")
+        if log is not None:
+            target.update(pages=log["pages"], rerun=log["rerun"], memory=log["memory"],
+                          overfull=log["overfull"], errors=log["errors"])
+        if entry.get("jobname") is not None and entry["cache"] == "miss":
+            passes[entry["jobname"]] = passes.get(entry["jobname"], 0) + 1
+    for target in targets.values():
+        target["passes"] = 0
+    for entry in entries:
+        if entry.get("jobname") in passes:
+            targets[entry["target"]]["passes"] = passes[entry["jobname"]]
+    return {
+        "created": time.time(),
+        "wall": round(sum(e["wall"] for e in entries), 3),
+        "hits": sum(1 for e in entries if e["cache"] == "hit"),
+        "misses": sum(1 for e in entries if e["cache"] == "miss"),
+        "failed": sorted(t for t, e in targets.items() if e["status"] != 0),
+        "targets": targets,
+    }
+
+
+def regressions(report, previous, slowdown, min_seconds):
+    """Messages for targets that got slower or changed their page count."""
+    found = []
+    for name, target in sorted(report["targets"].items()):
+        old = previous["targets"].get(name)
+        if old is None:
+            continue
+        if target["cache"] == "miss" and old["cache"] == "miss" and \
+                target["wall"] - old["wall"] > max(slowdown * old["wall"], min_seconds):
+            found.append("{}: {:.1f}s instead of {:.1f}s".format(name, target["wall"], old["wall"]))
+        if target.get("pages") is not None and old.get("pages") is not None and \
+                target["pages"] != old["pages"]:
+            found.append("{}: {} pages instead of {}".format(name, target["pages"], old["pages"]))
+        new_boxes = set(target.get("overfull", {})) - set(old.get("overfull", {}))
+        if "overfull" in old and len(new_boxes) > 0:
+            found.append("{}: new overfull boxes in {}".format(name, ", ".join(sorted(new_boxes))))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the build telemetry.")
+    parser.add_argument("--telemetry", default=".cache/build-telemetry.jsonl",
+                        help="Telemetry written by build.py.")
+    parser.add_argument("-o", "--out", default=".cache/build-report.json", help="Report file.")
+    parser.add_argument("--previous", help="Report to compare with (default: the last report).")
+    parser.add_argument("--slowdown", type=float, default=0.2,
+                        help="Relative slowdown of a target reported as regression.")
+    parser.add_argument("--min-seconds", type=float, default=2.0,
+                        help="Slowdowns below this are not reported.")
+    parser.add_argument("--keep", action="store_true", help="Do not empty the telemetry file.")
+    parser.add_argument("--strict", action="store_true",
+                        help="Exit with 1 if there are regressions or failed targets.")
+    args = parser.parse_args()
+
+    entries = read_telemetry(args.telemetry)
+    if len(entries) == 0:
+        print("no telemetry in {}".format(args.telemetry), file=sys.stderr)
+        sys.exit(1)
+    report = summarize(entries)
+
+    previous_path = args.previous
+    if previous_path is None and os.path.exists(args.out):
+        previous_path = os.path.splitext(args.out)[0] + ".previous.json"
+        shutil.copyfile(args.out, previous_path)
+    previous = None
+    if previous_path is not None:
+        with open(previous_path, "r") as previous_file:
+            previous = json.load(previous_file)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as out_file:
+        json.dump(report, out_file, indent=1, sort_keys=True)
+    if not args.keep:
+        open(args.telemetry, "w").close()
+
+    for name, target in sorted(report["targets"].items()):
+        boxes = sum(count for count, _ in target.get("overfull", {}).values())
+        print("{:>8.1f}s  {:<4}  {:>4}  {:>4}  {:>3} overfull  {}{}".format(
+            target["wall"], target["cache"], target.get("pages") or "-", target["passes"] or "-",
+            boxes, name, "" if target["status"] == 0 else "  FAILED ({})".format(target["status"])))
+    print("{:.1f}s, {} cached, {} built, {} failed".format(
+        report["wall"], report["hits"], report["misses"], len(report["failed"])))
+
+    found = regressions(report, previous, args.slowdown, args.min_seconds) if previous else []
+    for message in found:
+        print("regression: " + message, file=sys.stderr)
+    if args.strict and (len(found) > 0 or len(report["failed"]) > 0):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+# Builds the Complete Edition in alphabetical shards, which are compiled concurrently.
+#
+# 1. every shard is compiled once to learn its page count,
+# 2. the merged index is compiled into the table of contents (front matter),
+# 3. every shard is compiled again, starting at its final page number,
+# 4. the shard indexes are merged into the global index and the front matter is
+#    compiled with it,
+# 5. if a shard or the front matter changed its page count (e.g. by starting on
+#    a page of the other parity), steps 3 and 4 are repeated until the counts
+#    are stable; then all PDFs are concatenated into one book.
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from buildtools.latex import BuildError, pdflatex, songidx, page_count, merge_pdfs
+from buildtools.sxd import IndexData
+
+GENERATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generate_songbook.sh")
+# passes with the final page numbers before giving up
+MAX_PASSES = 4
+
+
+def chunks(songs, n):
+    """Split the (sorted) list of songs into n contiguous, similar sized chunks."""
+    n = max(1, min(n, len(songs)))
+    size, rest = divmod(len(songs), n)
+    start = 0
+    for i in range(n):
+        end = start + size + (1 if i < rest else 0)
+        yield songs[start:end]
+        start = end
+
+
+def generate(tex_path, options, songs=()):
+    with open(tex_path, "w") as tex_file:
+        subprocess.run(["bash", GENERATOR] + options + list(songs),
+                       stdout=tex_file, check=True)
+
+
+class Shard(object):
+    def __init__(self, workdir, number, songs):
+        self.jobname = os.path.join(workdir, "shard{:02d}".format(number))
+        self.songs = songs
+        self.pages = 0
+
+    def compile(self, first_page):
+        generate(self.jobname + ".tex",
+                 ["-s", "-i", self.jobname, "-p", str(first_page)], self.songs)
+        pdflatex(self.jobname + ".tex", self.jobname)
+        self.pages = page_count(self.jobname)
+        return self
+
+
+def build_index(shards, sbx_path):
+    index = IndexData()
+    for shard in shards:
+        shard_index = IndexData.read(shard.jobname + ".sxd")
+        # hyperlink names are only unique within a single shard
+        for entry in shard_index.entries:
+            entry.link = ""
+        index.extend(shard_index)
+    return songidx(index.dumps(), sbx_path)
+
+
+def build_front(workdir):
+    jobname = os.path.join(workdir, "front")
+    generate(jobname + ".tex", ["-t", "-i", os.path.join(workdir, "CompleteEdition")])
+    pdflatex(jobname + ".tex", jobname)
+    return jobname, page_count(jobname)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the Complete Edition from concurrently compiled alphabetical shards.")
+    parser.add_argument("songs", nargs="*", help="Song files (default: Lieder/*.tex).")
+    parser.add_argument("-o", "--out", default="Ausgaben/CompleteEdition.pdf",
+                        help="Output file path.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of concurrent pdflatex runs.")
+    parser.add_argument("-n", "--shards", type=int,
+                        help="Number of shards (default: number of jobs).")
+    parser.add_argument("-w", "--workdir", default="Ausgaben/CompleteEdition-shards",
+                        help="Directory for intermediate files.")
+    args = parser.parse_args()
+
+    songs = sorted(args.songs or glob.glob("Lieder/*.tex"))
+    os.makedirs(args.workdir, exist_ok=True)
+    shards = [Shard(args.workdir, i, c)
+              for i, c in enumerate(chunks(songs, args.shards or args.jobs))]
+    sbx_path = os.path.join(args.workdir, "CompleteEdition.sbx")
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        # first pass: page counts of the shards and length of the table of contents
+        list(pool.map(lambda s: s.compile(1), shards))
+        build_index(shards, sbx_path)
+        front, front_pages = build_front(args.workdir)
+
+        # further passes with the final page numbers, until the page counts are stable
+        for _ in range(MAX_PASSES):
+            counts = [shard.pages for shard in shards]
+            first_pages = []
+            page = front_pages + 1
+            for shard in shards:
+                first_pages.append(page)
+                page += shard.pages
+            list(pool.map(lambda s: s[0].compile(s[1]), zip(shards, first_pages)))
+            build_index(shards, sbx_path)
+            front, pages = build_front(args.workdir)
+            if pages == front_pages and [shard.pages for shard in shards] == counts:
+                break
+            front_pages = pages
+        else:
+            raise BuildError("Page counts still changing after {} passes".format(MAX_PASSES))
+
+    merge_pdfs([front + ".pdf"] + [s.jobname + ".pdf" for s in shards], args.out)
+    print("Built {} from {} shards, {} pages.".format(
+        args.out, len(shards), page - 1))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (BuildError, subprocess.CalledProcessError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# Runs a build command unless its outputs can be restored from the artifact cache:
+#
+#   build.py -o Ausgaben/PfadiralalaIV.pdf -i Ausgaben/PfadiralalaIV.tex Lieder Misc Noten \
+#       -- pdflatex -jobname=Ausgaben/PfadiralalaIV Ausgaben/PfadiralalaIV.tex
+#
+# The cache key is the digest of the command and the contents of all inputs
+# (directories are read recursively). If every output is in the cache, they are
+# restored and the command is not run; otherwise the outputs of a successful run
+# are stored. Besides the local cache, the shared caches in PFADI_CACHE are
+# used (see buildtools/cache.py), e.g. PFADI_CACHE=/mnt/share/pfadiralala-cache.
+#
+# Every run appends its wall time, cache result and exit status (and with --log
+# the pages, memory usage and overfull boxes from the pdflatex log) to the
+# telemetry file, which build-report.py summarizes.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from buildtools.cache import build_cache, digest, files_digest
+from buildtools.texlog import read_log
+
+
+def record(path, entry):
+    # one line per target, appending keeps concurrent make jobs from overwriting each other
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as telemetry_file:
+        telemetry_file.write(json.dumps(entry) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a build command with cached outputs.")
+    parser.add_argument("-o", "--output", action="append", required=True,
+                        help="File written by the command (repeatable).")
+    parser.add_argument("-i", "--input", nargs="+", default=[],
+                        help="Files and directories the outputs depend on.")
+    parser.add_argument("--cache", default=".cache/artifacts", help="Local cache directory.")
+    parser.add_argument("--log", help="pdflatex log written by the command, for the telemetry.")
+    parser.add_argument("--telemetry", default=".cache/build-telemetry.jsonl",
+                        help="File the telemetry is appended to.")
+    parser.add_argument("command", nargs=argparse.REMAINDER,
+                        help="Command to run, after --.")
+    args = parser.parse_args()
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if len(command) == 0:
+        parser.error("no command given")
+
+    start = time.time()
+    entry = {"target": args.output[0], "start": start}
+    if args.log is not None:
+        entry["jobname"] = os.path.splitext(args.log)[0]
+    key = digest("\0".join(command), files_digest(args.input))
+    keys = {out: digest(key, os.path.normpath(out)) for out in args.output}
+    cache = build_cache(args.cache)
+
+    if all(k in cache for k in keys.values()):
+        for out, out_key in keys.items():
+            os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+            if not cache.get(out_key, out):
+                break
+        else:
+            print("{}: restored from cache".format(", ".join(args.output)))
+            entry.update(cache="hit", status=0, wall=time.time() - start)
+            record(args.telemetry, entry)
+            return
+
+    result = subprocess.run(command)
+    entry.update(cache="miss", status=result.returncode, wall=time.time() - start)
+    if args.log is not None and os.path.exists(args.log):
+        entry["log"] = read_log(args.log).as_dict()
+    missing = [out for out in keys if not os.path.exists(out)]
+    if result.returncode == 0 and len(missing) > 0:
+        entry["status"] = 1
+    record(args.telemetry, entry)
+
+    if result.returncode != 0:
+        sys.exit(result.returncode)
+    if len(missing) > 0:
+        print("{}: not written by the command".format(", ".join(missing)), file=sys.stderr)
+        sys.exit(1)
+    for out, out_key in keys.items():
+        cache.put(out_key, out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Buildtools
+---
+
+Helpers shared by the build scripts in Tools/ (index files, LaTeX runs, caches).
+"""
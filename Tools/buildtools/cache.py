@@ -0,0 +1,144 @@
+"""
+Content-addressed storage of build artifacts
+
+Artifacts are stored under the hex digest of everything that went into them,
+so a lookup never needs to know how the artifact was produced.
+
+Backends are registered by URL scheme ("dir:/srv/cache", plain paths are
+directories). Every tool keeps its local cache in .cache/ and additionally uses
+the shared caches listed in the environment variable PFADI_CACHE (separated by
+commas), e.g. a directory on a network share or a CI cache that stands in for a
+remote store. Artifacts found in a shared cache are copied to the local one.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+__all__ = ["DirectoryCache", "TieredCache", "digest", "files_digest", "register_backend",
+           "open_cache", "build_cache"]
+
+SHARED_CACHE_ENV = "PFADI_CACHE"
+
+BACKENDS = {}
+
+
+def digest(*parts):
+    """sha256 hex digest over the given bytes / str parts."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    return h.hexdigest()
+
+
+def files_digest(paths):
+    """Digest over the names and contents of files, directories are read recursively.
+
+    Missing files are part of the digest as well, so creating them changes it."""
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = [d for d in dirs if not d.startswith(".")]
+                files.update(os.path.join(root, n) for n in names if not n.startswith("."))
+        else:
+            files.add(path)
+    parts = []
+    for path in sorted(os.path.normpath(p) for p in files):
+        try:
+            with open(path, "rb") as input_file:
+                parts += [path, digest(input_file.read())]
+        except FileNotFoundError:
+            parts += [path, "missing"]
+    return digest(*parts)
+
+
+def register_backend(scheme):
+    """Class decorator registering a cache backend for "scheme:location" specs.
+
+    Backends are constructed with the location and provide get(key, dest),
+    put(key, src) and key in cache."""
+    def register(cls):
+        BACKENDS[scheme] = cls
+        return cls
+    return register
+
+
+@register_backend("dir")
+class DirectoryCache(object):
+    def __init__(self, path):
+        self.path = path
+
+    def _entry(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def __contains__(self, key):
+        return os.path.exists(self._entry(key))
+
+    def get(self, key, dest):
+        """Copy the artifact stored for key to dest, return False if there is none."""
+        try:
+            _copy_atomic(self._entry(key), dest)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def put(self, key, src):
+        """Store the file src as artifact for key."""
+        entry = self._entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        _copy_atomic(src, entry)
+
+
+class TieredCache(object):
+    """Caches tried in order, hits of later caches are copied to the earlier ones."""
+
+    def __init__(self, *caches):
+        self.caches = caches
+
+    def __contains__(self, key):
+        return any(key in cache for cache in self.caches)
+
+    def get(self, key, dest):
+        for i, cache in enumerate(self.caches):
+            if cache.get(key, dest):
+                for earlier in self.caches[:i]:
+                    earlier.put(key, dest)
+                return True
+        return False
+
+    def put(self, key, src):
+        for cache in self.caches:
+            cache.put(key, src)
+
+
+def open_cache(spec):
+    """Cache backend of a "scheme:location" spec, other specs are directories."""
+    scheme, _, location = spec.partition(":")
+    if location and scheme in BACKENDS:
+        return BACKENDS[scheme](location)
+    return DirectoryCache(spec)
+
+
+def build_cache(local):
+    """Local directory cache, followed by the shared caches from PFADI_CACHE."""
+    shared = [s.strip() for s in os.environ.get(SHARED_CACHE_ENV, "").split(",") if s.strip()]
+    if len(shared) == 0:
+        return DirectoryCache(local)
+    return TieredCache(DirectoryCache(local), *(open_cache(s) for s in shared))
+
+
+def _copy_atomic(src, dest):
+    # copy next to the destination first, so concurrent readers never see partial files
+    dest_dir = os.path.dirname(os.path.abspath(dest))
+    fd, tmp = tempfile.mkstemp(dir=dest_dir, prefix=".tmp-")
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        os.remove(tmp)
+        raise
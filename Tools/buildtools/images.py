@@ -0,0 +1,65 @@
+"""
+Downscaled variants of the artwork in Bilder/ for the -pics and -print editions
+
+No picture is printed larger than the A5 page, so every image is scaled down to
+fit the page at the resolution of the target profile and recompressed. The
+format (and thus the file name) of an image is kept, so LaTeX can pick up the
+variant instead of the original (see Misc/basic.tex).
+"""
+import io
+import math
+
+from buildtools.cache import digest
+
+__all__ = ["Profile", "PROFILES", "variant_key", "make_variant"]
+
+# paper size from Misc/basic.tex (mm)
+PAGE_WIDTH = 148
+PAGE_HEIGHT = 210
+
+
+class Profile(object):
+    def __init__(self, name, dpi, jpeg_quality):
+        self.name = name
+        self.dpi = dpi
+        self.jpeg_quality = jpeg_quality
+
+    @property
+    def max_size(self):
+        return (math.ceil(PAGE_WIDTH / 25.4 * self.dpi),
+                math.ceil(PAGE_HEIGHT / 25.4 * self.dpi))
+
+    def __str__(self):
+        return "{}:{}dpi:q{}".format(self.name, self.dpi, self.jpeg_quality)
+
+
+PROFILES = {
+    "pics": Profile("pics", 150, 80),
+    "print": Profile("print", 300, 90),
+}
+
+
+def variant_key(source, profile):
+    """Cache key of the variant of the image (bytes) for the given profile."""
+    return digest(str(profile), source)
+
+
+def make_variant(source, profile):
+    """Return the image (bytes) scaled to the profile, or None if the original is smaller."""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(source))
+    out = io.BytesIO()
+    image_format = image.format
+    image.thumbnail(profile.max_size, Image.LANCZOS)
+    if image_format == "JPEG":
+        if image.mode not in ("RGB", "L", "CMYK"):
+            image = image.convert("RGB")
+        image.save(out, "JPEG", quality=profile.jpeg_quality, optimize=True,
+                   progressive=True)
+    else:
+        image.save(out, image_format, optimize=True)
+
+    if out.tell() >= len(source):
+        return None
+    return out.getvalue()
@@ -0,0 +1,66 @@
+"""
+Running pdflatex, songidx and PDF tools from the build scripts
+
+All commands are run from the repository root, like in the Makefile.
+"""
+import os
+import re
+import shutil
+import subprocess
+
+__all__ = ["BuildError", "pdflatex", "songidx", "page_count", "merge_pdfs"]
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PDFLATEX = ["pdflatex", "--interaction=batchmode",
+            "--enable-write18", "-shell-escape"]
+SONGIDX = ["texlua", os.path.join(TOOLS_DIR, "songidx.lua")]
+
+PAGES_EX = re.compile(rb"Output written on .*?\((\d+) pages?")
+
+
+class BuildError(Exception):
+    pass
+
+
+def pdflatex(tex_path, jobname, env=None):
+    """Compile tex_path to jobname.pdf, raise BuildError on failure."""
+    cmd = PDFLATEX + ["-jobname=" + jobname, tex_path]
+    result = subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    if result.returncode != 0:
+        raise BuildError("pdflatex failed for {}, see {}.log".format(
+            tex_path, jobname))
+    return jobname + ".pdf"
+
+
+def songidx(sxd_text, sbx_path):
+    """Generate sbx_path from the given index data, passed to songidx via stdin."""
+    with open(sbx_path + ".log", "wb") as log:
+        result = subprocess.run(SONGIDX + ["-", sbx_path], input=sxd_text.encode(
+            "utf-8", "surrogateescape"), stdout=log, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        raise BuildError(
+            "songidx failed for {}, see {}.log".format(sbx_path, sbx_path))
+    return sbx_path
+
+
+def page_count(jobname):
+    """Number of pages of the last pdflatex run, as reported in its log."""
+    with open(jobname + ".log", "rb") as log:
+        match = PAGES_EX.search(log.read())
+    if match is None:
+        raise BuildError("No output written for {}".format(jobname))
+    return int(match.group(1))
+
+
+def merge_pdfs(pdf_paths, out_path):
+    """Concatenate pdf_paths into out_path, preferring pdfunite over ghostscript."""
+    if shutil.which("pdfunite"):
+        cmd = ["pdfunite"] + list(pdf_paths) + [out_path]
+    else:
+        cmd = ["gs", "-q", "-dBATCH", "-dNOPAUSE", "-dSAFER", "-sDEVICE=pdfwrite",
+               "-sOutputFile=" + out_path] + list(pdf_paths)
+    if subprocess.run(cmd).returncode != 0:
+        raise BuildError("Merging into {} failed".format(out_path))
+    return out_path
@@ -0,0 +1,108 @@
+"""
+Per-file results of the tools, cached as JSON
+
+The chord inventory, the layout metrics and the MinHash signatures are each
+computed from a single song file. A ResultCache stores them by path together
+with a digest of everything the result depends on (by default the content of
+the file); its version names the code computing them, so a cache written by a
+different version is dropped as a whole. cached_map() computes the results
+missing in the cache in parallel.
+
+The cache file is written to a temporary file and renamed, so concurrent runs
+(make -j) never read a partial file.
+"""
+import hashlib
+import importlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+__all__ = ["ResultCache", "file_digest", "modules_digest", "save_json", "cached_map"]
+
+
+def file_digest(path):
+    """sha256 hex digest of the content of a file."""
+    with open(path, "rb") as input_file:
+        return hashlib.sha256(input_file.read()).hexdigest()
+
+
+def modules_digest(*names):
+    """Digest of the source of Python modules, a change of the code changes it."""
+    h = hashlib.sha256()
+    for name in names:
+        with open(importlib.import_module(name).__file__, "rb") as module_file:
+            h.update(module_file.read())
+    return h.hexdigest()
+
+
+def save_json(path, data):
+    """Write data as JSON to a temporary file next to path and rename it."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as tmp_file:
+        json.dump(data, tmp_file)
+    os.replace(tmp_file.name, path)
+
+
+class ResultCache(object):
+    """Results of files, stored as JSON and keyed by path and digest.
+
+    Subclasses convert the results to and from JSON with encode() / decode()."""
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        try:
+            with open(path, "r") as cache_file:
+                data = json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            data = {}
+        self._entries = data.get("entries", {}) if data.get("version") == version else {}
+        self.changed = False
+
+    def encode(self, value):
+        return value
+
+    def decode(self, value):
+        return value
+
+    def get(self, path, digest):
+        """Cached result of a file, None if missing or outdated."""
+        entry = self._entries.get(path)
+        if entry is not None and entry["digest"] == digest:
+            return self.decode(entry["value"])
+        return None
+
+    def put(self, path, digest, value):
+        self._entries[path] = {"digest": digest, "value": self.encode(value)}
+        self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        save_json(self.path, {"version": self.version, "entries": self._entries})
+        self.changed = False
+
+
+def cached_map(func, paths, cache=None, jobs=None, args=(), digest=file_digest):
+    """{path: func(path, *args)}, results missing in the cache are computed in parallel.
+
+    digest(path) is the key of the result of a file, func and args must be picklable."""
+    result, todo = {}, []
+    for path in paths:
+        key = digest(path)
+        value = cache.get(path, key) if cache is not None else None
+        if value is None:
+            todo.append((path, key))
+        else:
+            result[path] = value
+    if len(todo) > 0:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            computed = pool.map(func, [p for p, _ in todo], *[[arg] * len(todo) for arg in args],
+                                chunksize=8)
+            for (path, key), value in zip(todo, computed):
+                if cache is not None:
+                    cache.put(path, key, value)
+                result[path] = value
+    return result
@@ -0,0 +1,119 @@
+"""
+Rendering of ABC scores (ABC_Noten/*.mcm) to cropped PDFs (Noten/*.pdf)
+
+abcm2ps -E writes one EPS file per tune, including its %%BoundingBox, so the
+cropped PDF is produced by a single ghostscript run over all of them. For HTML
+targets, abcm2ps -g writes SVG directly, again one file per tune. Every score
+holds a single tune (one X: field), so the first SVG file is the whole score;
+a score with several tunes is reported, as an SVG cannot simply be appended to
+another one.
+"""
+import glob
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from buildtools.cache import digest
+
+__all__ = ["RenderError", "FORMATS", "normalize_abc", "fingerprint",
+           "bounding_box", "render"]
+
+ABCM2PS = ["abcm2ps", "-c"]
+GS_PDF = ["gs", "-q", "-dBATCH", "-dNOPAUSE", "-dSAFER", "-dEPSCrop",
+          "-sDEVICE=pdfwrite"]
+
+# output format: (abcm2ps option, file suffix written by abcm2ps)
+FORMATS = {
+    "pdf": ("-E", ".eps"),
+    "svg": ("-g", ".svg"),
+}
+
+LINE_EX = re.compile(rb"\r\n|\r|\n")
+COMMENT_EX = re.compile(rb"(?<!\\)%.*")
+SPACE_EX = re.compile(rb"\s+")
+BBOX_EX = re.compile(
+    rb"^%%BoundingBox:\s*(-?\d+)\s+(-?\d+)\s+(-?\d+)\s+(-?\d+)", re.MULTILINE)
+
+
+def normalize_abc(data):
+    """Score content without comments, line ending and whitespace differences.
+
+    %%-directives are kept, as they change the output of abcm2ps. Blank lines
+    end a tune, so they are kept as well (several as one); lines with only a
+    comment are dropped."""
+    lines = []
+    for line in LINE_EX.split(data):
+        if line.strip() == b"":
+            if len(lines) > 0 and lines[-1] != b"":
+                lines.append(b"")
+            continue
+        if not line.lstrip().startswith(b"%%"):
+            line = COMMENT_EX.sub(b"", line)
+        line = SPACE_EX.sub(b" ", line).strip()
+        if len(line) > 0:
+            lines.append(line)
+    while len(lines) > 0 and lines[-1] == b"":
+        lines.pop()
+    return b"\n".join(lines)
+
+
+def fingerprint(score_path, fmt_path, out_format="pdf"):
+    """Hash of everything the rendered file of a score depends on."""
+    with open(score_path, "rb") as score_file:
+        score = normalize_abc(score_file.read())
+    with open(fmt_path, "rb") as fmt_file:
+        fmt = normalize_abc(fmt_file.read())
+    option = FORMATS[out_format][0]
+    return digest(" ".join(ABCM2PS + [option]), " ".join(GS_PDF), fmt, score)
+
+
+class RenderError(Exception):
+    pass
+
+
+def bounding_box(eps_path):
+    """(llx, lly, urx, ury) of an EPS file, None if it has no usable box."""
+    with open(eps_path, "rb") as eps_file:
+        match = BBOX_EX.search(eps_file.read(4096))
+    if match is None:
+        return None
+    llx, lly, urx, ury = (int(v) for v in match.groups())
+    if urx <= llx or ury <= lly:
+        return None
+    return llx, lly, urx, ury
+
+
+def _run(cmd, log):
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    log.append(result.stdout.decode("utf-8", "replace").strip())
+    return result.returncode
+
+
+def render(score_path, out_path, fmt_path, out_format="pdf"):
+    """Render a score to a cropped pdf or an svg, return the messages of the tools.
+
+    abcm2ps exits with an error on mere warnings, so a score only fails if no
+    usable output is produced."""
+    option, suffix = FORMATS[out_format]
+    log = []
+    with tempfile.TemporaryDirectory() as tmp:
+        _run(ABCM2PS + [option, "-F", fmt_path, "-O",
+                        os.path.join(tmp, "score"), score_path], log)
+        tunes = sorted(glob.glob(os.path.join(tmp, "*" + suffix)))
+        if len(tunes) == 0:
+            raise RenderError("\n".join(log + ["no output written"]))
+
+        if out_format == "svg":
+            if len(tunes) > 1:
+                log.append("{} tunes, only the first one is used".format(len(tunes)))
+            shutil.move(tunes[0], out_path)
+        else:
+            for tune in tunes:
+                if bounding_box(tune) is None:
+                    raise RenderError("\n".join(
+                        log + ["{}: empty bounding box".format(os.path.basename(tune))]))
+            if _run(GS_PDF + ["-sOutputFile=" + out_path] + tunes, log) != 0:
+                raise RenderError("\n".join(log))
+    return "\n".join(l for l in log if len(l) > 0)
@@ -0,0 +1,101 @@
+"""
+Reading and writing of songs index data files (.sxd)
+
+An .sxd file written by songs.sty starts with a header line (e.g.
+"TITLE INDEX DATA FILE"), optionally followed by %-directives, and then
+contains one record of three lines per index entry: title, page, hyperlink.
+"""
+import re
+
+__all__ = ["IndexEntry", "IndexData"]
+
+TITLE_HEADER = "TITLE INDEX DATA FILE"
+
+# sxd files are written by pdflatex in the encoding of the input files,
+# keep unknown bytes untouched when reading and writing them back.
+ENCODING = "utf-8"
+ERRORS = "surrogateescape"
+
+# leading stars of a title are markup of songs.sty, not part of the title
+TITLE_EX = re.compile(r"^(\**)(.+)$")
+
+
+class IndexEntry(object):
+    def __init__(self, title, page, link=""):
+        self.title = title
+        self.page = page
+        self.link = link
+
+    def __repr__(self):
+        return "IndexEntry({!r}, {!r}, {!r})".format(self.title, self.page, self.link)
+
+
+class IndexData(object):
+    def __init__(self, header=TITLE_HEADER, directives=None, entries=None):
+        self.header = header
+        self.directives = directives if directives is not None else []
+        self.entries = entries if entries is not None else []
+
+    @classmethod
+    def parse(cls, lines, name="<sxd>"):
+        lines = [l.rstrip("\r\n") for l in lines]
+        if len(lines) == 0:
+            raise ValueError("{}: file is empty".format(name))
+
+        data = cls(lines[0])
+        i = 1
+        while i < len(lines):
+            if lines[i].startswith("%"):
+                data.directives.append(lines[i])
+                i += 1
+                continue
+            if i + 2 >= len(lines):
+                raise ValueError(
+                    "{}:{}: incomplete index entry".format(name, i + 1))
+            data.entries.append(IndexEntry(*lines[i:i + 3]))
+            i += 3
+        return data
+
+    @classmethod
+    def read(cls, path):
+        with open(path, "r", encoding=ENCODING, errors=ERRORS) as sxd_file:
+            return cls.parse(sxd_file.readlines(), path)
+
+    def extend(self, other):
+        """Append the entries of another index, directives are taken over once."""
+        if other.header != self.header:
+            raise ValueError("Cannot merge \"{}\" into \"{}\"".format(
+                other.header, self.header))
+        for directive in other.directives:
+            if directive not in self.directives:
+                self.directives.append(directive)
+        self.entries += other.entries
+
+    def styled(self, style):
+        """Copy of the index with every title wrapped into style, "&" stands for the title.
+
+        Hyperlinks are dropped, as styled entries usually refer to another book."""
+        styled = IndexData(self.header, list(self.directives))
+        for entry in self.entries:
+            match = TITLE_EX.match(entry.title)
+            title = entry.title
+            if match is not None:
+                title = match.group(1) + style.replace("&", match.group(2))
+            styled.entries.append(IndexEntry(title, entry.page, ""))
+        return styled
+
+    def lines(self):
+        yield self.header
+        for directive in self.directives:
+            yield directive
+        for entry in self.entries:
+            yield entry.title
+            yield entry.page
+            yield entry.link
+
+    def dumps(self):
+        return "".join(l + "\n" for l in self.lines())
+
+    def write(self, path):
+        with open(path, "w", encoding=ENCODING, errors=ERRORS, newline="\n") as sxd_file:
+            sxd_file.write(self.dumps())
@@ -0,0 +1,89 @@
+"""
+Analysis of pdflatex logs
+
+pdflatex wraps its log lines after 79 characters, so they are joined before
+parsing. Files are reported as "(./Lieder/Song.tex" when they are opened;
+overfull and underfull boxes are attributed to the song file that was opened
+last. The memory statistics are the "Here is how much of TeX's memory you
+used" block at the end of the log.
+"""
+import re
+
+__all__ = ["LogStats", "read_log", "parse_log"]
+
+MAX_LINE = 79
+
+PAGES_EX = re.compile(r"Output written on .*?\((\d+) pages?, (\d+) bytes\)")
+SONG_EX = re.compile(r"\((?:\./)?(Lieder/[^\s()]+\.tex)")
+BOX_EX = re.compile(r"^(Overfull|Underfull) \\[hv]box \((?:badness \d+|([\d.]+)pt too \w+)\)",
+                    re.MULTILINE)
+RERUN_EX = re.compile(r"Rerun to get|Label\(s\) may have changed|Rerun LaTeX")
+MEMORY_EX = re.compile(r"^ *(\d+)(?:,\d+)* ([a-z][a-z ']+?) out of (\d+)", re.MULTILINE)
+ERROR_EX = re.compile(r"^! (.+)$", re.MULTILINE)
+
+
+class LogStats(object):
+    def __init__(self):
+        self.pages = None
+        self.bytes = None
+        self.rerun = False
+        self.errors = []
+        # "strings", "words of memory", ...: [used, available]
+        self.memory = {}
+        # song file: number of overfull boxes, total width in pt
+        self.overfull = {}
+        self.underfull = {}
+
+    def as_dict(self):
+        return {
+            "pages": self.pages,
+            "bytes": self.bytes,
+            "rerun": self.rerun,
+            "errors": self.errors,
+            "memory": self.memory,
+            "overfull": self.overfull,
+            "underfull": self.underfull,
+        }
+
+
+def _unwrap(text):
+    lines = text.splitlines()
+    joined = []
+    for line in lines:
+        if len(joined) > 0 and len(joined[-1][1]) == MAX_LINE:
+            joined[-1] = (joined[-1][0] + line, line)
+        else:
+            joined.append((line, line))
+    return "\n".join(line for line, _ in joined)
+
+
+def parse_log(text):
+    text = _unwrap(text)
+    stats = LogStats()
+
+    pages = PAGES_EX.search(text)
+    if pages is not None:
+        stats.pages, stats.bytes = int(pages.group(1)), int(pages.group(2))
+    stats.rerun = RERUN_EX.search(text) is not None
+    stats.errors = ERROR_EX.findall(text)
+
+    memory = text.rfind("Here is how much of TeX's memory you used:")
+    if memory >= 0:
+        for used, name, available in MEMORY_EX.findall(text[memory:]):
+            stats.memory[name.strip()] = [int(used), int(available)]
+
+    songs = [(m.start(), m.group(1)) for m in SONG_EX.finditer(text)]
+    i, song = 0, None
+    for box in BOX_EX.finditer(text):
+        while i < len(songs) and songs[i][0] < box.start():
+            song = songs[i][1]
+            i += 1
+        boxes = stats.overfull if box.group(1) == "Overfull" else stats.underfull
+        count, width = boxes.get(song or "", [0, 0.0])
+        boxes[song or ""] = [count + 1, round(width + float(box.group(2) or 0), 2)]
+    return stats
+
+
+def read_log(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as log_file:
+        return parse_log(log_file.read())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# Generates the chord tables of editions with exactly the chords their songs use
+# (see pyralala/chordtable.py):
+#
+#   chord-tables.py Ausgaben/PfadiralalaIV.tex
+#       -> Ausgaben/PfadiralalaIV/GrifftabelleGitarre.tex, ...Ukulele*.tex
+#
+# The fingerings come from Misc/Grifftabelle*.tex. A table is only written if
+# its content changed. Chords without a fingering are reported, so they can be
+# added to the tables in Misc/, as well as the songs whose chords were taken from
+# the source because the reader could not handle them. With --json, the inventory (chords, songs and
+# fingerings per instrument) is written for other exporters.
+
+import argparse
+import collections
+import glob
+import json
+import os
+import sys
+
+from pyralala.chordtable import TABLES, ChordCache, ChordTable, chord_keys, inventory
+from pyralala.edition import Edition
+
+
+def write_if_changed(path, text):
+    try:
+        with open(path, "r", encoding="utf-8") as old_file:
+            if old_file.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as table_file:
+        table_file.write(text)
+    return True
+
+
+def uses_tables(edition_path):
+    with open(edition_path, "r", encoding="utf-8") as edition_file:
+        return "Grifftabelle" in edition_file.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the chord tables of editions.")
+    parser.add_argument("editions", nargs="*", help="Edition files (default: all editions "
+                                                    "including the tables in Misc/).")
+    parser.add_argument("--json", metavar="FILE",
+                        help="Write the chord inventory ({edition} is replaced by its name).")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of songs read concurrently.")
+    parser.add_argument("--cache", default=".cache/chords.json", help="Chord cache.")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Only count the songs read from the source.")
+    args = parser.parse_args()
+
+    editions = args.editions or sorted(filter(uses_tables, glob.glob("Ausgaben/*.tex")))
+    tables = collections.OrderedDict((name, ChordTable.read(path)) for name, path in TABLES.items())
+    fingerings = {name: table.fingerings() for name, table in tables.items()}
+    cache = ChordCache(args.cache)
+
+    for edition_path in editions:
+        edition = Edition.read(edition_path)
+        name = os.path.splitext(os.path.basename(edition_path))[0]
+        songs = inventory(edition.songs, cache, args.jobs)
+        fallbacks = [(path, songs[path][1]) for path in edition.songs if songs[path][1]]
+        if not args.quiet:
+            for path, error in fallbacks:
+                print("{}: chords read from the source, {}".format(path, error), file=sys.stderr)
+
+        used = collections.OrderedDict()  # key -> (chord as written, [songs])
+        for path in edition.songs:
+            for chords in songs[path][0]:
+                for chord, key in chord_keys(chords):
+                    used.setdefault(key, (chord, []))[1].append(path)
+
+        written = []
+        for instrument, table in tables.items():
+            out = os.path.join("Ausgaben", name, "Grifftabelle{}.tex".format(instrument))
+            if write_if_changed(out, table.render(used)):
+                written.append(out)
+            missing = sorted({used[k][0] for k in used if k not in fingerings[instrument]})
+            if len(missing) > 0:
+                print("{}: no {} fingering for {}".format(name, instrument, ", ".join(missing)),
+                      file=sys.stderr)
+        print("{}: {} chords ({} of {} songs read from the source), {}".format(
+            name, len(used), len(fallbacks), len(edition.songs),
+            "{} tables written".format(len(written)) if written else "tables unchanged"))
+
+        if args.json:
+            data = []
+            for key, (chord, paths) in used.items():
+                data.append({
+                    "chord": chord,
+                    "songs": sorted(set(paths)),
+                    "fingerings": {i: f[key][1] for i, f in fingerings.items() if key in f},
+                })
+            with open(args.json.replace("{edition}", name), "w") as json_file:
+                json.dump(data, json_file, ensure_ascii=False, indent=1)
+    cache.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Chord grammar shared by the tools
+
+A chord is a note (A-H, lower case for the l-style minor chords), optionally
+followed by an accidental (#, \\#, & or b), a quality (m, maj7, sus4, add9, ...)
+and a bass note after a slash; it may be put in parentheses, e.g. "F#m7",
+"B&", "Dsus4/f#" or "(Hm)". German note names are used (H, B = B flat).
+
+Parsed chords are cached, so the chord lines of an import or the chords of a
+book are parsed only once per distinct chord.
+"""
+import collections
+import functools
+import re
+
+__all__ = ["Chord", "CHORD_EX", "LATEX_CHORD_EX", "parse", "is_chord", "is_chord_line"]
+
+NOTE = r"[A-Ha-h](?:\\#|#|&|b(?![a-z]))?"
+QUALITY = r"(?:m|maj|min|dim|aug|sus|add|\d|\+|\*)*"
+CHORD = r"(?P<open>\()?(?P<root>[A-Ha-h])(?P<accidental>\\#|#|&|b(?![a-z]))?" \
+        r"(?P<quality>{})(?:/(?P<bass>{}))?(?(open)\))".format(QUALITY, NOTE)
+
+CHORD_EX = re.compile(CHORD)
+# a line of chords and repetition signs (|: and :|)
+CHORD_LINE_EX = re.compile(r" *(?:(?:[:|]+|\(?{0}{1}(?:/{0})?\)?) *)+".format(NOTE, QUALITY))
+# chords in song files: \[Am]
+LATEX_CHORD_EX = re.compile(r"\\\[([^\]]+)\]")
+MINOR_EX = re.compile(r"^m(?!aj)")
+
+
+class Chord(collections.namedtuple("Chord", "root accidental quality bass optional")):
+    """Parsed chord, str() gives the chord as written."""
+
+    @property
+    def note(self):
+        return self.root + self.accidental
+
+    @property
+    def minor(self):
+        """m-style (Am) or l-style (a) minor chord."""
+        return MINOR_EX.match(self.quality) is not None or \
+            (self.root.islower() and not self.quality.startswith("maj"))
+
+    def __str__(self):
+        chord = self.note + self.quality + ("/" + self.bass if self.bass else "")
+        return "(" + chord + ")" if self.optional else chord
+
+
+@functools.lru_cache(maxsize=None)
+def parse(text):
+    """Chord of a string, None if it is not a single chord."""
+    match = CHORD_EX.fullmatch(text)
+    if match is None:
+        return None
+    return Chord(match.group("root"), match.group("accidental") or "", match.group("quality"),
+                 match.group("bass") or "", match.group("open") is not None)
+
+
+def is_chord(text):
+    return parse(text) is not None
+
+
+def is_chord_line(line):
+    """Whether a line consists only of chords and repetition signs."""
+    return CHORD_LINE_EX.fullmatch(line) is not None
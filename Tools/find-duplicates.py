@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+# Finds near-duplicate songs by their lyrics (see pyralala/similarity.py):
+#
+#   find-duplicates.py                           similar pairs in Lieder/
+#   find-duplicates.py --check neu/*.txt         songs to import that already exist
+#
+# Signatures of the corpus are cached in .cache/minhash.json. In --check mode,
+# the exit code is 1 if a near-duplicate was found.
+
+import argparse
+import glob
+import os
+import sys
+
+from pyralala.similarity import MinHasher, SignatureCache, check_imports, find_duplicates, signatures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate songs.")
+    parser.add_argument("songs", nargs="*", help="Song files of the corpus (default: Lieder/*.tex).")
+    parser.add_argument("-c", "--check", nargs="+", metavar="FILE",
+                        help="Check these files (.tex or .txt) against the corpus.")
+    parser.add_argument("-t", "--threshold", type=float, default=0.5,
+                        help="Minimal estimated similarity (0..1, default 0.5).")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of songs read concurrently.")
+    parser.add_argument("--cache", default=".cache/minhash.json", help="Signature cache.")
+    args = parser.parse_args()
+
+    corpus = sorted(args.songs or glob.glob("Lieder/*.tex"))
+    if args.check:
+        matches = check_imports(args.check, corpus, args.threshold, args.cache, args.jobs)
+        for path, found in sorted(matches.items()):
+            for similarity, candidate in found:
+                print("{:.2f}\t{}\t{}".format(similarity, path, candidate))
+        sys.exit(1 if len(matches) > 0 else 0)
+
+    hasher = MinHasher()
+    cache = SignatureCache(args.cache, hasher)
+    sigs = signatures(corpus, hasher, cache, args.jobs)
+    cache.save()
+    found = find_duplicates(sigs, args.threshold)
+    for similarity, a, b in found:
+        print("{:.2f}\t{}\t{}".format(similarity, a, b))
+    print("{} songs, {} similar pairs".format(len(sigs), len(found)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,34 @@
 #!/usr/bin/env bash
 
+# Usage: generate_songbook.sh [-i INDEX] [-p FIRSTPAGE] [-t | -s] [SONG.tex ...]
+#
+#   -i INDEX      basename of the index data file (default: Ausgaben/CompleteEdition)
+#   -p FIRSTPAGE  page number of the first page (used for sharded builds)
+#   -t            only generate the table of contents, no songs
+#   -s            only generate the songs, no table of contents
+#
+# Without song files, all songs in Lieder/ are included.
+
+INDEX=Ausgaben/CompleteEdition
+FIRSTPAGE=
+TOC=true
+SONGS=true
+
+while getopts "i:p:ts" opt; do
+    case $opt in
+        i) INDEX=$OPTARG ;;
+        p) FIRSTPAGE=$OPTARG ;;
+        t) SONGS=false ;;
+        s) TOC=false ;;
+        *) exit 1 ;;
+    esac
+done
+shift $((OPTIND - 1))
+
+if [ $# -eq 0 ]; then
+    set -- Lieder/*.tex
+fi
+
 
 cat <<EOF
 \documentclass{book}
@@ -13,19 +42,31 @@ cat <<EOF
 \afterpreludeskip=2pt
 \beforepostludeskip=2pt
 
-\newindex{Seitenzahlen}{Ausgaben/CompleteEdition}
+\newindex{Seitenzahlen}{$INDEX}
 \indexsongsas{Seitenzahlen}{\thepage}
 
 \begin{document}
-\begin{songs}{Seitenzahlen}
+EOF
+
+if [ -n "$FIRSTPAGE" ]; then
+    echo "\\setcounter{page}{$FIRSTPAGE}"
+fi
 
-\showindex[2]{Inhaltsverzeichnis}{Seitenzahlen}
+cat <<EOF
+\begin{songs}{Seitenzahlen}
 
 EOF
 
-for file in Lieder/*.tex; 
-    do echo "\\input{"${file%.*}"}"
-done
+if $TOC; then
+    echo "\\showindex[2]{Inhaltsverzeichnis}{Seitenzahlen}"
+    echo
+fi
+
+if $SONGS; then
+    for file in "$@";
+        do echo "\\input{"${file%.*}"}"
+    done
+fi
 
 cat <<EOF
 
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# Generates downscaled, recompressed variants of the images in Bilder/ for a
+# target profile (pics: screen resolution, print: print resolution).
+#
+# Variants are cached by the hash of the source image and the profile and are
+# written to Varianten/<profile>/Bilder/, where Misc/basic.tex picks them up
+# instead of the originals. Images that cannot be made smaller get no variant,
+# variants of removed images are deleted. Every profile has its own state file
+# (.cache/Varianten-<profile>.json), so both profiles can run concurrently.
+#
+# With --stamp, the file is touched after the variants are complete. Without
+# Pillow no variants are made at all and the stamp is left alone, so the
+# variants are made once Pillow is installed.
+
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from buildtools.cache import build_cache
+from buildtools.images import PROFILES, make_variant, variant_key
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+
+def load_state(path):
+    try:
+        with open(path, "r") as state_file:
+            return json.load(state_file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    # written to a temporary file and renamed, so readers never see a partial file
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as tmp_file:
+        json.dump(state, tmp_file, indent=2, sort_keys=True)
+    os.replace(tmp_file.name, path)
+
+
+def remove_orphans(out, state):
+    """Delete the variants (and state entries) whose source image is gone, return their number."""
+    removed = 0
+    for root, _, names in os.walk(out):
+        for name in names:
+            dest = os.path.join(root, name)
+            if not os.path.exists(os.path.relpath(dest, out)):
+                os.remove(dest)
+                removed += 1
+    for dest in list(state):
+        if not os.path.exists(os.path.relpath(dest, out)):
+            del state[dest]
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate resolution-aware image variants.")
+    parser.add_argument("images", nargs="*", help="Image files (default: Bilder/*).")
+    parser.add_argument("-p", "--profile", required=True, choices=sorted(PROFILES),
+                        help="Target profile.")
+    parser.add_argument("-o", "--out", default="Varianten", help="Output directory.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of images processed concurrently.")
+    parser.add_argument("--cache", default=".cache/Bilder", help="Cache directory.")
+    parser.add_argument("--state", help="State file (default: .cache/Varianten-<profile>.json).")
+    parser.add_argument("--stamp", help="File touched when the variants are complete.")
+    args = parser.parse_args()
+    state_path = args.state or os.path.join(".cache", "Varianten-{}.json".format(args.profile))
+
+    try:
+        import PIL
+    except ImportError:
+        # without variants, Misc/basic.tex uses the original images
+        print("Pillow is missing (pip install Pillow), the original images are used",
+              file=sys.stderr)
+        return
+
+    images = sorted(args.images or [p for p in glob.glob("Bilder/*")
+                                    if p.lower().endswith(IMAGE_SUFFIXES)])
+    profile = PROFILES[args.profile]
+    cache = build_cache(args.cache)
+    state = load_state(state_path)
+
+    def process(image):
+        dest = os.path.join(args.out, profile.name, os.path.normpath(image))
+        with open(image, "rb") as image_file:
+            source = image_file.read()
+        key = variant_key(source, profile)
+
+        previous = state.get(dest, {})
+        if previous.get("key") == key and (previous.get("original") or os.path.exists(dest)):
+            return dest, previous, "unchanged"
+
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        if cache.get(key, dest):
+            return dest, {"key": key}, "cached"
+
+        variant = make_variant(source, profile)
+        if variant is None:
+            if os.path.exists(dest):
+                os.remove(dest)
+            return dest, {"key": key, "original": True}, "original"
+        with open(dest, "wb") as dest_file:
+            dest_file.write(variant)
+        cache.put(key, dest)
+        return dest, {"key": key}, "generated"
+
+    counts = {}
+    saved = 0
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        for image, (dest, entry, result) in zip(images, pool.map(process, images)):
+            state[dest] = entry
+            counts[result] = counts.get(result, 0) + 1
+            if not entry.get("original"):
+                saved += os.path.getsize(image) - os.path.getsize(dest)
+    removed = remove_orphans(os.path.join(args.out, profile.name), state)
+    if removed > 0:
+        counts["removed"] = removed
+    save_state(state_path, state)
+
+    print("{}: {}, {:.1f} MB saved".format(profile.name, ", ".join(
+        "{} {}".format(n, r) for r, n in sorted(counts.items())), saved / 1e6))
+    if args.stamp:
+        os.makedirs(os.path.dirname(args.stamp) or ".", exist_ok=True)
+        with open(args.stamp, "w"):
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,51 @@
 #!/usr/bin/env python3
 
-# This script removes empty intersong / scripture environments.
-
-import os, sys
-
-def myprint(x):
-    print(x)
-
-                    
-def strip_empty_part(lines, start="\\begin{intersong}", end="\\end{intersong}", margin=8):
-    for i, line in enumerate(lines):
-        if start in line:
-            match_start = i
-        if end in line:
-            match_end = i
-
-    try: 
-        string = "".join(lines[match_start:match_end+1])
-        print("{} lines, {} chars({})".format(match_end - match_start, len(string), filename))
-    
-        if len(string) < (len(start) + len(end) + margin):
-            lines = lines[0:match_start] + lines[match_end+1:]
-            return lines
-    except UnboundLocalError:
-        pass
-        
-    return lines
-
-for root, dirnames, filenames in os.walk("Lieder"):
-        for filename in filenames:
-            if filename.endswith('.tex'):
-                
-                f = open(root+"/"+filename, "r")
-                lines = f.readlines()
-                f.close()
-                
-                cleaned = strip_empty_part(lines)
-                cleaned2 = strip_empty_part(cleaned, start="\\beginscripture", end="\\endscripture")
-                
-                f = open(root+"/"+filename, "w")
-                f.write("".join(cleaned2))
-                f.close()
\ No newline at end of file
+# Cleans up the song files (see pyralala/lint.py): removes empty intersong /
+# scripture environments. With --all, trailing whitespace and surplus blank
+# lines are removed as well and every file ends with a line break.
+#
+#   lieder-cleanup.py                  fix all of Lieder/
+#   lieder-cleanup.py --check          only report, exit with 1 if a file would change
+#   lieder-cleanup.py --all --check    also report formatting problems
+#
+# Files are processed in parallel and only written if their content changed,
+# so the build caches of unchanged songs stay valid.
+
+import argparse
+import glob
+import os
+import sys
+
+from pyralala.lint import DEFAULT_RULES, RULES, lint_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean up song files.")
+    parser.add_argument("songs", nargs="*", help="Song files (default: Lieder/*.tex).")
+    parser.add_argument("-c", "--check", action="store_true",
+                        help="Do not write the files, exit with 1 if one would change.")
+    parser.add_argument("-r", "--rule", action="append", choices=list(RULES),
+                        help="Apply only these rules (default: {}).".format(", ".join(DEFAULT_RULES)))
+    parser.add_argument("-a", "--all", action="store_true", help="Apply all rules.")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print the summary.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of files processed concurrently.")
+    args = parser.parse_args()
+
+    songs = sorted(args.songs or glob.glob("Lieder/*.tex"))
+    rules = list(RULES) if args.all else args.rule
+    results = lint_files(songs, not args.check, rules, args.jobs)
+    changed = [path for path, file_changed, _ in results if file_changed]
+    if not args.quiet:
+        for _, _, issues in results:
+            for issue in issues:
+                print(issue)
+
+    print("{} songs, {} {}".format(len(songs), len(changed),
+                                   "to clean up" if args.check else "cleaned up"), file=sys.stderr)
+    if args.check and len(changed) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+# Merges the index data (.sxd) of several editions into one index (.sbx).
+#
+# Every source can be given a style, e.g. to mark songs of a previous edition:
+#
+#   merge-index.py -o Ausgaben/PfadiralalaIVplus.sbx \
+#       'Ausgaben/PfadiralalaIV.sxd=~~~{\textit{&}}' Ausgaben/PfadiralalaIVplus.sxd
+#
+# "&" stands for the song title, styled entries lose their hyperlinks. The
+# result is cached on the hashes of all inputs.
+
+import argparse
+import sys
+
+from buildtools.cache import build_cache, digest
+from buildtools.latex import BuildError, SONGIDX, songidx
+from buildtools.sxd import IndexData
+
+
+def parse_source(arg):
+    path, _, style = arg.partition("=")
+    return path, style or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the song indexes of several editions.")
+    parser.add_argument("sources", nargs="+", metavar="SXD[=STYLE]",
+                        help="Index data files, optionally with a style for their titles.")
+    parser.add_argument("-o", "--out", required=True, help="Output .sbx file.")
+    parser.add_argument("--cache", default=".cache/sbx", help="Cache directory.")
+    args = parser.parse_args()
+
+    merged = None
+    for path, style in map(parse_source, args.sources):
+        index = IndexData.read(path)
+        if style is not None:
+            index = index.styled(style)
+        if merged is None:
+            merged = index
+        else:
+            merged.extend(index)
+
+    sxd_text = merged.dumps()
+    with open(SONGIDX[-1], "rb") as songidx_file:
+        key = digest(songidx_file.read(), sxd_text)
+
+    cache = build_cache(args.cache)
+    if cache.get(key, args.out):
+        print("{}: unchanged ({} entries)".format(args.out, len(merged.entries)))
+        return
+    songidx(sxd_text, args.out)
+    cache.put(key, args.out)
+    print("{}: {} entries".format(args.out, len(merged.entries)))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (BuildError, ValueError, OSError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
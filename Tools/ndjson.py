@@ -0,0 +1,89 @@
+"""
+Pipe mode for the converters: newline-delimited JSON on stdin and stdout
+
+Every input line is a request object, e.g.
+
+    {"id": "abend", "format": "html", "source": "\\beginsong{Abend} ..."}
+
+and gets one result line, in the order of the requests:
+
+    {"id": "abend", "ok": true, "output": "<html>..."}
+    {"id": 7, "ok": false, "error": "..."}
+
+The requests are converted in a pool of worker processes. At most max_inflight
+requests are read ahead, so memory stays bounded however long the input is.
+"""
+import collections
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+__all__ = ["serve"]
+
+
+class _Done(object):
+    """Result that is already known (e.g. invalid request), in place of a future."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def done(self):
+        return True
+
+    def result(self):
+        return self.value
+
+
+def _run(convert, request):
+    try:
+        return {"id": request.get("id"), "ok": True, "output": convert(request)}
+    except Exception as e:
+        return {"id": request.get("id"), "ok": False, "error": "{}: {}".format(type(e).__name__, e)}
+
+
+def _parse(line):
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return None, {"id": None, "ok": False, "error": "invalid request: {}".format(e)}
+    if not isinstance(request, dict):
+        return None, {"id": None, "ok": False, "error": "invalid request: not an object"}
+    return request, None
+
+
+def serve(convert, requests=sys.stdin, out=sys.stdout, jobs=None, max_inflight=None):
+    """Answer the requests with convert(request) -> output, return the number of errors.
+
+    convert has to be picklable (a module level function) if jobs is not 1."""
+    errors = 0
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs != 1 else None
+    max_inflight = max_inflight or 4 * (jobs or os.cpu_count() or 1)
+    pending = collections.deque()
+
+    def write(result):
+        nonlocal errors
+        errors += not result["ok"]
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+
+    try:
+        for line in requests:
+            if line.strip() == "":
+                continue
+            request, error = _parse(line)
+            if error is not None:
+                pending.append(_Done(error))
+            elif pool is None:
+                pending.append(_Done(_run(convert, request)))
+            else:
+                pending.append(pool.submit(_run, convert, request))
+            # write the results as soon as all earlier ones are written
+            while len(pending) >= max_inflight or (pending and pending[0].done()):
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return errors
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# Thin client of the conversion daemon (Tools/pfadi-daemon.py). Only uses the
+# standard library, so it starts fast:
+#
+#   pfadi-client.py html Lieder/Song.tex -o html/Song.html
+#   pfadi-client.py tex lied.txt -o Lieder/Lied.tex
+#   pfadi-client.py validate Lieder/*.tex
+#   pfadi-client.py md Lieder/*.tex -o 'export/{name}.md'
+#
+# All files of a call are sent as one batch. Without -o, the output is written
+# to stdout.
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+DEFAULT_SOCKET = os.path.join(".cache", "pfadi.sock")
+OPERATIONS = ["html", "md", "txt", "json", "tex", "validate", "ping", "shutdown"]
+
+
+def request(path, message):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall((json.dumps(message) + "\n").encode("utf-8"))
+        with client.makefile("rb") as response:
+            return json.loads(response.readline().decode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send conversions to the song daemon.")
+    parser.add_argument("op", choices=OPERATIONS, help="Operation.")
+    parser.add_argument("files", nargs="*", help="Input files.")
+    parser.add_argument("-o", "--out", help="Output file, {name} is replaced by the input name.")
+    parser.add_argument("-s", "--socket", default=DEFAULT_SOCKET, help="Socket path.")
+    args = parser.parse_args()
+
+    try:
+        if args.op in ("ping", "shutdown"):
+            print(json.dumps(request(args.socket, {"op": args.op})))
+            return
+        if args.out is not None and len(args.files) > 1 and "{name}" not in args.out:
+            parser.error("several files need an output path with {name}")
+
+        jobs = []
+        for path in args.files:
+            job = {"op": args.op, "path": os.path.abspath(path)}
+            if args.out is not None and args.op != "validate":
+                name = os.path.splitext(os.path.basename(path))[0]
+                job["out"] = os.path.abspath(args.out.replace("{name}", name))
+            jobs.append(job)
+        response = request(args.socket, {"jobs": jobs})
+    except (ConnectionRefusedError, FileNotFoundError):
+        print("no daemon on {}, start it with Tools/pfadi-daemon.py".format(args.socket),
+              file=sys.stderr)
+        sys.exit(2)
+
+    failed = False
+    for result in response.get("results", []):
+        if not result["ok"]:
+            print(result["error"], file=sys.stderr)
+            failed = True
+        elif "issues" in result:
+            for issue in result["issues"]:
+                print(issue)
+            failed = failed or len(result["issues"]) > 0
+        elif "output" in result:
+            sys.stdout.write(result["output"] + "\n")
+    if "error" in response:
+        print(response["error"], file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
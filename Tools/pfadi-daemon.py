@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+
+# Runs the conversion daemon (see pyralala/daemon.py), which keeps the
+# converters loaded and serves Tools/pfadi-client.py over a Unix socket.
+
+import argparse
+import os
+import sys
+
+from pyralala.daemon import DEFAULT_SOCKET, serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the song conversion daemon.")
+    parser.add_argument("-s", "--socket", default=DEFAULT_SOCKET, help="Socket path.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of worker processes.")
+    args = parser.parse_args()
+
+    print("listening on {}".format(args.socket), file=sys.stderr)
+    try:
+        serve(args.socket, args.jobs)
+    except OSError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+
+# Serves the songs of Lieder/ as JSON and HTML on localhost (see
+# pyralala/server.py):
+#
+#   pfadi-server.py -p 8080
+#   curl http://localhost:8080/songs/Abendward
+
+import argparse
+
+from pyralala.server import SongServer, SongStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the songs over HTTP.")
+    parser.add_argument("-d", "--songs", default="Lieder", help="Song directory.")
+    parser.add_argument("-H", "--host", default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument("-p", "--port", type=int, default=8080, help="Port to listen on.")
+    parser.add_argument("--cache-size", type=int, default=256,
+                        help="Number of parsed songs kept in memory.")
+    args = parser.parse_args()
+
+    server = SongServer(SongStore(args.songs, args.cache_size))
+    print("serving {} on http://{}:{}/songs".format(args.songs, args.host, args.port))
+    server.run(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
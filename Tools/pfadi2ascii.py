@@ -1,28 +1,142 @@
 #!/usr/bin/env python3
-import argparse, sys
+
+# Converts LaTeX song files to plain text, Markdown and/or HTML. Every song is
+# parsed once and compiled to all requested formats:
+#
+#   pfadi2ascii.py -f txt -f md -f html -o 'export/{name}.{ext}' Lieder/*.tex
+#
+# {name} in the output path is replaced by the name of the song file, {ext} by
+# the format. Without -o, a single song is written to stdout. Songs the reader
+# cannot handle are reported and skipped, they do not fail the run.
+#
+# With -t, the songs are also transposed (-t all: every key), {shift} in the
+# output path is replaced by the semitones. --capo gives the chords to play
+# with a capo on that fret:
+#
+#   pfadi2ascii.py -f html -t all -o 'export/{name}{shift}.{ext}' Lieder/*.tex
+#
+# With --pipe, requests are read as JSON lines from stdin and answered on
+# stdout (see ndjson.py), the source is given as "source" or "path":
+#
+#   {"id": 1, "format": "md", "transpose": 2, "source": "\beginsong{...} ..."}
+
+import argparse, functools, os, sys
+import ndjson
+from concurrent.futures import ProcessPoolExecutor
 from pyralala import SongReader
-from pyralala.export import Compiler, MarkdownCompiler, HTMLCompiler
+from pyralala.data import Song
+from pyralala.export import FORMATS, compile_formats
+from pyralala.transpose import parse_shift
+
+
+def read_song(path, capo=None):
+    reader = SongReader(path)
+    reader.read()
+    return reader.song if capo is None else reader.song.with_capo(capo)
 
-parser = argparse.ArgumentParser(description='Convert LaTeX songs files.')
-parser.add_argument("file", help="The LaTeX song file to be converted.")
-parser.add_argument("-o", "--out", help="Output file path.")
-args = parser.parse_args()
 
-try:
-    reader = SongReader(args.file)
+def convert_request(request, default_format="html"):
+    """Output of a pipe mode request."""
+    fmt = request.get("format", default_format)
+    if fmt not in FORMATS:
+        raise ValueError("unknown format {}".format(fmt))
+    if "source" in request:
+        reader = SongReader(str(request.get("id", "<stdin>")), text=request["source"])
+    else:
+        reader = SongReader(request["path"])
     reader.read()
-except (TypeError, EOFError) as e:
-    print(e)
-    sys.exit(0)
-
-try:
-    out = open(args.out, "w")
-except TypeError as e:
-    out = sys.stdout
-except (FileNotFoundError, PermissionError) as e:
-    print(e)
-    sys.exit(1)
-
-compiler = HTMLCompiler()
-compiler.compile(reader.song)
-compiler.write(out)
\ No newline at end of file
+    song = reader.song
+    if not isinstance(song, Song):
+        raise ValueError("no \\beginsong found")
+    if request.get("capo"):
+        song = song.with_capo(int(request["capo"]))
+    if request.get("transpose"):
+        song = song.transposed(parse_shift(str(request["transpose"])))
+    compiler = FORMATS[fmt]()
+    compiler.compile(song)
+    return compiler.text()
+
+
+def convert(path, formats, out_pattern, shifts=(0,), capo=None):
+    """Convert one song to all formats and keys, return (message, failed) if it does not work.
+
+    Songs the reader cannot handle are skipped, only errors of the output fail.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    files, targets = [], []
+    try:
+        song = read_song(path, capo)
+    except Exception as e:
+        return "{}: skipped, {}".format(path, e), False
+    try:
+        for shift in shifts:
+            for fmt in formats:
+                out_path = out_pattern.format(name=name, ext=fmt, shift="{:+d}".format(shift))
+                os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+                files.append(open(out_path, "w"))
+                targets.append((FORMATS[fmt], files[-1], shift))
+        compile_formats(song, targets)
+    except Exception as e:
+        return "{}: {}".format(path, e), True
+    finally:
+        for f in files:
+            f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert LaTeX songs files.')
+    parser.add_argument("files", nargs="*", help="The LaTeX song files to be converted.")
+    parser.add_argument("-o", "--out", help="Output file path, may contain {name} and {ext}.")
+    parser.add_argument("-f", "--format", action="append", choices=sorted(FORMATS),
+                        help="Output format, can be given several times (default: html).")
+    parser.add_argument("-t", "--transpose", action="append", metavar="SEMITONES",
+                        help="Transpose by the semitones (e.g. +2, -3 or all), can be given several times.")
+    parser.add_argument("--capo", type=int, help="Chords for playing with a capo on this fret.")
+    parser.add_argument("--pipe", action="store_true",
+                        help="Convert JSON lines requests from stdin (default format: the first -f).")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of songs converted concurrently.")
+    args = parser.parse_args()
+    formats = args.format or ["html"]
+
+    if args.pipe:
+        errors = ndjson.serve(functools.partial(convert_request, default_format=formats[0]), jobs=args.jobs)
+        sys.exit(1 if errors > 0 else 0)
+    if len(args.files) == 0:
+        parser.error("no song files given")
+    shifts = []
+    for value in args.transpose or ["0"]:
+        for shift in (range(12) if value == "all" else [parse_shift(value)]):
+            if shift not in shifts:
+                shifts.append(shift)
+
+    if args.out is None:
+        if len(args.files) > 1 or len(formats) > 1 or len(shifts) > 1:
+            parser.error("several songs, formats or keys need an output path with {name}, {ext} and {shift}")
+        try:
+            song = read_song(args.files[0], args.capo)
+        except (TypeError, EOFError) as e:
+            print(e)
+            sys.exit(0)
+        compile_formats(song, [(FORMATS[formats[0]], sys.stdout, shifts[0])])
+        sys.exit(0)
+
+    if (len(args.files) > 1 and "{name}" not in args.out) or (len(formats) > 1 and "{ext}" not in args.out) \
+            or (len(shifts) > 1 and "{shift}" not in args.out):
+        parser.error("several songs, formats or keys need an output path with {name}, {ext} and {shift}")
+
+    if len(args.files) == 1:
+        results = [convert(args.files[0], formats, args.out, shifts, args.capo)]
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            n = len(args.files)
+            results = list(pool.map(convert, args.files, [formats] * n, [args.out] * n,
+                                    [shifts] * n, [args.capo] * n))
+    results = [r for r in results if r is not None]
+    for message, _ in results:
+        print(message)
+    sys.exit(1 if any(failed for _, failed in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+# Exports an edition (Ausgaben/*.tex) as one book in the order of the edition,
+# with its chapters and thumb sections:
+#
+#   pfadi2book.py -f html -o html/{}.html Ausgaben/PfadiralalaIV.tex Ausgaben/PfadiTag.tex
+#
+# "{}" in the output path is replaced by the name of the edition. Songs that
+# are part of several editions are only parsed once.
+
+import argparse
+import os
+import sys
+
+from pyralala.edition import Edition, export
+from pyralala.export import FORMATS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export an edition as one book.")
+    parser.add_argument("editions", nargs="+", help="Edition files (Ausgaben/*.tex).")
+    parser.add_argument("-f", "--format", default="html", choices=sorted(FORMATS),
+                        help="Output format (default: html).")
+    parser.add_argument("-o", "--out",
+                        help="Output file, {} is replaced by the edition name (default: stdout).")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of songs parsed concurrently.")
+    parser.add_argument("--pics", action="store_true",
+                        help="Include the pictures placed between the songs.")
+    args = parser.parse_args()
+
+    if len(args.editions) > 1 and (args.out is None or "{}" not in args.out):
+        parser.error("exporting several editions needs an output path containing {}")
+
+    cache = {}
+    failed = 0
+    for path in args.editions:
+        edition = Edition.read(path)
+        if args.out is None:
+            failed += export(edition, FORMATS[args.format], sys.stdout, args.jobs, cache, args.pics)
+            continue
+        out_path = args.out.replace("{}", os.path.splitext(os.path.basename(path))[0])
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        with open(out_path, "w") as out:
+            failed += export(edition, FORMATS[args.format], out, args.jobs, cache, args.pics)
+        print("{}: {} songs".format(out_path, len(edition.songs)), file=sys.stderr)
+    if failed > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
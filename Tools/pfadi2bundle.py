@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+# Exports all songs into one binary bundle for offline readers (see
+# pyralala/bundle.py). Songs whose file did not change since the last export
+# are taken from the existing bundle instead of being parsed again, unless the
+# reader or the compilers changed.
+
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from pyralala import SongReader
+from pyralala.bundle import Bundle, BundleError, BundleWriter, code_digest, source_digest
+from pyralala.export import JSONCompiler
+
+
+def parse(path):
+    """Song data of a file, or the error message."""
+    try:
+        reader = SongReader(path)
+        reader.read()
+        compiler = JSONCompiler()
+        compiler.compile(reader.song)
+        return compiler.data, None
+    except Exception as e:
+        return None, "{}: {}".format(path, e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the songs as a binary bundle.")
+    parser.add_argument("songs", nargs="*", help="Song files (default: Lieder/*.tex).")
+    parser.add_argument("-o", "--out", default="export/Lieder.bundle", help="Bundle file.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of songs parsed concurrently.")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="Parse all songs, even if they did not change.")
+    args = parser.parse_args()
+
+    songs = sorted(args.songs or glob.glob("Lieder/*.tex"))
+    writer = BundleWriter()
+    todo = []
+    try:
+        old = None if args.force else Bundle(args.out)
+    except (FileNotFoundError, BundleError):
+        old = None
+
+    code = code_digest()
+    for path in songs:
+        song_id = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "rb") as song_file:
+            digest = source_digest(song_file.read(), code)
+        try:
+            if old is not None and old.digest(song_id) == digest:
+                writer.add(song_id, digest, old.song(song_id))
+                continue
+        except KeyError:
+            pass
+        todo.append((path, song_id, digest))
+    if old is not None:
+        old.close()
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for (path, song_id, digest), (data, error) in zip(
+                todo, pool.map(parse, [t[0] for t in todo], chunksize=8)):
+            if error is not None:
+                print(error, file=sys.stderr)
+                failed += 1
+                continue
+            writer.add(song_id, digest, data)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    writer.write(args.out + ".tmp")
+    os.replace(args.out + ".tmp", args.out)
+    print("{}: {} songs, {} parsed, {} failed, {} bytes".format(
+        args.out, len(songs) - failed, len(todo) - failed, failed, os.path.getsize(args.out)))
+    if failed > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,209 @@
 #!/usr/bin/env python3
 
+# Reorders (imposes) the pages of an A5 document for double-sided printing with
+# 2 pages per A4 sheet (short-edge binding).
+#
+# Layouts:
+#   cut-stack   A4 sheets are cut in half and the two stacks are put on top of each other
+#   booklet     one saddle-stitched booklet (sheets folded in the middle)
+#   signatures  several saddle-stitched booklets of --sheets sheets, bound together
+#
+# The pages are written to the output as they are imposed, without decoding
+# their content streams: every object a page references (fonts, images) is
+# written once, and the objects read from the input are released after every
+# A4 sheet, so the memory needed does not grow with the document.
+
 import argparse
-from PyPDF2 import PdfFileReader, PdfFileWriter
+import os
+import tempfile
+from PyPDF2 import PdfFileReader
+from PyPDF2.generic import (ArrayObject, DictionaryObject, IndirectObject, NameObject,
+                            NullObject, NumberObject, RectangleObject, StreamObject)
+
+# object numbers of the catalog and the page tree, the pages follow
+CATALOG, PAGES, FIRST_PAGE = 1, 2, 3
+
+
+def cut_stack(n):
+    m = -(-n // 4)  # number of A4 sheets
+    order = []
+    for i in range(m):
+        order += [i*2, m*2 + i*2, m*2 + i*2 + 1, i*2 + 1]
+    return order
+
+
+def booklet(n, offset=0):
+    p = -(-n // 4) * 4  # pages, padded to full sheets
+    order = []
+    for s in range(p // 4):
+        order += [p - 1 - s*2, s*2, s*2 + 1, p - 2 - s*2]
+    return [offset + i if i < n else None for i in order]
+
+
+def signatures(n, sheets=4):
+    order = []
+    for offset in range(0, n, sheets * 4):
+        order += booklet(min(sheets * 4, n - offset), offset)
+    return order
+
+
+LAYOUTS = {
+    "cut-stack": cut_stack,
+    "booklet": booklet,
+    "signatures": signatures,
+}
+
+
+class StreamingWriter(object):
+    """PDF writer that writes every page (and the objects it needs) when it is added.
 
-parser = argparse.ArgumentParser(description='Reorder an A5 document for double-sided printing on to-be-cut A4 pages.\n\n Print using 2 pages per sheet with short-edge binding.')
-parser.add_argument("pdf", help="The pdf of the document to be printed")
-parser.add_argument("-o", "--out", help="Output file path.")
-args = parser.parse_args()
+    Pages are added in their final order; references to pages of the input
+    (links) point to their first copy in the output."""
 
-if not args.out:
-    args.out = args.pdf[:-4]+"-a4print.pdf"
+    def __init__(self, out_file, in_pdf, order):
+        self.out = out_file
+        self.offsets = {}
+        self.pages = 0
+        self._numbers = {}  # (idnum, generation) in the input -> object number in the output
+        for position, i in enumerate(order):
+            if i is not None and i < in_pdf.getNumPages():
+                ref = in_pdf.getPage(i).indirectRef
+                self._numbers.setdefault((ref.idnum, ref.generation), FIRST_PAGE + position)
+        self._next = FIRST_PAGE + len(order)
+        self._pending = []
+        self.out.write(b"%PDF-1.5\n%\xe2\xe3\xcf\xd3\n")
 
-with open(args.pdf, "rb") as pdf_file, open(args.out, "wb") as out_file:
-    out_pdf = PdfFileWriter()
-    in_pdf = PdfFileReader(pdf_file)
+    def _number(self, ref):
+        key = ref.idnum, ref.generation
+        if key not in self._numbers:
+            self._numbers[key] = self._next
+            self._next += 1
+            self._pending.append(ref)
+        return self._numbers[key]
 
-    def add_page(i):
-        try:
-            out_pdf.addPage(in_pdf.getPage(i))
-        except IndexError:
-            out_pdf.addBlankPage()
+    def _remap(self, obj):
+        """Copy of a (direct) object with the references renumbered for the output."""
+        if isinstance(obj, IndirectObject):
+            return IndirectObject(self._number(obj), 0, None)
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._remap(value) for value in obj)
+        if isinstance(obj, StreamObject):
+            copy = obj.__class__()
+            copy._data = obj._data
+        elif isinstance(obj, DictionaryObject):
+            copy = DictionaryObject()
+        else:
+            return obj
+        for key, value in obj.items():
+            copy[key] = self._remap(value)
+        return copy
 
+    def _write(self, number, obj):
+        self.offsets[number] = self.out.tell()
+        self.out.write("{} 0 obj\n".format(number).encode())
+        obj.writeToStream(self.out, None)
+        self.out.write(b"\nendobj\n")
+
+    def _write_page(self, page):
+        page[NameObject("/Parent")] = IndirectObject(PAGES, 0, None)
+        self._write(FIRST_PAGE + self.pages, page)
+        self.pages += 1
+        # the objects the page references, and the ones they reference
+        while len(self._pending) > 0:
+            ref = self._pending.pop()
+            obj = ref.getObject()
+            # links to the document structure of the input are dropped
+            if isinstance(obj, DictionaryObject) and obj.get("/Type") in ("/Pages", "/Catalog"):
+                obj = NullObject()
+            self._write(self._numbers[ref.idnum, ref.generation], self._remap(obj))
+
+    def add_page(self, page):
+        self._write_page(self._remap(DictionaryObject(
+            (key, value) for key, value in page.items() if key != "/Parent")))
+
+    def add_blank_page(self, width, height):
+        page = DictionaryObject()
+        page[NameObject("/Type")] = NameObject("/Page")
+        page[NameObject("/MediaBox")] = RectangleObject([0, 0, width, height])
+        page[NameObject("/Resources")] = DictionaryObject()
+        self._write_page(page)
+
+    def close(self):
+        """Write the page tree, the catalog and the cross-reference table."""
+        pages = DictionaryObject()
+        pages[NameObject("/Type")] = NameObject("/Pages")
+        pages[NameObject("/Count")] = NumberObject(self.pages)
+        pages[NameObject("/Kids")] = ArrayObject(
+            IndirectObject(FIRST_PAGE + i, 0, None) for i in range(self.pages))
+        self._write(PAGES, pages)
+        catalog = DictionaryObject()
+        catalog[NameObject("/Type")] = NameObject("/Catalog")
+        catalog[NameObject("/Pages")] = IndirectObject(PAGES, 0, None)
+        self._write(CATALOG, catalog)
+
+        xref = self.out.tell()
+        size = max(self.offsets) + 1
+        self.out.write("xref\n0 {}\n0000000000 65535 f \n".format(size).encode())
+        for number in range(1, size):
+            self.out.write("{:010d} 00000 n \n".format(self.offsets[number]).encode())
+        self.out.write("trailer\n<< /Size {} /Root {} 0 R >>\nstartxref\n{}\n%%EOF\n".format(
+            size, CATALOG, xref).encode())
+
+
+def impose(in_pdf, writer, order):
+    """Add the pages of in_pdf to the writer in the given order, None or missing pages are blank.
+
+    The objects read from the input are released after every A4 sheet (4 pages)."""
     n = in_pdf.getNumPages()
-    m = int(n / 4) + 1
-    print("Opened {}, read {} pages, resulting in {} A4 pages.".format(args.pdf, n, m))
+    box = in_pdf.getPage(0).mediaBox
+    width, height = box.getWidth(), box.getHeight()
+    for position, i in enumerate(order):
+        if i is not None and i < n:
+            writer.add_page(in_pdf.getPage(i))
+        else:
+            writer.add_blank_page(width, height)
+        if position % 4 == 3:
+            in_pdf.resolvedObjects.clear()
 
-    for i in range(m):
-        add_page(      i*2)
-        add_page(m*2 + i*2)
-        add_page(m*2 + i*2 + 1)
-        add_page(      i*2 + 1)
 
-    out_pdf.write(out_file)
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Reorder an A5 document for double-sided printing on A4 pages.\n\n Print using 2 pages per sheet with short-edge binding.')
+    parser.add_argument("pdf", help="The pdf of the document to be printed")
+    parser.add_argument("-o", "--out", help="Output file path.")
+    parser.add_argument("-l", "--layout", default="cut-stack", choices=sorted(LAYOUTS),
+                        help="Imposition layout (default: cut-stack).")
+    parser.add_argument("-s", "--sheets", type=int, default=4,
+                        help="A4 sheets per signature for the signatures layout.")
+    args = parser.parse_args()
+
+    if args.sheets < 1:
+        parser.error("--sheets must be at least 1")
+    if not args.out:
+        args.out = args.pdf[:-4]+"-a4print.pdf"
+
+    with open(args.pdf, "rb") as pdf_file:
+        in_pdf = PdfFileReader(pdf_file, strict=False)
+        n = in_pdf.getNumPages()
+        if n == 0:
+            parser.error("{} has no pages".format(args.pdf))
+        if args.layout == "signatures":
+            order = signatures(n, args.sheets)
+        else:
+            order = LAYOUTS[args.layout](n)
+        print("Opened {}, read {} pages, resulting in {} A4 pages.".format(args.pdf, n, len(order) // 4))
+
+        # written next to the output and renamed, so a failed run leaves no partial file
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(os.path.abspath(args.out)),
+                                         suffix=".tmp", delete=False) as out_file:
+            try:
+                writer = StreamingWriter(out_file, in_pdf, order)
+                impose(in_pdf, writer, order)
+                writer.close()
+            except BaseException:
+                out_file.close()
+                os.remove(out_file.name)
+                raise
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(out_file.name, 0o666 & ~umask)
+        os.replace(out_file.name, args.out)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# Estimates the page layout of an edition without pdflatex (see pyralala/layout.py):
+#
+#   plan-edition.py Ausgaben/PfadiralalaIV.tex
+#   plan-edition.py --calibrate Ausgaben/PfadiralalaIV.sxd Ausgaben/PfadiralalaIVplus.tex
+#
+# --calibrate fits the layout model to the page numbers of previous builds
+# (the .sxd index data written next to the edition) and stores it in
+# .cache/layout-model.json. If the index data of the planned edition exists,
+# the estimated pages are compared with the real ones.
+
+import argparse
+import os
+import sys
+import time
+
+from pyralala.edition import Chapter, Edition, SongRef
+from pyralala.layout import (Geometry, LayoutModel, MetricsCache, calibration_samples,
+                             first_song_page, metrics_for, normalize_title, paginate,
+                             read_pages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate the page layout of an edition.")
+    parser.add_argument("edition", help="Edition file, e.g. Ausgaben/PfadiralalaIV.tex.")
+    parser.add_argument("--calibrate", action="append", metavar="SXD", default=[],
+                        help="Fit the model to the pages in this index data file, the edition "
+                             "is the .tex file with the same name (repeatable).")
+    parser.add_argument("--first-page", type=int,
+                        help="Page of the first song (default: from the index data or 1).")
+    parser.add_argument("--pics", action="store_true", help="Plan the edition with pictures.")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print the summary.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of songs read concurrently.")
+    parser.add_argument("--basic", default="Misc/basic.tex", help="Page geometry.")
+    parser.add_argument("--model", default=".cache/layout-model.json", help="Layout model.")
+    parser.add_argument("--cache", default=".cache/layout-metrics.json", help="Song metrics cache.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    geometry = Geometry.read(args.basic)
+    model = LayoutModel.load(args.model, geometry)
+    cache = MetricsCache(args.cache)
+
+    if args.calibrate:
+        samples = []
+        for sxd in args.calibrate:
+            edition = Edition.read(os.path.splitext(sxd)[0] + ".tex")
+            metrics = metrics_for(edition.songs, geometry, cache, args.jobs)
+            samples += calibration_samples(edition, metrics, read_pages(sxd))
+        model.calibrate(samples, geometry.text_height)
+        model.save(args.model)
+        print("calibrated with {} songs: {}".format(len(samples), ", ".join(
+            "{}={:.1f}".format(k, v) for k, v in model.params.items())), file=sys.stderr)
+
+    edition = Edition.read(args.edition)
+    metrics = metrics_for(edition.songs, geometry, cache, args.jobs)
+    cache.save()
+
+    sxd = os.path.splitext(args.edition)[0] + ".sxd"
+    pages = read_pages(sxd) if os.path.exists(sxd) else {}
+    first_page = args.first_page or first_song_page(edition, metrics, pages) or 1
+    placements, last_page = paginate(edition, metrics, model, geometry, first_page, args.pics)
+
+    errors = []
+    for placement in placements:
+        if isinstance(placement.entry, Chapter):
+            if not args.quiet:
+                print("{:>4}\t\t== {}".format(placement.page, placement.entry.title))
+            continue
+        title = metrics[placement.entry.path].title
+        actual = pages.get(normalize_title(title)) if pages else None
+        if actual is not None:
+            errors.append(abs(actual - placement.page))
+        if not args.quiet:
+            print("{:>4}\t{:.0f}pt\t{}{}".format(placement.page, placement.height, title,
+                                                 "" if actual is None else "\t({})".format(actual)))
+
+    songs = sum(1 for p in placements if isinstance(p.entry, SongRef))
+    print("{}: {} songs, pages {}-{} ({} pages), {:.2f}s".format(
+        edition.title, songs, first_page, last_page, last_page - first_page + 1,
+        time.perf_counter() - start), file=sys.stderr)
+    if len(errors) > 0:
+        print("mean page error {:.2f}, max {}".format(sum(errors) / len(errors), max(errors)),
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,9 @@ Pyralala
 @site: jonashoechst.de
 """
 from pyralala.data import *
+from pyralala.transpose import parse_shift
 import TexSoup
+import collections
 import re
 
 # TexSoup parses the chords backets as math environment, as '\[' begins this.
@@ -20,117 +22,239 @@ TexSoup.reader.ALL_TOKENS.remove('\]')
 
 
 IGNORE_CMD = {"intersong", "centering", "markboth", "beginscripture", "endscripture",
-              "nolyrics", "newline", "newpage", "transpose", "vfill", "newchords", "$"}
+              "nolyrics", "newline", "newpage", "vfill", "newchords", "$"}
+
+OPT_COMMENT_EX = re.compile(r"(?<!\\)%[^\n]*")
+OPT_PAIR_EX = re.compile(r"^(\w+)\s*=\s*(.*)$", re.DOTALL)
+
+
+def iter_opt_args(args):
+    """Yield the (key, value) pairs of a key=value option list.
+
+    Commas inside braces do not separate options. Items which are not of the
+    form key=value or have unbalanced braces are yielded as (None, item)."""
+    args = OPT_COMMENT_EX.sub("", args)
+    items, depth, start = [], 0, 0
+    for i, c in enumerate(args):
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+        elif c == "," and depth == 0:
+            items.append(args[start:i])
+            start = i + 1
+    items.append(args[start:])
+
+    for item in (i.strip() for i in items):
+        if len(item) == 0:
+            continue
+        match = OPT_PAIR_EX.match(item)
+        if match is None or item.count("{") != item.count("}"):
+            yield None, item
+            continue
+        key, val = match.group(1), match.group(2).strip()
+        if val.startswith("{") and val.endswith("}"):
+            val = val[1:-1]
+        yield key, val
 
 
 class SongReader:
-    def __init__(self, file_path):
+    """Reads a song file into a Song.
+
+    Commands are dispatched through the handlers registry, which maps command
+    names to callables taking the reader and the TexSoup node. Additional
+    commands can be supported with SongReader.register, e.g.:
+
+        @SongReader.register("hfill")
+        def read_hfill(reader, d):
+            reader.song.add_text(" ")
+    """
+    handlers = {}
+
+    def __init__(self, file_path, count_hits=False, text=None):
+        """Reads the song file, or the given text (file_path is then only its name)."""
         self.file_path = file_path
-        with open(file_path, "r") as file:
-            self.lines = file.read()
+        if text is None:
+            with open(file_path, "r") as file:
+                text = file.read()
+        self.lines = text
 
         self.tex = TexSoup.TexSoup(self.lines)
         self.song = DummySong()
         self._commands = {'everychorus': 'Refrain'}
+        # number of dispatches per command, only collected if requested
+        self.hits = collections.Counter() if count_hits else None
+
+    @classmethod
+    def register(cls, *names):
+        """Decorator registering a handler for the given command names.
+
+        Registering on a subclass does not change the handlers of its parents."""
+        def decorator(handler):
+            if "handlers" not in cls.__dict__:
+                cls.handlers = dict(cls.handlers)
+            for name in names:
+                cls.handlers[name] = handler
+            return handler
+        return decorator
 
     @staticmethod
     def parse_opt_args(args):
-        parsed = []
-        ex = re.compile(r"(\w+={[\w \(\),]+})")
-        for pair in ex.findall(args):
-            key, val = pair.split("=")
-            parsed.append((key, val.strip("{}")))
-        return parsed
+        return [(key, val) for key, val in iter_opt_args(args) if key is not None]
 
     def read_content(self, d):
         if isinstance(d, str):
             self.song.add_text(d)
+            return
         elif isinstance(d, TexSoup.data.RArg):
             self.song.add_text(d.value)
+            return
 
-        elif d.name == "beginsong":
-            for a in d.args:
-                if isinstance(a, TexSoup.data.RArg):
-                    self.song = Song(a.value)
-                elif isinstance(a, TexSoup.data.OArg):
-                    self.song.info = SongReader.parse_opt_args(a.value)
-        elif d.name == "endsong":
-            self.song.endsong()
-
-        elif d.name == "renewcommand":
-            name = d.args[0].contents[0].name
-            arg = list(d.contents)[1].args.all[0].contents[1]
-            self._commands[name] = arg
-
-        elif d.name == "beginchorus":
-            self.song.beginchorus(self._commands['everychorus'])
-        elif d.name == "printchorus":
-            self.song.beginchorus("Refrain (wdh.)")
-            self.song.endmusicpart()
-        elif d.name == "repchorus":
-            self.song.beginchorus("Refrain ({}x)".format(d.args[0]))
-            self.song.endmusicpart()
-
-        elif d.name == "beginverse":
-            self.song.beginverse()
-            for c in d.contents:
-                self.song.add_text(c)
-        elif d.name == "beginverse*":
-            self.song.beginanonverse()
-            for c in d.contents:
-                self.song.add_text(c)
-        elif d.name == "interlude":
-            self.song.beginanonverse()
-            self.song.add_text(d.args[0])
-            self.song.endmusicpart()
-
-        elif d.name in ["endverse", "endverse*", "endchorus"]:
-            self.song.endmusicpart()
-
-        elif d.name == "memorize":
-            if len(d.args) == 1:
-                self.song.memorize(key=d.args[0])
-            else:
-                self.song.memorize()
-        elif d.name == "replay":
-            if len(d.args) == 1:
-                self.song.replay(key=d.args[0])
+        handler = self.handlers.get(d.name)
+        if handler is None:
+            # probably an escaped sharp-chord
+            if d.name.startswith("#"):
+                handler = _read_sharp
             else:
-                self.song.replay()
-
-        elif d.name == "lrep":
-            self.song.add_text("|:")
-        elif d.name == "rrep":
-            self.song.add_text(":|")
-        elif d.name == "rep":
-            self.song.add_text(" (x{})".format(d.args[0]))
-        elif d.name == "echo":
-            self.song.add_text("({})".format(d.args[0]))
-        elif d.name == "emph":
-            self.song.add_text("*{}*".format(d.args[0]))
-
-        elif d.name == "includegraphics":
-            options = []
-            for a in d.args:
-                if isinstance(a, TexSoup.data.RArg):
-                    path = a.value
-                elif isinstance(a, TexSoup.data.OArg):
-                    options = SongReader.parse_opt_args(a.value)
-            self.song.includegraphics(path, options)
-
-        # probably an escaped sharp-chord
-        elif d.name.startswith("#"):
-            self.song.add_text(str(d)[1:])
-        elif d.name in IGNORE_CMD:
-            pass
-        else:
-            raise Exception(
-                "Element is not parsed: \"{}\" ({})".format(d.name, type(d)))
+                raise ReadError(
+                    "Element is not parsed: \"{}\" ({})".format(d.name, type(d)))
+        if self.hits is not None:
+            self.hits[d.name] += 1
+        handler(self, d)
 
     def read(self):
         try:
             for d in self.tex.expr.contents:
                 self.read_content(d)
         except AttributeError as e:
-            print(d)
-            raise e
+            raise ReadError("{} in \"{}\"".format(e, str(d)[:60])) from e
+
+
+def _read_sharp(reader, d):
+    reader.song.add_text(str(d)[1:])
+
+
+@SongReader.register(*IGNORE_CMD)
+def _read_ignored(reader, d):
+    pass
+
+
+@SongReader.register("beginsong")
+def _read_beginsong(reader, d):
+    for a in d.args:
+        if isinstance(a, TexSoup.data.RArg):
+            reader.song = Song(a.value)
+        elif isinstance(a, TexSoup.data.OArg):
+            reader.song.info = SongReader.parse_opt_args(a.value)
+
+
+@SongReader.register("endsong")
+def _read_endsong(reader, d):
+    reader.song.endsong()
+
+
+@SongReader.register("renewcommand")
+def _read_renewcommand(reader, d):
+    name = d.args[0].contents[0].name
+    arg = list(d.contents)[1].args.all[0].contents[1]
+    reader._commands[name] = arg
+
+
+@SongReader.register("beginchorus")
+def _read_beginchorus(reader, d):
+    reader.song.beginchorus(reader._commands['everychorus'])
+
+
+@SongReader.register("printchorus")
+def _read_printchorus(reader, d):
+    reader.song.beginchorus("Refrain (wdh.)")
+    reader.song.endmusicpart()
+
+
+@SongReader.register("repchorus")
+def _read_repchorus(reader, d):
+    reader.song.beginchorus("Refrain ({}x)".format(d.args[0]))
+    reader.song.endmusicpart()
+
+
+@SongReader.register("beginverse")
+def _read_beginverse(reader, d):
+    reader.song.beginverse()
+    for c in d.contents:
+        reader.song.add_text(c)
+
+
+@SongReader.register("beginverse*")
+def _read_beginanonverse(reader, d):
+    reader.song.beginanonverse()
+    for c in d.contents:
+        reader.song.add_text(c)
+
+
+@SongReader.register("interlude")
+def _read_interlude(reader, d):
+    reader.song.beginanonverse()
+    reader.song.add_text(d.args[0])
+    reader.song.endmusicpart()
+
+
+@SongReader.register("transpose")
+def _read_transpose(reader, d):
+    reader.song.transpose(parse_shift(str(d.args[0])))
+
+
+@SongReader.register("endverse", "endverse*", "endchorus")
+def _read_endmusicpart(reader, d):
+    reader.song.endmusicpart()
+
+
+@SongReader.register("memorize")
+def _read_memorize(reader, d):
+    if len(d.args) == 1:
+        reader.song.memorize(key=d.args[0])
+    else:
+        reader.song.memorize()
+
+
+@SongReader.register("replay")
+def _read_replay(reader, d):
+    if len(d.args) == 1:
+        reader.song.replay(key=d.args[0])
+    else:
+        reader.song.replay()
+
+
+@SongReader.register("lrep")
+def _read_lrep(reader, d):
+    reader.song.add_text("|:")
+
+
+@SongReader.register("rrep")
+def _read_rrep(reader, d):
+    reader.song.add_text(":|")
+
+
+@SongReader.register("rep")
+def _read_rep(reader, d):
+    reader.song.add_text(" (x{})".format(d.args[0]))
+
+
+@SongReader.register("echo")
+def _read_echo(reader, d):
+    reader.song.add_text("({})".format(d.args[0]))
+
+
+@SongReader.register("emph")
+def _read_emph(reader, d):
+    reader.song.add_text("*{}*".format(d.args[0]))
+
+
+@SongReader.register("includegraphics")
+def _read_includegraphics(reader, d):
+    options = []
+    for a in d.args:
+        if isinstance(a, TexSoup.data.RArg):
+            path = a.value
+        elif isinstance(a, TexSoup.data.OArg):
+            options = SongReader.parse_opt_args(a.value)
+    reader.song.includegraphics(path, options)
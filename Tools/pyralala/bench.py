@@ -0,0 +1,198 @@
+"""
+Benchmarks of the reader and the compilers
+
+Every song passes through the stages parse (TexSoup), read (command dispatch
+into the song model), finalize (MusicPart._finalize, chords of memorized and
+replayed parts) and one stage per output format. The time of every song and
+stage is measured separately; throughput, percentiles and the peak memory of
+the stages are summarized per suite. A song that fails to parse, read or
+finalize is left out of the later stages, the compilers are run one by one on
+the finalized song, so one failing format does not skip the others.
+
+Besides the corpus, synthetic stress songs exercise long verses, many
+\\memorize/\\replay pairs and many graphics.
+"""
+import io
+import os
+import time
+import tracemalloc
+
+from pyralala import SongReader
+from pyralala.data import Song
+from pyralala.export import FORMATS
+
+__all__ = ["STAGES", "stress_songs", "StageStats", "run_suite", "compare"]
+
+STAGES = ["parse", "read", "finalize"]
+
+SVG = '<?xml version="1.0"?>\n<svg width="10pt" height="10pt" viewBox="0 0 10 10">\n' \
+      '<path d="M0 0L10 10"/>\n</svg>\n'
+
+
+def _verse(lines, chords=True, memorize=None, replay=None):
+    out = ["\\beginverse" + ("\\memorize[{}]".format(memorize) if memorize else "")]
+    if replay:
+        out.append("\\replay[{}]".format(replay))
+    for i in range(lines):
+        if replay:
+            out.append("^Zeile {0} mit ^Text, der ^ersetzt wird ^{0}".format(i))
+        elif chords:
+            out.append("\\[Am]Zeile {0} mit \\[F]Text, der \\[C]lang \\[G]ist {0}".format(i))
+        else:
+            out.append("Zeile {} ohne Akkorde".format(i))
+    out.append("\\endverse")
+    return "\n".join(out)
+
+
+def _song(title, body):
+    return "\\beginsong{{{}}}[txt={{Benchmark}}, mel={{Benchmark}}, jahr={{2020}}]\n\n{}\n\n" \
+           "\\endsong\n".format(title, "\n\n".join(body))
+
+
+def stress_songs(directory):
+    """[(name, text)] of the synthetic stress songs, graphics are written to directory."""
+    graphic = os.path.join(directory, "stress.pdf")
+    with open(os.path.splitext(graphic)[0] + ".svg", "w") as svg_file:
+        svg_file.write(SVG)
+
+    long_verses = _song("Lange Strophen", [_verse(400), _verse(400, chords=False)])
+    replays = _song("Memorize und Replay", [
+        part for i in range(100)
+        for part in (_verse(4, memorize="m{}".format(i)), _verse(4, replay="m{}".format(i)))])
+    graphics = _song("Grafiken", [
+        part for i in range(200)
+        for part in (_verse(2), "\\includegraphics[width=1\\textwidth]{{{}}}".format(graphic))])
+    return [("stress/long-verses", long_verses), ("stress/memorize-replay", replays),
+            ("stress/graphics", graphics)]
+
+
+class StageStats(object):
+    def __init__(self):
+        self.times = []
+        self.peak = 0
+        self.errors = 0
+
+    def summary(self):
+        times = sorted(self.times)
+        if len(times) == 0:
+            return {"songs": 0, "errors": self.errors}
+
+        def percentile(p):
+            return times[min(len(times) - 1, int(round(p / 100 * (len(times) - 1))))] * 1000
+
+        total = sum(times)
+        return {
+            "songs": len(times),
+            "errors": self.errors,
+            "total": round(total, 4),
+            "throughput": round(len(times) / total, 1) if total > 0 else None,
+            "p50": round(percentile(50), 3),
+            "p90": round(percentile(90), 3),
+            "p99": round(percentile(99), 3),
+            "max": round(times[-1] * 1000, 3),
+            "peak_kb": round(self.peak / 1024, 1),
+        }
+
+
+def _finalize(song):
+    for part in song.music_parts:
+        part._finalize(song._memory)
+
+
+def _compile(compiler_cls, song):
+    compiler = compiler_cls()
+    compiler.compile(song)
+    out = io.StringIO()
+    compiler.write(out)
+    return out
+
+
+def _read(reader):
+    reader.read()
+    return reader.song
+
+
+def _timed(stats, stage, memory, f, *args):
+    """(ok, f(*args)), the time (or with memory the peak memory) is added to the stage."""
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result, ok = f(*args), True
+    except Exception:
+        result, ok = None, False
+    elapsed = time.perf_counter() - start
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    if not ok:
+        if not memory:
+            stats[stage].errors += 1
+    elif memory:
+        stats[stage].peak = max(stats[stage].peak, peak)
+    else:
+        stats[stage].times.append(elapsed)
+    return ok, result
+
+
+def _measure(name, text, formats, stats, memory):
+    ok, reader = _timed(stats, "parse", memory, lambda: SongReader(name, text=text))
+    if not ok:
+        return
+    ok, song = _timed(stats, "read", memory, _read, reader)
+    if not ok or not isinstance(song, Song):
+        return
+    ok, _ = _timed(stats, "finalize", memory, _finalize, song)
+    if not ok:
+        return
+    # every compiler on its own, a failing format does not skip the others
+    for fmt in formats:
+        _timed(stats, fmt, memory, _compile, FORMATS[fmt], song)
+
+
+def run_suite(songs, formats, repeat=3, memory=True, profile=None):
+    """{stage: summary} of the songs ([(name, text)]).
+
+    Every song is run repeat times, the fastest run counts. Peak memory is
+    measured in a separate run, as tracing slows down the stages. With a
+    cProfile.Profile as profile, the timed runs are profiled."""
+    stages = STAGES + list(formats)
+    best = {s: StageStats() for s in stages}
+    for name, text in songs:
+        runs = []
+        for _ in range(repeat):
+            stats = {s: StageStats() for s in stages}
+            if profile is not None:
+                profile.enable()
+            _measure(name, text, formats, stats, False)
+            if profile is not None:
+                profile.disable()
+            runs.append(stats)
+        for stage in stages:
+            times = [r[stage].times[0] for r in runs if len(r[stage].times) > 0]
+            if len(times) > 0:
+                best[stage].times.append(min(times))
+            best[stage].errors += runs[0][stage].errors
+        if memory:
+            _measure(name, text, formats, best, True)
+    return {stage: best[stage].summary() for stage in stages}
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Messages for the stages that are slower than in the baseline."""
+    regressions = []
+    for suite, stages in sorted(results.items()):
+        for stage, summary in stages.items():
+            old = baseline.get(suite, {}).get(stage)
+            if old is None or old.get("throughput") is None or summary.get("throughput") is None:
+                continue
+            if summary["throughput"] < old["throughput"] * (1 - tolerance):
+                regressions.append("{}/{}: {} songs/s instead of {}".format(
+                    suite, stage, summary["throughput"], old["throughput"]))
+            if summary["p90"] > old["p90"] * (1 + tolerance) and summary["p90"] - old["p90"] > 0.1:
+                regressions.append("{}/{}: p90 {:.2f}ms instead of {:.2f}ms".format(
+                    suite, stage, summary["p90"], old["p90"]))
+            if old.get("peak_kb") and summary["peak_kb"] > old["peak_kb"] * (1 + tolerance):
+                regressions.append("{}/{}: peak {:.0f}kB instead of {:.0f}kB".format(
+                    suite, stage, summary["peak_kb"], old["peak_kb"]))
+    return regressions
@@ -0,0 +1,228 @@
+"""
+Binary bundle of all songs, for offline readers
+
+Layout (all integers little endian):
+
+    header   magic "PFRL", version u16, reserved u16, song count u32,
+             string count u32, string table offset u64, song table offset u64
+    strings  string count x end offset u32, followed by the utf-8 data
+    songs    song count x (id string u32, record offset u64, record length u32,
+             source digest 16 bytes), sorted by id
+    records  one per song, see _encode_song
+
+Titles, metadata, headings and chords are interned in the string table, lyric
+lines are stored in the records. A reader maps the file and decodes only the
+record of the requested song. The source digest covers the song file and the
+code of the reader and compilers (code_digest); it allows to rebuild the bundle
+without parsing the songs that did not change.
+"""
+import bisect
+import hashlib
+import importlib
+import mmap
+import struct
+
+__all__ = ["BundleError", "Bundle", "BundleWriter", "source_digest", "code_digest"]
+
+MAGIC = b"PFRL"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIQQ")
+SONG_ENTRY = struct.Struct("<IQI16s")
+U8 = struct.Struct("<B")
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+PAIR = struct.Struct("<II")
+CHORD = struct.Struct("<HI")
+
+# part types
+ANON, VERSE, CHORUS, GRAPHICS = range(4)
+PART_TYPES = {"part": ANON, "verse": VERSE, "chorus": CHORUS, "graphics": GRAPHICS}
+PART_NAMES = {v: k for k, v in PART_TYPES.items()}
+# modules that turn a song file into the data of a record
+READER_MODULES = ("pyralala", "pyralala.data", "pyralala.transpose", "pyralala.export", "chords")
+
+
+class BundleError(Exception):
+    pass
+
+
+def code_digest():
+    """Digest of the reader and compiler code, a change invalidates all songs."""
+    h = hashlib.sha256()
+    for name in READER_MODULES:
+        with open(importlib.import_module(name).__file__, "rb") as module_file:
+            h.update(module_file.read())
+    return h.digest()
+
+
+def source_digest(data, code=b""):
+    """Digest of a song file (bytes) and the code digest as stored in the bundle."""
+    return hashlib.sha256(code + data).digest()[:16]
+
+
+class _Strings(object):
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def __call__(self, value):
+        value = str(value)
+        if value not in self.index:
+            self.index[value] = len(self.values)
+            self.values.append(value)
+        return self.index[value]
+
+    def encode(self):
+        data = [s.encode("utf-8") for s in self.values]
+        offsets, end = [], 0
+        for d in data:
+            end += len(d)
+            offsets.append(U32.pack(end))
+        return b"".join(offsets) + b"".join(data)
+
+
+def _encode_song(song, strings):
+    """Record of a song, given as the data of pyralala.export.JSONCompiler."""
+    out = [U32.pack(strings(song["title"])), U16.pack(len(song["info"]))]
+    for key, value in song["info"].items():
+        out.append(PAIR.pack(strings(key), strings(value)))
+    out.append(U16.pack(len(song["parts"])))
+    for part in song["parts"]:
+        kind = PART_TYPES[part["type"]]
+        out.append(U8.pack(kind))
+        if kind == GRAPHICS:
+            out.append(U32.pack(strings(part["path"])))
+            continue
+        label = part.get("heading", part.get("number", ""))
+        out.append(U32.pack(strings(label)))
+        out.append(U16.pack(len(part["lines"])))
+        for line in part["lines"]:
+            text = line["text"].encode("utf-8")
+            out.append(U32.pack(len(text)))
+            out.append(text)
+            out.append(U16.pack(len(line["chords"])))
+            for pos, chord in line["chords"]:
+                out.append(CHORD.pack(pos, strings(chord)))
+    return b"".join(out)
+
+
+class Bundle(object):
+    """Memory mapped bundle, songs are decoded on access."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise BundleError("{}: empty file".format(path))
+        if len(self._map) < HEADER.size:
+            raise BundleError("{}: not a song bundle".format(path))
+        (magic, version, _, self._count, self._string_count,
+         self._strings_at, self._songs_at) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise BundleError("{}: not a song bundle (version {})".format(path, VERSION))
+        self._data_at = self._strings_at + self._string_count * U32.size
+        self._string_cache = {}
+        self._ids = [self.string(self._entry(i)[0]) for i in range(self._count)]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def ids(self):
+        return list(self._ids)
+
+    def string(self, i):
+        if i not in self._string_cache:
+            end = U32.unpack_from(self._map, self._strings_at + i * U32.size)[0]
+            start = U32.unpack_from(self._map, self._strings_at + (i - 1) * U32.size)[0] if i > 0 else 0
+            self._string_cache[i] = self._map[self._data_at + start:self._data_at + end].decode("utf-8")
+        return self._string_cache[i]
+
+    def _entry(self, i):
+        return SONG_ENTRY.unpack_from(self._map, self._songs_at + i * SONG_ENTRY.size)
+
+    def index(self, song_id):
+        i = bisect.bisect_left(self._ids, song_id)
+        if i == self._count or self._ids[i] != song_id:
+            raise KeyError(song_id)
+        return i
+
+    def digest(self, song_id):
+        return self._entry(self.index(song_id))[3]
+
+    def song(self, song_id):
+        """Data of a song, in the form of pyralala.export.JSONCompiler."""
+        _, offset, _, _ = self._entry(self.index(song_id))
+        m, pos = self._map, offset
+
+        def read(fmt):
+            nonlocal pos
+            values = fmt.unpack_from(m, pos)
+            pos += fmt.size
+            return values if len(values) > 1 else values[0]
+
+        song = {"title": self.string(read(U32)), "info": {}, "parts": []}
+        for _ in range(read(U16)):
+            key, value = read(PAIR)
+            song["info"][self.string(key)] = self.string(value)
+        for _ in range(read(U16)):
+            kind = read(U8)
+            part = {"type": PART_NAMES[kind]}
+            song["parts"].append(part)
+            if kind == GRAPHICS:
+                part["path"] = self.string(read(U32))
+                continue
+            label = self.string(read(U32))
+            if kind == CHORUS:
+                part["heading"] = label
+            elif kind == VERSE:
+                part["number"] = int(label)
+            part["lines"] = []
+            for _ in range(read(U16)):
+                length = read(U32)
+                text = m[pos:pos + length].decode("utf-8")
+                pos += length
+                chords = [[p, self.string(c)] for p, c in
+                          (read(CHORD) for _ in range(read(U16)))]
+                part["lines"].append({"text": text, "chords": chords})
+        return song
+
+
+class BundleWriter(object):
+    def __init__(self):
+        self._songs = {}
+
+    def add(self, song_id, digest, song):
+        self._songs[song_id] = (digest, song)
+
+    def write(self, path):
+        strings = _Strings()
+        ids = sorted(self._songs)
+        records = [_encode_song(self._songs[i][1], strings) for i in ids]
+        id_strings = [strings(i) for i in ids]
+        string_table = strings.encode()
+
+        strings_at = HEADER.size
+        songs_at = strings_at + len(string_table)
+        offset = songs_at + SONG_ENTRY.size * len(ids)
+        table = []
+        for song_id, id_string, record in zip(ids, id_strings, records):
+            table.append(SONG_ENTRY.pack(id_string, offset, len(record), self._songs[song_id][0]))
+            offset += len(record)
+
+        with open(path, "wb") as out:
+            out.write(HEADER.pack(MAGIC, VERSION, 0, len(ids), len(strings.values),
+                                  strings_at, songs_at))
+            out.write(string_table)
+            out.write(b"".join(table))
+            out.write(b"".join(records))
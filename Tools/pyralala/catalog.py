@@ -0,0 +1,151 @@
+"""
+SQLite catalog of the song metadata and edition membership
+
+The \\beginsong options of every song are stored in the meta table, the
+editions in Ausgaben/*.tex in the editions table. Songbooks are either the
+keys of SONGBOOK_FORMAT (pfi, bo, ju, ..., with the page as value) or the names
+of edition files (PfadiralalaIV, ...). Files are only read again if their
+hash changed.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+
+from pyralala import iter_opt_args
+from pyralala.data import METAINFO_FORMAT, SONGBOOK_FORMAT
+from pyralala.edition import Edition
+
+__all__ = ["AUTHOR_KEYS", "Catalog"]
+
+BEGINSONG_EX = re.compile(r"\\beginsong\{([^}]*)\}\s*(?:\[((?:[^\[\]]|\{[^{}]*\})*)\])?")
+COMMENT_EX = re.compile(r"(?<!\\)%[^\n]*")
+
+# keys naming the authors of a song
+AUTHOR_KEYS = ["wuw", "mel", "txt"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, digest TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS songs (id TEXT PRIMARY KEY, path TEXT NOT NULL, title TEXT);
+CREATE TABLE IF NOT EXISTS meta (song_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS meta_song ON meta (song_id);
+CREATE INDEX IF NOT EXISTS meta_key ON meta (key, value);
+CREATE TABLE IF NOT EXISTS editions (edition TEXT NOT NULL, song_id TEXT NOT NULL,
+                                     position INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS editions_edition ON editions (edition, song_id);
+CREATE INDEX IF NOT EXISTS editions_song ON editions (song_id);
+CREATE VIEW IF NOT EXISTS books AS
+    SELECT song_id, key AS book, value AS page FROM meta WHERE key IN ({})
+    UNION ALL SELECT song_id, edition, position FROM editions;
+""".format(", ".join("'{}'".format(k) for k in SONGBOOK_FORMAT))
+
+
+def _song_id(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def read_song_meta(text):
+    """(title, [(key, value)]) of the first \\beginsong in a song file."""
+    match = BEGINSONG_EX.search(COMMENT_EX.sub("", text))
+    if match is None:
+        return None, []
+    options = [(k, v) for k, v in iter_opt_args(match.group(2) or "") if k is not None]
+    return match.group(1), options
+
+
+class Catalog(object):
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def _changed(self, path, data):
+        digest = hashlib.sha256(data).hexdigest()
+        row = self.db.execute("SELECT digest FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == digest:
+            return False
+        self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?)", (path, digest))
+        return True
+
+    def update(self, song_paths, edition_paths):
+        """Read the changed files, drop deleted ones, return the number of changed files."""
+        changed = 0
+        with self.db:
+            for path in song_paths:
+                with open(path, "rb") as song_file:
+                    data = song_file.read()
+                if not self._changed(path, data):
+                    continue
+                changed += 1
+                song_id = _song_id(path)
+                title, options = read_song_meta(data.decode("utf-8", "replace"))
+                self.db.execute("DELETE FROM meta WHERE song_id = ?", (song_id,))
+                self.db.execute("INSERT OR REPLACE INTO songs VALUES (?, ?, ?)",
+                                (song_id, path, title))
+                self.db.executemany("INSERT INTO meta VALUES (?, ?, ?)",
+                                    [(song_id, k, v) for k, v in options])
+
+            for path in edition_paths:
+                with open(path, "rb") as edition_file:
+                    data = edition_file.read()
+                if not self._changed(path, data):
+                    continue
+                changed += 1
+                edition = _song_id(path)
+                self.db.execute("DELETE FROM editions WHERE edition = ?", (edition,))
+                self.db.executemany("INSERT INTO editions VALUES (?, ?, ?)", [
+                    (edition, _song_id(p), i + 1) for i, p in enumerate(Edition.read(path).songs)])
+
+            self._remove_missing()
+        return changed
+
+    def _remove_missing(self):
+        for path, in self.db.execute("SELECT path FROM files").fetchall():
+            if os.path.exists(path):
+                continue
+            self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+            if self.db.execute("DELETE FROM songs WHERE path = ?", (path,)).rowcount > 0:
+                self.db.execute("DELETE FROM meta WHERE song_id = ?", (_song_id(path),))
+            else:
+                self.db.execute("DELETE FROM editions WHERE edition = ?", (_song_id(path),))
+
+    def books(self):
+        """[(book, number of songs)]"""
+        return self.db.execute(
+            "SELECT book, COUNT(DISTINCT song_id) FROM books GROUP BY book ORDER BY book").fetchall()
+
+    def query(self, in_books=(), not_in_books=(), author=None, title=None, meta=()):
+        """[(id, title)] of the songs matching all given conditions.
+
+        meta is a list of (key, value) pairs, values may contain % wildcards."""
+        conditions, params = [], []
+        for book in in_books:
+            conditions.append("id IN (SELECT song_id FROM books WHERE book = ?)")
+            params.append(book)
+        for book in not_in_books:
+            conditions.append("id NOT IN (SELECT song_id FROM books WHERE book = ?)")
+            params.append(book)
+        if author is not None:
+            conditions.append("id IN (SELECT song_id FROM meta WHERE key IN ({}) AND value LIKE ?)"
+                              .format(", ".join("?" * len(AUTHOR_KEYS))))
+            params += AUTHOR_KEYS + ["%{}%".format(author)]
+        if title is not None:
+            conditions.append("title LIKE ?")
+            params.append("%{}%".format(title))
+        for key, value in meta:
+            conditions.append("id IN (SELECT song_id FROM meta WHERE key = ? AND value LIKE ?)")
+            params += [key, value]
+
+        sql = "SELECT id, title FROM songs"
+        if len(conditions) > 0:
+            sql += " WHERE " + " AND ".join(conditions)
+        return self.db.execute(sql + " ORDER BY title COLLATE NOCASE", params).fetchall()
+
+    def meta(self, song_id):
+        """Metadata of a song, in the order of METAINFO_FORMAT and SONGBOOK_FORMAT."""
+        order = list(METAINFO_FORMAT) + list(SONGBOOK_FORMAT)
+        rows = self.db.execute("SELECT key, value FROM meta WHERE song_id = ?", (song_id,))
+        return sorted(rows, key=lambda r: order.index(r[0]) if r[0] in order else len(order))
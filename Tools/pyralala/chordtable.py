@@ -0,0 +1,168 @@
+"""
+Chord inventory of the editions and generated chord tables
+
+The chords of every song are taken from the pyralala model (after \\transpose)
+or, for songs TexSoup cannot parse or the reader does not support (ReadError),
+from the \\[...] chords of the source; those songs are reported.
+Chords are identified by pitch, quality and bass note, so C# and D& or B& and
+A# are the same chord. Lower case notes in runs like "h-b&-a" are bass lines,
+not minor chords, and are left out.
+
+The fingering database are the hand-maintained tables in Misc/Grifftabelle*.tex:
+the generated table of an edition has the same layout (header, sections,
+\\gtab lines, footer), but only the chords the edition uses. The chords of the
+songs are cached by file hash and reader code (see buildtools.results), so only
+changed songs are read again.
+"""
+import collections
+import re
+
+from buildtools.results import ResultCache, cached_map, modules_digest
+from chords import LATEX_CHORD_EX, parse as parse_chord
+from pyralala import SongReader
+from pyralala.data import ReadError, Song
+from pyralala.transpose import NOTES, SEPARATOR_EX, parse_shift, transpose_chord
+
+__all__ = ["TABLES", "chord_key", "chord_keys", "song_chords", "ChordCache", "inventory",
+           "ChordTable"]
+
+# instrument -> hand-maintained table
+TABLES = collections.OrderedDict([
+    ("UkuleleGCEA", "Misc/GrifftabelleUkuleleGCEA.tex"),
+    ("UkuleleADFisH", "Misc/GrifftabelleUkuleleADFisH.tex"),
+    ("UkuleleDGHE", "Misc/GrifftabelleUkuleleDGHE.tex"),
+    ("Gitarre", "Misc/GrifftabelleGitarre.tex"),
+])
+
+GTAB_EX = re.compile(r"\\gtab\{([^}]*)\}\{([^}]*)\}[^\n]*\n?")
+SECTION_EX = re.compile(r"^\\begin\{flushleft\}.*\n?", re.MULTILINE)
+SOURCE_EX = re.compile(r"\\transpose\{([^}]*)\}|" + LATEX_CHORD_EX.pattern)
+COMMENT_EX = re.compile(r"(?<!\\)%[^\n]*")
+# chords per line in the generated tables
+ROW = 6
+# TexSoup parse errors and constructs the reader does not support
+READ_ERRORS = (TypeError, EOFError, ReadError)
+# code the cached chords depend on
+CODE_MODULES = ("pyralala", "pyralala.data", "pyralala.transpose", "pyralala.chordtable", "chords")
+
+
+def chord_key(chord):
+    """(pitch class, quality, bass pitch class) of a single chord, None if it is none."""
+    parsed = parse_chord(chord)
+    if parsed is None:
+        return None
+    quality = parsed.quality
+    if parsed.root.islower() and not quality.startswith("m"):
+        quality = "m" + quality  # l-style minor chord
+    bass = NOTES.get(parsed.bass) if parsed.bass else None
+    return NOTES[parsed.note], quality, bass
+
+
+def chord_keys(chords):
+    """(chord, key) of all chords in a chord string like "G--D" or "Dsus4/f#"."""
+    tokens = SEPARATOR_EX.split(chords)
+    run = "-" in chords
+    for i, token in enumerate(tokens):
+        if i % 2 == 1 or (run and token[:1].islower()):
+            continue
+        # chords after a slash are bass notes, they belong to the chord before
+        if i >= 2 and tokens[i - 1] == "/":
+            continue
+        if i + 2 < len(tokens) and tokens[i + 1] == "/":
+            token = token + "/" + tokens[i + 2]
+        key = chord_key(token)
+        if key is not None:
+            yield token, key
+
+
+def _chords_from_tex(text):
+    found, shift = set(), 0
+    for match in SOURCE_EX.finditer(COMMENT_EX.sub("", text)):
+        if match.group(1) is not None:
+            shift = (shift + parse_shift(match.group(1))) % 12
+        else:
+            found.add(transpose_chord(match.group(2), shift) if shift else match.group(2))
+    return found
+
+
+def song_chords(path):
+    """(sorted chord strings, None) of a song file, or (chords, error) if they were
+    taken from the source because the reader failed."""
+    error = None
+    try:
+        reader = SongReader(path)
+        reader.read()
+        if isinstance(reader.song, Song):
+            return sorted({chord for part in reader.song.music_parts
+                           for line in part.chords for _, chord in line}), None
+        error = "no \\beginsong found"
+    except READ_ERRORS as e:
+        error = "{}: {}".format(type(e).__name__, str(e).split("\n", 1)[0])
+    with open(path, "r", encoding="utf-8", errors="replace") as song_file:
+        return sorted(_chords_from_tex(song_file.read())), error
+
+
+class ChordCache(ResultCache):
+    """Chords (and fallback errors) of song files, keyed by the file hash.
+
+    The version covers the reader code, so changing it reads all songs again."""
+
+    VERSION = 3
+
+    def __init__(self, path):
+        super().__init__(path, "{}:{}".format(self.VERSION, modules_digest(*CODE_MODULES)))
+
+    def decode(self, value):
+        return tuple(value)
+
+
+def inventory(paths, cache=None, jobs=None):
+    """{path: ([chord], error)} of the songs (see song_chords), songs missing in the
+    cache are read in parallel."""
+    return cached_map(song_chords, paths, cache, jobs)
+
+
+class ChordTable(object):
+    """Chord table of an instrument: header, [(section heading, [(chord, fingering)])], footer."""
+
+    def __init__(self, header, sections, footer):
+        self.header = header
+        self.sections = sections
+        self.footer = footer
+
+    @classmethod
+    def read(cls, path):
+        with open(path, "r", encoding="utf-8") as table_file:
+            text = table_file.read()
+        gtabs = list(GTAB_EX.finditer(text))
+        headings = list(SECTION_EX.finditer(text[:gtabs[-1].end()]))
+        header = text[:headings[0].start()]
+        sections = []
+        for i, heading in enumerate(headings):
+            end = headings[i + 1].start() if i + 1 < len(headings) else gtabs[-1].end()
+            sections.append((heading.group().rstrip("\n"), GTAB_EX.findall(text, heading.end(), end)))
+        return cls(header, sections, text[gtabs[-1].end():].lstrip("\n"))
+
+    def fingerings(self):
+        """{chord key: (chord, fingering)}, the first entry of a chord counts."""
+        found = {}
+        for _, entries in self.sections:
+            for chord, fingering in entries:
+                key = chord_key(chord)
+                if key is not None:
+                    found.setdefault(key, (chord, fingering))
+        return found
+
+    def render(self, keys):
+        """Text of the table with only the chords whose keys are given."""
+        out = [self.header]
+        for heading, entries in self.sections:
+            used = [(c, f) for c, f in entries if chord_key(c) in keys]
+            if len(used) == 0:
+                continue
+            out.append(heading + "\n\n")
+            for i in range(0, len(used), ROW):
+                out.append("".join("\\gtab{{{}}}{{{}}}\n".format(c, f) for c, f in used[i:i + ROW]))
+                out.append("\n")
+        out.append(self.footer)
+        return "".join(out)
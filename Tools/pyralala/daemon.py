@@ -0,0 +1,144 @@
+"""
+Conversion daemon
+
+Keeps SongReader, the compilers and the SongKonverter of txt2Latex loaded in
+a pool of worker processes and serves conversions over a Unix domain socket,
+so a single conversion does not pay for the interpreter startup and imports.
+
+The protocol is line based JSON. Every request line holds a batch of jobs and
+is answered with one line holding their results, in the same order:
+
+    {"jobs": [{"op": "html", "path": "/abs/Lieder/Song.tex"},
+              {"op": "tex", "path": "/abs/song.txt", "out": "/abs/song.tex"}]}
+    {"results": [{"ok": true, "output": "<html>..."}, {"ok": true, "out": "/abs/song.tex"}]}
+
+Operations: txt, md, html, json (song file to that format), tex (text file to
+a song file, see txt2Latex) and validate (see pyralala.validate). Without
+"out", the output is returned. {"op": "ping"} and {"op": "shutdown"} control the daemon.
+"""
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from pyralala import SongReader
+from pyralala.export import FORMATS
+from pyralala.validate import validate_file
+
+__all__ = ["DEFAULT_SOCKET", "run_job", "Daemon", "serve"]
+
+DEFAULT_SOCKET = os.path.join(".cache", "pfadi.sock")
+TXT2LATEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "txt2Latex")
+
+_konverter = None
+
+
+def _song_konverter():
+    global _konverter
+    if _konverter is None:
+        sys.path.insert(0, os.path.normpath(TXT2LATEX_DIR))
+        from song_converter import SongKonverter
+        _konverter = SongKonverter(templatePfad="Template.jinja")
+    return _konverter
+
+
+def _warm_up(_):
+    try:
+        _song_konverter()
+    except ImportError:
+        # e.g. no jinja2: only the tex jobs fail
+        pass
+    return os.getpid()
+
+
+def run_job(job):
+    """Run one job (in a worker process), return its result."""
+    op, path, out = job.get("op"), job.get("path"), job.get("out")
+    try:
+        if op in FORMATS:
+            reader = SongReader(path)
+            reader.read()
+            compiler = FORMATS[op]()
+            compiler.compile(reader.song)
+            output = compiler.text()
+        elif op == "tex":
+            with open(path, "r", encoding="utf-8") as text_file:
+                output = _song_konverter().konvertiere(text_file.read())
+        elif op == "validate":
+            return {"ok": True, "issues": [str(i) for i in validate_file(path)]}
+        else:
+            raise ValueError("unknown operation {}".format(op))
+
+        if out is None:
+            return {"ok": True, "output": output}
+        with open(out, "w", encoding="utf-8") as out_file:
+            out_file.write(output)
+        return {"ok": True, "out": out}
+    except Exception as e:
+        return {"ok": False, "error": "{}: {}".format(path, e)}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode("utf-8"))
+            except ValueError as e:
+                self._send({"error": "invalid request: {}".format(e)})
+                continue
+
+            if request.get("op") == "ping":
+                self._send({"ok": True, "pid": os.getpid()})
+            elif request.get("op") == "shutdown":
+                self._send({"ok": True})
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            else:
+                jobs = request.get("jobs", [])
+                self._send({"results": list(self.server.pool.map(run_job, jobs))})
+
+    def _send(self, response):
+        self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+
+class Daemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, jobs=None):
+        self.pool = ProcessPoolExecutor(max_workers=jobs)
+        # import the converters in all workers before the first request
+        list(self.pool.map(_warm_up, range(jobs or os.cpu_count() or 1)))
+        socketserver.UnixStreamServer.__init__(self, path, _Handler)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        self.pool.shutdown()
+
+
+def _remove_stale(path):
+    """Remove the socket of a daemon that is no longer running."""
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(path)
+            return
+    raise OSError("a daemon is already listening on {}".format(path))
+
+
+def serve(path=DEFAULT_SOCKET, jobs=None):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _remove_stale(path)
+    server = Daemon(path, jobs)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
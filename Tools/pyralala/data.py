@@ -1,11 +1,14 @@
 """
 Data structures used by pyralala
 """
-import re
+import copy
 import itertools
 import collections
 
-__all__ = ["Song", "DummySong"]
+from chords import LATEX_CHORD_EX
+from pyralala.transpose import chord_root, prefers_flats, transpose_chord
+
+__all__ = ["Song", "DummySong", "ReadError"]
 
 METAINFO_FORMAT = collections.OrderedDict([
     ("mel", " Melodie: {}"),
@@ -30,10 +33,17 @@ SONGBOOK_FORMAT = collections.OrderedDict([
 ])
 
 
+class ReadError(Exception):
+    """A song uses a construct the reader does not support."""
+
+
 class DummySong(object):
     def add_text(self, text):
         return
 
+    def transpose(self, semitones):
+        return
+
 
 class Song(object):
     class MusicPart(object):
@@ -41,6 +51,8 @@ class Song(object):
             self._raw_text = ""
             self._lines = []
             self._replay_key = ""
+            # semitones of \transpose in the source when the part started
+            self.transposition = 0
 
         def append(self, new_text):
             self._raw_text += str(new_text)
@@ -65,12 +77,9 @@ class Song(object):
             self.lyrics = []
             self.chords = []
 
-            # lookup previously saved chords
-            try:
-                chords = memory[self._replay_key]
-                chord_gen = (c for c in chords)
-            except KeyError:
-                return
+            # lookup previously saved chords, a register without chords replays none
+            chords = memory.get(self._replay_key, [])
+            chord_gen = (c for c in chords)
 
             # get extra chords for this part
             extra = self._get_memorize_chords(token="§")
@@ -82,8 +91,12 @@ class Song(object):
                 loc = 0
                 for c in l:
                     if c == '^':
-                        line_chords.append((loc, next(chord_gen)))
-                    elif c == "$":
+                        chord = next(chord_gen, None)
+                        if chord is None:
+                            raise ReadError("More ^ than memorized chords ({}) for \\replay[{}]".format(
+                                len(chords), self._replay_key))
+                        line_chords.append((loc, chord))
+                    elif c == "§":
                         line_chords.append((loc, next(extra_gen)))
                     else:
                         loc += 1
@@ -92,10 +105,9 @@ class Song(object):
 
         def _get_memorize_chords(self, token="^"):
             # find all the chords
-            ex = re.compile(r"\\\[([^\]]+)\]")
-            chords = ex.findall("\n".join(self._lines))
+            chords = LATEX_CHORD_EX.findall("\n".join(self._lines))
             # replace chords in the lines
-            self._lines = [ex.subn(token, l)[0] for l in self._lines]
+            self._lines = [LATEX_CHORD_EX.sub(token, l) for l in self._lines]
             return chords
 
         def __repr__(self, head="[Music Part]"):
@@ -154,6 +166,9 @@ class Song(object):
         self._verse_counter = 0
         self._memory = {}
         self._memorize_key = None
+        self._transposition = 0
+        # semitones the chords were shifted by transposed()
+        self.semitones = 0
         self._contents.append(self.Intermediate())
 
     def __repr__(self):
@@ -162,19 +177,24 @@ class Song(object):
             ascii_song += str(c)
         return ascii_song
 
+    def _begin(self, part):
+        part.transposition = self._transposition
+        self._contents.append(part)
+
     def beginchorus(self, heading):
-        self._contents.append(self.Chorus(heading))
+        self._begin(self.Chorus(heading))
 
     def beginverse(self):
         self._verse_counter += 1
-        self._contents.append(self.Verse(self._verse_counter))
+        self._begin(self.Verse(self._verse_counter))
 
     def beginanonverse(self):
-        self._contents.append(self.AnonVerse())
+        self._begin(self.AnonVerse())
 
     def endmusicpart(self):
-        # implicit memorize, if default is not yet set.
-        if not "" in self._memory:
+        # implicit memorize, if default is not yet set; as in songs.sty only verses
+        # memorize, choruses always replay
+        if not "" in self._memory and not isinstance(self._contents[-1], self.Chorus):
             self._memorize_key = ""
         self._contents[-1].end(self._memory, self._memorize_key)
         self._contents.append(self.Intermediate())
@@ -188,6 +208,57 @@ class Song(object):
 
     def endsong(self):
         self._contents.append(self.Intermediate())
+        # apply \transpose of the source, spelled for the resulting key
+        flats = prefers_flats(self.key)
+        for part in self.music_parts:
+            if part.transposition != 0:
+                part.chords = [[(pos, transpose_chord(chord, part.transposition, flats))
+                                for pos, chord in line] for line in part.chords]
+                part.transposition = 0
+
+    def transpose(self, semitones):
+        """\transpose: shift the chords of the following parts."""
+        self._transposition = (self._transposition + semitones) % 12
+
+    @property
+    def music_parts(self):
+        return [c for c in self._contents if isinstance(c, self.MusicPart)]
+
+    @property
+    def key(self):
+        """(pitch class, minor) of the first chord, None for songs without chords."""
+        for part in self.music_parts:
+            for line in part.chords:
+                for _, chord in line:
+                    root = chord_root(chord)
+                    if root is not None:
+                        return (root[0] + part.transposition) % 12, root[1]
+        return None
+
+    def transposed(self, semitones, flats=None):
+        """Copy of the song with all chords shifted by the number of semitones.
+
+        The parsed song is shared, only the chord lists are replaced. Flats or
+        sharps are chosen by the resulting key unless flats is given."""
+        song = copy.copy(self)
+        song.semitones = self.semitones + semitones
+        if flats is None:
+            key = self.key
+            flats = key is not None and prefers_flats(((key[0] + semitones) % 12, key[1]))
+        song._contents = []
+        for part in self._contents:
+            if isinstance(part, self.MusicPart):
+                part = copy.copy(part)
+                part.chords = [[(pos, transpose_chord(chord, semitones, flats))
+                                for pos, chord in line] for line in part.chords]
+            song._contents.append(part)
+        return song
+
+    def with_capo(self, fret):
+        """Copy of the song with the chords to play with a capo on the fret."""
+        song = self.transposed(-fret)
+        song.info = [(k, v) for k, v in self.info if k != "capo"] + [("capo", str(fret))]
+        return song
 
     def memorize(self, key=""):
         self._memorize_key = key
@@ -0,0 +1,141 @@
+"""
+Editions of the songbook (Ausgaben/*.tex)
+
+An edition file defines the order of the book: songs are included with
+\\input{Lieder/...}, chapters start with \\songchapter, thumb sections with
+\\setthumb and pictures between songs are placed in intersong blocks, pages
+are broken with \\newpage or \\clearpage. The paths in an edition are relative
+to the repository root, the parent of the directory of the edition file.
+export() compiles all songs of an edition into one ordered document. Every
+song is parsed only once, in parallel, and the book is written while the
+songs are compiled.
+"""
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from pyralala import SongReader
+
+__all__ = ["Chapter", "Thumb", "SongRef", "Intersong", "PageBreak", "Edition", "export"]
+
+COMMENT_EX = re.compile(r"(?<!\\)%[^\n]*")
+TITLE_EX = re.compile(
+    r"\\(?:provide|new|renew)command\{?\\bookname\}?\{((?:[^{}]|\{[^{}]*\})*)\}")
+MARKUP_EX = re.compile(r"\\[a-zA-Z]+\s*|[{}]")
+ENTRY_EX = re.compile(
+    r"\\input\{(Lieder/[^}]+)\}"
+    r"|\\songchapter\{([^}]*)\}"
+    r"|\\setthumb\{([^}]*)\}"
+    r"|\\begin\{intersong\}(.*?)\\end\{intersong\}"
+    r"|\\(newpage|clearpage)", re.DOTALL)
+IMAGE_EX = re.compile(r"\\(?:includegraphics(?:\[[^\]]*\])?|\w*WallPaper\{[^}]*\})\{([^}]+)\}")
+
+
+class Chapter(object):
+    def __init__(self, title):
+        self.title = title
+
+
+class Thumb(object):
+    def __init__(self, letter):
+        self.letter = letter
+
+
+class SongRef(object):
+    def __init__(self, path):
+        self.path = path if path.endswith(".tex") else path + ".tex"
+
+
+class Intersong(object):
+    def __init__(self, images, text=""):
+        self.images = images
+        self.text = text
+
+
+class PageBreak(object):
+    pass
+
+
+class Edition(object):
+    def __init__(self, title, entries, root="."):
+        self.title = title
+        self.entries = entries
+        self.root = root
+
+    @classmethod
+    def read(cls, path):
+        with open(path, "r", encoding="utf-8") as edition_file:
+            text = COMMENT_EX.sub("", edition_file.read())
+
+        title = TITLE_EX.search(text)
+        entries = []
+        for match in ENTRY_EX.finditer(text):
+            song, chapter, thumb, intersong, page_break = match.groups()
+            if song is not None:
+                entries.append(SongRef(song))
+            elif chapter is not None:
+                entries.append(Chapter(chapter))
+            elif thumb is not None:
+                entries.append(Thumb(thumb))
+            elif intersong is not None:
+                entries.append(Intersong(IMAGE_EX.findall(intersong), intersong))
+            else:
+                entries.append(PageBreak())
+        title = MARKUP_EX.sub("", title.group(1)) if title else path
+        return cls(title, entries, os.path.dirname(os.path.dirname(os.path.abspath(path))))
+
+    @property
+    def songs(self):
+        """Paths of the songs in book order, without duplicates (relative to root)."""
+        return list(dict.fromkeys(e.path for e in self.entries if isinstance(e, SongRef)))
+
+
+def compile_song(path, compiler_cls):
+    """Lines of the compiled song, or the error message."""
+    try:
+        reader = SongReader(path)
+        reader.read()
+        compiler = compiler_cls(standalone=False)
+        compiler.compile(reader.song)
+        return compiler.lines, None
+    except Exception as e:
+        return [], "{}: {}".format(path, e)
+
+
+def export(edition, compiler_cls, out=sys.stdout, jobs=None, cache=None, pics=False):
+    """Write the edition as one document, return the number of failed songs.
+
+    cache maps song paths to compiled lines and can be shared between the
+    exports of several editions with the same compiler."""
+    cache = {} if cache is None else cache
+    compiler = compiler_cls(standalone=False)
+    todo = [path for path in edition.songs if path not in cache]
+    failed = 0
+
+    def emit(lines):
+        if len(lines) > 0:
+            out.write("\n".join(lines) + "\n")
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # map yields in book order, so the book is written as the songs finish
+        paths = [os.path.join(edition.root, path) for path in todo]
+        results = zip(todo, pool.map(compile_song, paths, [compiler_cls] * len(todo)))
+        emit(compiler.book_start(edition.title))
+        for entry in edition.entries:
+            if isinstance(entry, SongRef):
+                while entry.path not in cache:
+                    path, (lines, error) = next(results)
+                    if error is not None:
+                        print(error, file=sys.stderr)
+                        failed += 1
+                    cache[path] = lines
+                emit(cache[entry.path])
+            elif isinstance(entry, Chapter):
+                emit(compiler.book_chapter(entry.title))
+            elif isinstance(entry, Thumb):
+                emit(compiler.book_thumb(entry.letter))
+            elif isinstance(entry, Intersong) and pics:
+                emit(compiler.book_images(entry.images))
+        emit(compiler.book_end())
+    return failed
@@ -1,18 +1,23 @@
 """
 Data structures used by pyralala
 """
+import re
 import sys
 import itertools
+import json
+import collections
 import os.path
 import tempfile
 import subprocess
 import pyralala
 
-__all__ = ["Compiler"]
+__all__ = ["Compiler", "MarkdownCompiler", "HTMLCompiler", "JSONCompiler", "FORMATS", "compile_formats"]
 
 
 class Compiler(object):
-    def __init__(self):
+    def __init__(self, standalone=True):
+        # a song which is not standalone is part of a book (see pyralala.edition)
+        self.standalone = standalone
         self._lines = []
 
     def compile(self, song, out=sys.stdout):
@@ -32,8 +37,17 @@ class Compiler(object):
 
         self._compile_end(song)
 
+    @property
+    def lines(self):
+        """Lines of the last compiled song."""
+        return list(self._lines)
+
+    def text(self):
+        """The last compiled song as one string."""
+        return "\n".join(self._lines)
+
     def write(self, out=sys.stdout):
-        out.write("\n".join(self._lines))
+        out.write(self.text())
 
     def _compile_start(self, song):
         self._lines.append("### {} ###".format(song.title))
@@ -65,6 +79,22 @@ class Compiler(object):
             out = out.ljust(pos) + val
         return out
 
+    # The book_* methods return the lines framing the songs of an edition.
+    def book_start(self, title):
+        return ["=" * (len(title) + 8), "=== {} ===".format(title), "=" * (len(title) + 8), ""]
+
+    def book_chapter(self, title):
+        return ["", "=== {} ===".format(title), ""]
+
+    def book_thumb(self, letter):
+        return ["--- {} ---".format(letter), ""]
+
+    def book_images(self, paths):
+        return ["[Graphic: {}]".format(p) for p in paths]
+
+    def book_end(self):
+        return []
+
 
 class MarkdownCompiler(Compiler):
     def _compile_start(self, song):
@@ -98,35 +128,56 @@ class MarkdownCompiler(Compiler):
             out = out.ljust(pos) + val
         return out
 
+    def book_start(self, title):
+        return ["# {}".format(title), ""]
+
+    def book_chapter(self, title):
+        return ["# {}".format(title), ""]
+
+    def book_thumb(self, letter):
+        return ["### {}".format(letter), ""]
+
+    def book_images(self, paths):
+        return ["![](../{})".format(p) for p in paths] + [""]
 
-SVG_IGNORE_ATTRIBUTES = ("height", "width")
+
+SVG_SIZE_EX = re.compile(r"\s(height|width)=\"[^\"]*\"")
 
 
 class HTMLCompiler(Compiler):
-    def _compile_start(self, song):
-        self._lines.append("<html>")
-        self._lines.append("<head>")
-        self._lines.append("    <title>{}</title>".format(song.title))
-        self._lines.append("    <meta charset=\"UTF-8\">")
-        self._lines.append(
+    @staticmethod
+    def _head(title, info=[]):
+        lines = []
+        lines.append("<html>")
+        lines.append("<head>")
+        lines.append("    <title>{}</title>".format(title))
+        lines.append("    <meta charset=\"UTF-8\">")
+        lines.append(
             "    <meta name=\"viewport\" content=\"width=device-width, initial-scale=0.5, user-scalable=yes\">")
-        self._lines.append(
+        lines.append(
             "    <meta name=\"keywords\" content=\"Liederbuch, Songbook, Songs, Bündisch, Pfadfinder, Pfadiralala, VCP\">")
-        for k, v in song.info:
-            self._lines.append(
+        for k, v in info:
+            lines.append(
                 "    <meta name=\"{}\" content=\"{}\">".format(k, v))
             # additionally set the song author as document author (to enable search engines better matching)
             if k in ["wuw", "mel", "txt"]:
-                self._lines.append(
+                lines.append(
                     "    <meta name=\"author\" content=\"{}\">".format(v))
-        self._lines.append("    ")
-        self._lines.append("    <style>")
+        lines.append("    ")
+        lines.append("    <style>")
         head_path = os.path.join(os.path.dirname(__file__), "pyralala.css")
         with open(head_path, "r") as head_file:
-            self._lines.append(head_file.read())
-        self._lines.append("    </style>")
-        self._lines.append("</head>")
-        self._lines.append("<body>")
+            lines.append(head_file.read())
+        lines.append("    </style>")
+        lines.append("</head>")
+        lines.append("<body>")
+        return lines
+
+    def _compile_start(self, song):
+        if self.standalone:
+            self._lines += self._head(song.title, song.info)
+        else:
+            self._lines.append("<article class=\"song\">")
         self._lines.append("<header>")
         self._lines.append("    <h2> {} </h2>".format(song.title))
         self._lines.append("</header>")
@@ -168,20 +219,114 @@ class HTMLCompiler(Compiler):
         self._lines.append(
             "    <h4>{}</h4>".format("".join(song.songbookinfo)))
         self._lines.append("</footer>")
-        self._lines.append("</body>")
-        self._lines.append("</html>")
+        if self.standalone:
+            self._lines.append("</body>")
+            self._lines.append("</html>")
+        else:
+            self._lines.append("</article>")
+
+    def book_start(self, title):
+        return self._head(title) + ["<h1>{}</h1>".format(title)]
+
+    def book_chapter(self, title):
+        return ["<h1 class=\"chapter\">{}</h1>".format(title)]
+
+    def book_thumb(self, letter):
+        return ["<h2 class=\"thumb\" id=\"thumb-{0}\">{0}</h2>".format(letter)]
+
+    def book_images(self, paths):
+        return ["<img class=\"intersong\" src=\"../{}\">".format(p) for p in paths]
+
+    def book_end(self):
+        return ["</body>", "</html>"]
 
     def _compile_graphics(self, part):
         graphics_id = os.path.splitext(os.path.basename(part.path))[0]
-        temp_name = tempfile.mktemp()
-        subprocess.call(["pdf2svg", part.path, temp_name])
-        with open(temp_name, "r") as temp_file:
-            svg = temp_file.readlines()
+        # scores can be rendered to svg directly (Tools/render-scores.py -T svg)
+        svg_path = os.path.splitext(part.path)[0] + ".svg"
+        if os.path.exists(svg_path):
+            with open(svg_path, "r") as svg_file:
+                svg = svg_file.read()
+        else:
+            temp_name = tempfile.mktemp()
+            subprocess.call(["pdf2svg", part.path, temp_name])
+            with open(temp_name, "r") as temp_file:
+                svg = temp_file.read()
+            os.remove(temp_name)
+
+        # drop the xml declaration and the fixed size of the svg element
+        start = svg.index("<svg")
+        end = svg.index(">", start) + 1
+        self._lines.append(SVG_SIZE_EX.sub("", " ".join(svg[start:end].split())))
+        for svg_line in svg[end:].splitlines():
+            if len(svg_line) > 0:
+                self._lines.append(svg_line.replace("glyph", graphics_id))
+
+
+class JSONCompiler(Compiler):
+    """Song as a JSON object (one line), lyrics with the positions of their chords.
+
+    After compiling, the object is also available as the data attribute."""
+
+    def _compile_start(self, song):
+        self.data = collections.OrderedDict([
+            ("title", song.title),
+            ("info", collections.OrderedDict(song.info)),
+            ("parts", []),
+        ])
+
+    def _compile_end(self, song):
+        self._lines.append(json.dumps(self.data, ensure_ascii=False))
+
+    def _compile_music(self, part):
+        data = collections.OrderedDict([("type", "part")])
+        if isinstance(part, pyralala.data.Song.Chorus):
+            data["type"] = "chorus"
+            data["heading"] = part.heading
+        elif isinstance(part, pyralala.data.Song.Verse):
+            data["type"] = "verse"
+            data["number"] = part.verse_number
+        data["lines"] = [{"text": lyric_line, "chords": chord_line}
+                         for lyric_line, chord_line in zip(part.lyrics, part.chords)]
+        self.data["parts"].append(data)
+
+    def _compile_graphics(self, part):
+        self.data["parts"].append({"type": "graphics", "path": part.path})
+
+    def book_start(self, title):
+        return [json.dumps({"book": title}, ensure_ascii=False)]
+
+    def book_chapter(self, title):
+        return [json.dumps({"chapter": title}, ensure_ascii=False)]
+
+    def book_thumb(self, letter):
+        return [json.dumps({"thumb": letter}, ensure_ascii=False)]
+
+    def book_images(self, paths):
+        return [json.dumps({"images": paths}, ensure_ascii=False)]
+
+
+# output formats: file extension -> compiler
+FORMATS = {
+    "txt": Compiler,
+    "md": MarkdownCompiler,
+    "html": HTMLCompiler,
+    "json": JSONCompiler,
+}
 
-            self._lines.append(" ".join([attr for attr in svg[1].split(
-                " ") if not attr.startswith(SVG_IGNORE_ATTRIBUTES)]))
 
-            for svg_line in svg[2:]:
-                self._lines.append(svg_line[:-1].replace("glyph", graphics_id))
+def compile_formats(song, targets):
+    """Compile one parsed song with several compilers.
 
-        os.remove(temp_name)
+    targets is a list of (compiler class, writable file) pairs or of (compiler
+    class, writable file, semitones) triples to compile the song transposed.
+    Each transposition is computed once for all compilers."""
+    songs = {0: song}
+    for target in targets:
+        compiler_cls, out = target[:2]
+        semitones = target[2] if len(target) > 2 else 0
+        if semitones not in songs:
+            songs[semitones] = song.transposed(semitones)
+        compiler = compiler_cls()
+        compiler.compile(songs[semitones])
+        compiler.write(out)
@@ -0,0 +1,378 @@
+"""
+Page layout estimation for the editions
+
+The typeset height of a song is estimated from its pyralala model: a linear
+combination of the number of songs (title and spacing), metadata lines, lyric
+lines (long lines are wrapped), chord lines, verses/choruses and the height of
+the included graphics. The weights start from the spacing in Misc/basic.tex
+and can be calibrated with the page numbers of a previous build (.sxd files).
+
+paginate() places the songs of an edition like songs.sty does with one column:
+a song that does not fit on the rest of the page starts on a new one, \\newpage
+and \\clearpage (also in intersong blocks) break the page. The metrics of the
+songs are cached by the hashes of the file, the page geometry and the included
+graphics, so planning an edition does not parse any song that did not change.
+"""
+import collections
+import json
+import math
+import os
+import re
+
+from buildtools.cache import digest, files_digest
+from buildtools.results import ResultCache, cached_map, modules_digest
+from buildtools.sxd import IndexData
+from pyralala import SongReader, iter_opt_args
+from pyralala.data import METAINFO_FORMAT, SONGBOOK_FORMAT, Song
+from pyralala.edition import Chapter, Intersong, PageBreak, SongRef
+
+__all__ = ["Geometry", "SongMetrics", "LayoutModel", "song_metrics", "MetricsCache",
+           "metrics_digest", "metrics_for", "paginate", "normalize_title", "read_pages",
+           "calibration_samples", "first_song_page"]
+
+# length units in TeX points
+UNITS = {"pt": 1.0, "bp": 1.00375, "mm": 2.84528, "cm": 28.4528, "in": 72.27}
+# head height + head sep and footskip of the book class (10pt)
+HEAD = 12.0 + 25.0
+FOOT = 30.0
+# average width of a character of the lyrics font (Helvetica, 10pt)
+CHAR_WIDTH = 5.0
+# heading of \songchapter (\LARGE with 3.5ex before and .4ex after)
+CHAPTER_HEIGHT = 40.0
+# graphics that cannot be measured
+DEFAULT_GRAPHIC_HEIGHT = 150.0
+
+COMMENT_EX = re.compile(r"(?<!\\)%[^\n]*")
+GEOMETRY_EX = re.compile(r"\\usepackage\[([^\]]*)\]\{geometry\}", re.DOTALL)
+LENGTH_EX = re.compile(r"^\s*([\d.]+)\s*(pt|bp|mm|cm|in)\s*$")
+VERSESEP_EX = re.compile(r"\\versesep\s*=\s*([\d.]+)\s*(pt|bp|mm|cm|in)")
+MEDIABOX_EX = re.compile(rb"/MediaBox\s*\[\s*([\d.\-]+)\s+([\d.\-]+)\s+([\d.\-]+)\s+([\d.\-]+)\s*\]")
+TEXTWIDTH_EX = re.compile(r"^\s*([\d.]*)\s*\\(?:textwidth|linewidth|columnwidth)\s*$")
+
+BEGINSONG_EX = re.compile(r"\\beginsong\{([^}]*)\}\s*(?:\[((?:[^\[\]]|\{[^{}]*\})*)\])?")
+PART_EX = re.compile(r"\\(begin(?:verse|chorus)\*?|printchorus|repchorus|interlude)\b")
+PART_END_EX = re.compile(r"\\end(?:verse|chorus)\*?")
+GRAPHICS_EX = re.compile(r"\\includegraphics(?:\[([^\]]*)\])?\{([^}]+)\}")
+BREAK_EX = re.compile(r"\\(?:newpage|clearpage)\b|\\vspace\*?\{\\textheight\}")
+PICS_EX = re.compile(r"\\ifthenelse\{\\boolean\{pics\}\}\{")
+# code the cached metrics depend on
+CODE_MODULES = ("pyralala", "pyralala.data", "pyralala.transpose", "pyralala.layout", "chords")
+
+
+def _length(value):
+    match = LENGTH_EX.match(value)
+    return float(match.group(1)) * UNITS[match.group(2)] if match else None
+
+
+class Geometry(object):
+    """Text area and verse spacing (in pt), read from Misc/basic.tex."""
+
+    def __init__(self, text_width=351.0, text_height=505.0, versesep=10.0):
+        self.text_width = text_width
+        self.text_height = text_height
+        self.versesep = versesep
+
+    @classmethod
+    def read(cls, path="Misc/basic.tex"):
+        with open(path, "r", encoding="utf-8") as basic_file:
+            text = COMMENT_EX.sub("", basic_file.read())
+        geometry = GEOMETRY_EX.search(text)
+        options = dict(iter_opt_args(geometry.group(1))) if geometry else {}
+        lengths = {k: _length(v) for k, v in options.items() if k is not None}
+
+        self = cls()
+        if None not in [lengths.get(k) for k in ("paperwidth", "left", "right")]:
+            self.text_width = lengths["paperwidth"] - lengths["left"] - lengths["right"]
+        if None not in [lengths.get(k) for k in ("paperheight", "top", "bottom")]:
+            self.text_height = lengths["paperheight"] - lengths["top"] - lengths["bottom"]
+            if "includeheadfoot" in [v for k, v in iter_opt_args(geometry.group(1)) if k is None]:
+                self.text_height -= HEAD + FOOT
+        versesep = VERSESEP_EX.search(text)
+        if versesep is not None:
+            self.versesep = float(versesep.group(1)) * UNITS[versesep.group(2)]
+        return self
+
+
+SongMetrics = collections.namedtuple(
+    "SongMetrics", "title meta_lines lines chord_lines parts graphics")
+
+# weights of the metrics in pt, "songs" is the height of every song without content
+FEATURES = ["songs", "meta_lines", "lines", "chord_lines", "parts", "graphics"]
+
+
+def _features(metrics):
+    return [1.0, metrics.meta_lines, metrics.lines, metrics.chord_lines, metrics.parts,
+            metrics.graphics]
+
+
+class LayoutModel(object):
+    def __init__(self, params=None, geometry=None):
+        geometry = geometry or Geometry()
+        self.params = collections.OrderedDict([
+            ("songs", 36.0), ("meta_lines", 12.0), ("lines", 12.0), ("chord_lines", 8.0),
+            ("parts", geometry.versesep), ("graphics", 1.0)])
+        self.params.update(params or {})
+
+    def height(self, metrics):
+        return sum(self.params[k] * x for k, x in zip(FEATURES, _features(metrics)))
+
+    @classmethod
+    def load(cls, path, geometry=None):
+        try:
+            with open(path, "r") as model_file:
+                return cls(json.load(model_file), geometry)
+        except FileNotFoundError:
+            return cls(geometry=geometry)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as model_file:
+            json.dump(self.params, model_file, indent=1)
+
+    def calibrate(self, samples, page_height, pull=0.1):
+        """Fit the weights to (metrics, pages between the song and the next) samples.
+
+        Ridge regression towards the current weights, pull is the strength of
+        that prior relative to the data of each feature."""
+        prior = [self.params[k] for k in FEATURES]
+        n = len(FEATURES)
+        a = [[0.0] * n for _ in range(n)]
+        b = [0.0] * n
+        for metrics, pages in samples:
+            x = _features(metrics)
+            y = pages * page_height
+            for i in range(n):
+                b[i] += x[i] * y
+                for j in range(n):
+                    a[i][j] += x[i] * x[j]
+        for i in range(n):
+            weight = pull * a[i][i] if a[i][i] > 0 else 1.0
+            a[i][i] += weight
+            b[i] += weight * prior[i]
+        for k, value in zip(FEATURES, _solve(a, b)):
+            self.params[k] = max(value, 0.0)
+
+
+def _solve(a, b):
+    """Solution of the linear system a x = b (Gaussian elimination)."""
+    n = len(b)
+    m = [row[:] + [b[i]] for i, row in enumerate(a)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+        m[col], m[pivot] = m[pivot], m[col]
+        for r in range(col + 1, n):
+            factor = m[r][col] / m[col][col]
+            for c in range(col, n + 1):
+                m[r][c] -= factor * m[col][c]
+    x = [0.0] * n
+    for r in reversed(range(n)):
+        x[r] = (m[r][n] - sum(m[r][c] * x[c] for c in range(r + 1, n))) / m[r][r]
+    return x
+
+
+def _wrapped(line, chars_per_line):
+    return max(1, math.ceil(len(line) / chars_per_line))
+
+
+def graphic_height(path, options, geometry):
+    """Height of an included graphic in pt, from the MediaBox of PDFs."""
+    options = dict(options)
+    try:
+        with open(path, "rb") as graphic_file:
+            boxes = MEDIABOX_EX.findall(graphic_file.read())
+        page = int(options.get("page", 1))
+        x0, y0, x1, y1 = (float(v) for v in boxes[min(page, len(boxes)) - 1])
+    except (OSError, ValueError, IndexError):
+        return DEFAULT_GRAPHIC_HEIGHT
+    width, height = (x1 - x0) * UNITS["bp"], (y1 - y0) * UNITS["bp"]
+    match = TEXTWIDTH_EX.match(options.get("width", ""))
+    if match is not None:
+        scaled = float(match.group(1) or 1) * geometry.text_width
+        height *= scaled / width
+    elif _length(options.get("width", "")) is not None:
+        height *= _length(options["width"]) / width
+    return min(height, geometry.text_height)
+
+
+def _metrics_from_song(song, geometry):
+    chars_per_line = geometry.text_width / CHAR_WIDTH
+    lines = chord_lines = parts = 0
+    graphics = 0.0
+    for part in song._contents:
+        if isinstance(part, Song.MusicPart):
+            parts += 1
+            for lyric_line, chord_line in zip(part.lyrics, part.chords):
+                lines += _wrapped(lyric_line, chars_per_line)
+                chord_lines += len(chord_line) > 0
+        elif isinstance(part, Song.Graphics):
+            graphics += graphic_height(part.path, part.options, geometry)
+    meta_lines = (len(song.metainfo) > 0) + (len(song.songbookinfo) > 0)
+    return SongMetrics(song.title, meta_lines, lines, chord_lines, parts, graphics)
+
+
+def _metrics_from_tex(text, geometry):
+    """Metrics of songs the reader cannot handle, from the LaTeX source."""
+    chars_per_line = geometry.text_width / CHAR_WIDTH
+    text = COMMENT_EX.sub("", text)
+    song = BEGINSONG_EX.search(text)
+    keys = [k for k, _ in iter_opt_args(song.group(2) or "")] if song else []
+    meta_lines = any(k in METAINFO_FORMAT for k in keys) + any(k in SONGBOOK_FORMAT for k in keys)
+
+    lines = chord_lines = parts = 0
+    graphics = 0.0
+    in_part = False
+    for line in text.splitlines():
+        if PART_EX.search(line):
+            parts += 1
+            in_part = not line.strip().startswith(("\\printchorus", "\\repchorus"))
+            continue
+        if PART_END_EX.search(line):
+            in_part = False
+            continue
+        for options, path in GRAPHICS_EX.findall(line):
+            graphics += graphic_height(path, [(k, v) for k, v in iter_opt_args(options)
+                                              if k is not None], geometry)
+        if in_part and line.strip() != "":
+            lyrics = re.sub(r"\\\[[^\]]*\]|\\[a-zA-Z]+|[{}^]", "", line).strip()
+            lines += _wrapped(lyrics, chars_per_line)
+            chord_lines += "\\[" in line or "^" in line
+    return SongMetrics(song.group(1) if song else None, meta_lines, lines, chord_lines, parts,
+                       graphics)
+
+
+def song_metrics(path, geometry):
+    try:
+        reader = SongReader(path)
+        reader.read()
+        if isinstance(reader.song, Song):
+            return _metrics_from_song(reader.song, geometry)
+    except Exception:
+        pass
+    with open(path, "r", encoding="utf-8", errors="replace") as song_file:
+        return _metrics_from_tex(song_file.read(), geometry)
+
+
+class MetricsCache(ResultCache):
+    """Metrics of song files, keyed by metrics_digest(); the version covers the reader code."""
+
+    VERSION = 3
+
+    def __init__(self, path):
+        super().__init__(path, "{}:{}".format(self.VERSION, modules_digest(*CODE_MODULES)))
+
+    def encode(self, value):
+        return list(value)
+
+    def decode(self, value):
+        return SongMetrics(*value)
+
+
+def metrics_digest(path, geometry):
+    """Cache key of the metrics of a song: the file, the geometry and the included graphics."""
+    with open(path, "rb") as song_file:
+        data = song_file.read()
+    text = COMMENT_EX.sub("", data.decode("utf-8", "replace"))
+    graphics = sorted({graphic for _, graphic in GRAPHICS_EX.findall(text)})
+    return digest(data, repr((geometry.text_width, geometry.text_height, geometry.versesep)),
+                  files_digest(graphics))
+
+
+def metrics_for(paths, geometry, cache=None, jobs=None):
+    """{path: SongMetrics}, songs missing in the cache are read in parallel."""
+    return cached_map(song_metrics, paths, cache, jobs, (geometry,),
+                      digest=lambda path: metrics_digest(path, geometry))
+
+
+def intersong_breaks(intersong, pics=False):
+    """Whether an intersong block breaks the page (in the draft, without pictures)."""
+    text = intersong.text
+    if not pics:
+        # drop the \ifthenelse{\boolean{pics}}{...} branches
+        match = PICS_EX.search(text)
+        while match is not None:
+            depth, end = 1, match.end()
+            while end < len(text) and depth > 0:
+                depth += {"{": 1, "}": -1}.get(text[end], 0)
+                end += 1
+            text = text[:match.start()] + text[end:]
+            match = PICS_EX.search(text)
+    return BREAK_EX.search(text) is not None
+
+
+Placement = collections.namedtuple("Placement", "entry page height")
+
+
+def paginate(edition, metrics, model, geometry, first_page=1, pics=False):
+    """Placements of the songs and chapters of an edition and the last page."""
+    page, used = first_page, 0.0
+    page_height = geometry.text_height
+    placements = []
+
+    def new_page():
+        nonlocal page, used
+        if used > 0:
+            page += 1
+            used = 0.0
+
+    for entry in edition.entries:
+        if isinstance(entry, SongRef):
+            if entry.path not in metrics:
+                continue
+            height = model.height(metrics[entry.path])
+            if used + height > page_height:
+                new_page()
+            placements.append(Placement(entry, page, height))
+            used += height
+            while used > page_height:
+                page += 1
+                used -= page_height
+        elif isinstance(entry, Chapter):
+            if used + CHAPTER_HEIGHT > page_height:
+                new_page()
+            placements.append(Placement(entry, page, CHAPTER_HEIGHT))
+            used += CHAPTER_HEIGHT
+        elif isinstance(entry, PageBreak) or \
+                (isinstance(entry, Intersong) and intersong_breaks(entry, pics)):
+            new_page()
+    return placements, page
+
+
+def normalize_title(title):
+    return re.sub(r"\W+", "", title or "").lower()
+
+
+def read_pages(path):
+    """{normalized title: first page} of the songs in an index data file (.sxd)."""
+    pages = {}
+    for entry in IndexData.read(path).entries:
+        try:
+            page = int(entry.page)
+        except ValueError:
+            continue
+        pages.setdefault(normalize_title(entry.title.lstrip("*")), page)
+    return pages
+
+
+def calibration_samples(edition, metrics, pages):
+    """(metrics, pages to the next song) of songs directly followed by another song."""
+    samples = []
+    entries = edition.entries
+    for a, b in zip(entries, entries[1:]):
+        if not (isinstance(a, SongRef) and isinstance(b, SongRef)):
+            continue
+        if a.path not in metrics or b.path not in metrics:
+            continue
+        page_a = pages.get(normalize_title(metrics[a.path].title))
+        page_b = pages.get(normalize_title(metrics[b.path].title))
+        if page_a is not None and page_b is not None and page_b >= page_a:
+            samples.append((metrics[a.path], page_b - page_a))
+    return samples
+
+
+def first_song_page(edition, metrics, pages):
+    for entry in edition.entries:
+        if isinstance(entry, SongRef) and entry.path in metrics:
+            page = pages.get(normalize_title(metrics[entry.path].title))
+            if page is not None:
+                return page
+    return None
@@ -0,0 +1,191 @@
+"""
+Rule-based cleanup of the song files in Lieder/
+
+Every file is tokenized once; the fix rules are chained generators over the
+token stream, so all rules are applied in a single pass. A rule receives the
+tokens and a report function, yields the tokens to keep (changed, removed or
+added ones) and reports what it fixed. Rules are registered with @rule in the
+order they are applied. Only the default rules run unless others are asked
+for: the formatting rules would touch most of the corpus, so they are opt-in.
+
+Line endings are kept as they are, a file is only written if a rule changed it.
+"""
+import collections
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from pyralala.validate import Issue
+
+__all__ = ["Token", "RULES", "DEFAULT_RULES", "rule", "tokenize", "lint_text", "lint_file",
+           "lint_files"]
+
+Token = collections.namedtuple("Token", "kind text line")
+
+TOKEN_EX = re.compile(
+    r"(?P<newline>\r\n|\n|\r)"
+    r"|(?P<space>[ \t]+)"
+    r"|(?P<comment>%[^\r\n]*)"
+    r"|(?P<command>\\(?:begin|end)\{[^}]*\}|\\\[[^\]]*\]|\\[a-zA-Z@]+\*?|\\.)"
+    r"|(?P<text>[^\\%\s]+|[\s\S])")
+
+RULES = collections.OrderedDict()
+# rules applied if none are given
+DEFAULT_RULES = []
+
+
+def rule(name, default=False):
+    """Decorator registering a fix rule: f(tokens, report) -> tokens."""
+    def register(f):
+        RULES[name] = f
+        if default:
+            DEFAULT_RULES.append(name)
+        return f
+    return register
+
+
+def tokenize(text):
+    line = 1
+    for match in TOKEN_EX.finditer(text):
+        yield Token(match.lastgroup, match.group(), line)
+        if match.lastgroup == "newline":
+            line += 1
+
+
+# environments removed if they only contain whitespace, an optional or empty
+# argument and line breaks (\beginscripture{}~\\)
+BLOCKS = {
+    "\\begin{intersong}": "\\end{intersong}",
+    "\\beginscripture": "\\endscripture",
+}
+EMPTY_BLOCK_EX = re.compile(r"(\[[^\]]*\]|\{\})?(~|\\\\)*")
+
+
+@rule("empty-block", default=True)
+def strip_empty_blocks(tokens, report):
+    """Removes empty intersong and scripture blocks with the rest of their line."""
+    block, end, drop_line, spaces = None, None, False, []
+    for token in tokens:
+        if block is None:
+            if drop_line and token.kind == "space":
+                spaces.append(token)
+                continue
+            if drop_line and token.kind == "newline":
+                drop_line, spaces = False, []
+                continue
+            yield from spaces
+            drop_line, spaces = False, []
+            if token.kind == "command" and token.text in BLOCKS:
+                block, end = [token], BLOCKS[token.text]
+            else:
+                yield token
+            continue
+
+        block.append(token)
+        if token.kind != "command" or token.text != end:
+            continue
+        content = "".join(t.text for t in block[1:-1] if t.kind not in ("space", "newline"))
+        if EMPTY_BLOCK_EX.fullmatch(content):
+            report(block[0].line, "removed empty {}", block[0].text)
+            drop_line = True
+        else:
+            yield from block
+        block = None
+    if block is not None:
+        report(block[0].line, "{} is not closed", block[0].text)
+        yield from block
+
+
+@rule("trailing-whitespace")
+def strip_trailing_whitespace(tokens, report):
+    space = None
+    lines = []
+    for token in tokens:
+        if token.kind == "space":
+            space = token
+            continue
+        if space is not None:
+            if token.kind == "newline":
+                lines.append(space.line)
+            else:
+                yield space
+            space = None
+        yield token
+    if space is not None:
+        lines.append(space.line)
+    if len(lines) > 0:
+        report(lines[0], "removed trailing whitespace on {} line(s)", len(lines))
+
+
+@rule("blank-lines")
+def collapse_blank_lines(tokens, report):
+    """Keeps at most one blank line between paragraphs."""
+    newlines = 0
+    for token in tokens:
+        if token.kind == "newline":
+            newlines += 1
+            if newlines > 2:
+                if newlines == 3:
+                    report(token.line, "removed consecutive blank lines")
+                continue
+        else:
+            newlines = 0
+        yield token
+
+
+@rule("final-newline")
+def final_newline(tokens, report):
+    """Ends the file with exactly one line break, in the style of the file."""
+    style, trailing, last = None, [], None
+    for token in tokens:
+        if token.kind == "newline":
+            style = style or token.text
+            trailing.append(token)
+            continue
+        yield from trailing
+        trailing = []
+        last = token
+        yield token
+    if last is None:
+        return
+    if len(trailing) == 0:
+        report(last.line, "added line break at the end of the file")
+        yield Token("newline", style or "\n", last.line)
+    else:
+        if len(trailing) > 1:
+            report(trailing[1].line, "removed blank lines at the end of the file")
+        yield trailing[0]
+
+
+def lint_text(path, text, rules=None):
+    """(fixed text, [Issue]) of a song file, rules defaults to DEFAULT_RULES."""
+    issues = []
+
+    def report(line, message, *args):
+        issues.append(Issue(path, line, message.format(*args)))
+
+    rules = DEFAULT_RULES if rules is None else rules
+    tokens = tokenize(text)
+    for name in RULES:
+        if name not in rules:
+            continue
+        tokens = RULES[name](tokens, report)
+    return "".join(t.text for t in tokens), sorted(issues)
+
+
+def lint_file(path, fix=True, rules=None):
+    """(path, changed, [Issue]), the file is only written if fix is set and it changed."""
+    with open(path, "r", encoding="utf-8", newline="") as song_file:
+        text = song_file.read()
+    fixed, issues = lint_text(path, text, rules)
+    changed = fixed != text
+    if changed and fix:
+        with open(path, "w", encoding="utf-8", newline="") as song_file:
+            song_file.write(fixed)
+    return path, changed, issues
+
+
+def lint_files(paths, fix=True, rules=None, jobs=None):
+    """[(path, changed, [Issue])] of all files, checked in parallel."""
+    n = len(paths)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(lint_file, paths, [fix] * n, [rules] * n, chunksize=16))
@@ -0,0 +1,212 @@
+"""
+Read-only HTTP API for the songs in Lieder/
+
+    GET /songs              list of all songs (id, title)
+    GET /songs/<id>         song as JSON (see JSONCompiler)
+    GET /songs/<id>.html    song as HTML page
+
+Parsed songs are kept in an LRU cache, which is checked against the mtime and
+size of the song file and, if those changed, against the hash of its content.
+Every view is rendered and cached on its own when it is first requested, so
+the JSON of a song does not depend on the tools the HTML needs (pdf2svg).
+Every response carries an ETag derived from the file content, so clients
+revalidating with If-None-Match get a 304 without the song being parsed.
+Concurrent requests for the same view share one render.
+"""
+import asyncio
+import collections
+import email.utils
+import glob
+import hashlib
+import json
+import os
+import re
+
+from pyralala import SongReader
+from pyralala.export import HTMLCompiler, JSONCompiler
+
+__all__ = ["SongStore", "SongServer"]
+
+TITLE_EX = re.compile(r"\\beginsong\{([^}]*)\}")
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class _Entry(object):
+    def __init__(self, stat, digest):
+        self.stat = stat
+        self.digest = digest
+        self.song = None
+        self.views = {}  # "json"/"html" -> rendered bytes
+
+
+class SongStore(object):
+    """LRU cache of the rendered songs of a directory."""
+
+    def __init__(self, directory, size=256, loop=None):
+        self.directory = directory
+        self.size = size
+        self.loop = loop or asyncio.get_event_loop()
+        self._entries = collections.OrderedDict()
+        self._rendering = {}
+        self._titles = {}
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, song_id):
+        if not re.match(r"^[\w-]+$", song_id):
+            return None
+        path = os.path.join(self.directory, song_id + ".tex")
+        return path if os.path.isfile(path) else None
+
+    def songs(self):
+        """[(id, title)] of all songs, titles are cached by mtime."""
+        songs = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.tex"))):
+            mtime = os.stat(path).st_mtime_ns
+            cached = self._titles.get(path)
+            if cached is None or cached[0] != mtime:
+                with open(path, "r", encoding="utf-8", errors="replace") as song_file:
+                    match = TITLE_EX.search(song_file.read())
+                cached = self._titles[path] = (mtime, match.group(1) if match else None)
+            songs.append((os.path.splitext(os.path.basename(path))[0], cached[1]))
+        return songs
+
+    def digest(self, path):
+        """Hash of the file content, only read if mtime or size changed."""
+        st = os.stat(path)
+        stat = (st.st_mtime_ns, st.st_size)
+        entry = self._entries.get(path)
+        if entry is not None and entry.stat == stat:
+            return entry.digest
+        with open(path, "rb") as song_file:
+            digest = hashlib.sha256(song_file.read()).hexdigest()
+        if entry is not None and entry.digest == digest:
+            # touched, but not changed
+            entry.stat = stat
+        else:
+            self._entries.pop(path, None)
+            self._entries[path] = _Entry(stat, digest)
+            self._shrink()
+        return digest
+
+    def _shrink(self):
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    async def render(self, path, view):
+        """Rendered view of a song, parsed at most once per content."""
+        digest = self.digest(path)
+        entry = self._entries[path]
+        self._entries.move_to_end(path)
+        if view in entry.views:
+            self.hits += 1
+            return entry.views[view]
+
+        key = (path, digest, view)
+        if key not in self._rendering:
+            self.misses += 1
+            self._rendering[key] = self.loop.run_in_executor(None, _render, path, view, entry.song)
+        try:
+            song, body = await self._rendering[key]
+        finally:
+            self._rendering.pop(key, None)
+        if self._entries.get(path) is entry:
+            entry.song = song
+            entry.views[view] = body
+        return body
+
+
+VIEWS = {"json": JSONCompiler, "html": HTMLCompiler}
+
+
+def _render(path, view, song=None):
+    """(song, rendered view), the song is only read if it is not given."""
+    if song is None:
+        reader = SongReader(path)
+        reader.read()
+        song = reader.song
+    compiler = VIEWS[view]()
+    compiler.compile(song)
+    return song, compiler.text().encode("utf-8")
+
+
+class SongServer(object):
+    def __init__(self, store):
+        self.store = store
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    self.respond(writer, 400, b"")
+                    break
+                method, target, version = parts
+                status, body, extra = await self.dispatch(method, target, headers)
+                self.respond(writer, status, body if method != "HEAD" else b"", extra,
+                             len(body))
+                await writer.drain()
+                if version == "HTTP/1.0" or headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, headers):
+        if method not in ("GET", "HEAD"):
+            return 405, b"", {"Allow": "GET, HEAD"}
+        path = target.split("?", 1)[0].rstrip("/")
+
+        if path == "/songs":
+            songs = [{"id": i, "title": t} for i, t in self.store.songs()]
+            return 200, json.dumps(songs, ensure_ascii=False).encode("utf-8"), \
+                {"Content-Type": "application/json; charset=utf-8"}
+
+        match = re.match(r"^/songs/([^/.]+)(\.html)?$", path)
+        song_path = self.store.path(match.group(1)) if match else None
+        if song_path is None:
+            return 404, b"", {}
+        view = "html" if match.group(2) else "json"
+        content_type = "text/html" if view == "html" else "application/json"
+        extra = {"Content-Type": content_type + "; charset=utf-8",
+                 "ETag": "\"{}-{}\"".format(self.store.digest(song_path)[:32], view),
+                 "Cache-Control": "no-cache"}
+        if extra["ETag"] in [t.strip() for t in headers.get("if-none-match", "").split(",")]:
+            return 304, b"", extra
+        try:
+            body = await self.store.render(song_path, view)
+        except Exception as e:
+            return 500, "{}\n".format(e).encode("utf-8"), {"Content-Type": "text/plain"}
+        return 200, body, extra
+
+    @staticmethod
+    def respond(writer, status, body, headers={}, length=None):
+        lines = ["HTTP/1.1 {} {}".format(status, REASONS[status]),
+                 "Date: {}".format(email.utils.formatdate(usegmt=True)),
+                 "Content-Length: {}".format(len(body) if length is None else length)]
+        lines += ["{}: {}".format(k, v) for k, v in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+    def run(self, host="127.0.0.1", port=8080):
+        loop = self.store.loop
+        server = loop.run_until_complete(asyncio.start_server(self.handle, host, port))
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
@@ -0,0 +1,223 @@
+"""
+Near-duplicate detection for songs
+
+The chord-free lyrics of a song are split into overlapping word shingles,
+which are summarized in a MinHash signature. Locality-sensitive hashing over
+bands of the signatures yields the candidate pairs, so not every pair of songs
+has to be compared. The similarity of a pair is estimated from the fraction of
+equal signature values (Jaccard similarity of the shingle sets).
+
+Song files (.tex) are read with SongReader, plain text imports (.txt, see
+txt2Latex) directly; chord lines, chords and LaTeX markup are dropped.
+"""
+import hashlib
+import os
+import random
+import re
+import struct
+
+from buildtools.results import ResultCache, cached_map, modules_digest
+from chords import LATEX_CHORD_EX, is_chord
+from pyralala import SongReader
+from pyralala.export import JSONCompiler
+
+__all__ = ["MinHasher", "read_lyrics", "SignatureCache", "LSHIndex", "signatures",
+           "find_duplicates", "ImportChecker", "check_imports"]
+
+WORD_EX = re.compile(r"[^\W\d_]+")
+COMMENT_EX = re.compile(r"(?<!\\)%[^\n]*")
+BEGINSONG_EX = re.compile(r"\\beginsong\{[^}]*\}\s*(\[(?:[^\[\]]|\{[^{}]*\})*\])?")
+# commands with their arguments (file names of graphics, labels, ...)
+COMMAND_EX = re.compile(r"\\[a-zA-Z@]+\*?(\[[^\]]*\])?(\{[^{}]*\})*")
+TEXT_META_EX = re.compile(r"^\w+:\s")
+
+MERSENNE = (1 << 61) - 1
+# code the cached signatures depend on
+CODE_MODULES = ("pyralala", "pyralala.data", "pyralala.export", "pyralala.similarity", "chords")
+
+
+def _lyrics_from_tex(text):
+    text = COMMENT_EX.sub("", text)
+    text = BEGINSONG_EX.sub("", text)
+    text = LATEX_CHORD_EX.sub("", text)
+    return COMMAND_EX.sub(" ", text)
+
+
+def _lyrics_from_text(text):
+    lines = text.splitlines()[1:]  # the first line is the title
+    lyrics = []
+    for line in lines:
+        words = line.split()
+        if len(words) == 0 or TEXT_META_EX.match(line):
+            continue
+        if all(is_chord(w) for w in words):
+            continue
+        lyrics.append(line)
+    return "\n".join(lyrics)
+
+
+def read_lyrics(path):
+    """Lyrics of a song file or a plain text import, without chords."""
+    if path.endswith(".tex"):
+        try:
+            reader = SongReader(path)
+            reader.read()
+            compiler = JSONCompiler()
+            compiler.compile(reader.song)
+            lyrics = "\n".join(line["text"] for part in compiler.data["parts"]
+                               for line in part.get("lines", []))
+            if len(WORD_EX.findall(lyrics)) > 0:
+                return lyrics
+        except Exception:
+            pass
+        # songs the reader cannot handle (yet) are read without it
+        with open(path, "r", encoding="utf-8", errors="replace") as song_file:
+            return _lyrics_from_tex(song_file.read())
+    with open(path, "r", encoding="utf-8", errors="replace") as text_file:
+        return _lyrics_from_text(text_file.read())
+
+
+class MinHasher(object):
+    def __init__(self, num_perm=128, shingle_size=4, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, MERSENNE), rng.randrange(0, MERSENNE))
+                       for _ in range(num_perm)]
+
+    def __str__(self):
+        # version 2: no signatures for lyrics shorter than a shingle
+        return "minhash2:{}:{}:{}".format(self.num_perm, self.shingle_size, self.seed)
+
+    def shingles(self, lyrics):
+        words = [w.lower() for w in WORD_EX.findall(lyrics)]
+        k = self.shingle_size
+        if len(words) < k:
+            return set()
+        return {struct.unpack("<Q", hashlib.blake2b(" ".join(words[i:i + k]).encode("utf-8"),
+                                                     digest_size=8).digest())[0]
+                for i in range(len(words) - k + 1)}
+
+    def signature(self, lyrics):
+        """MinHash signature of the lyrics, None if they are shorter than a shingle."""
+        shingles = self.shingles(lyrics)
+        if len(shingles) == 0:
+            return None
+        return [min((a * s + b) % MERSENNE for s in shingles) for a, b in self._perms]
+
+    @staticmethod
+    def similarity(sig1, sig2):
+        return sum(1 for a, b in zip(sig1, sig2) if a == b) / len(sig1)
+
+
+class SignatureCache(ResultCache):
+    """Signatures of files, keyed by the file hash; the version names the hasher and
+    covers the reader code."""
+
+    def __init__(self, path, hasher):
+        self.hasher = hasher
+        super().__init__(path, "{}:{}".format(hasher, modules_digest(*CODE_MODULES)))
+
+
+class LSHIndex(object):
+    """Buckets of signature bands, songs sharing a bucket are candidates."""
+
+    def __init__(self, num_perm=128, bands=32):
+        if num_perm % bands != 0:
+            raise ValueError("the number of permutations must be a multiple of the bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets = {}
+        self.signatures = {}
+
+    def _keys(self, signature):
+        for band in range(self.bands):
+            yield band, tuple(signature[band * self.rows:(band + 1) * self.rows])
+
+    def add(self, key, signature):
+        self.signatures[key] = signature
+        for bucket in self._keys(signature):
+            self._buckets.setdefault(bucket, []).append(key)
+
+    def query(self, signature):
+        """Keys of the candidates for a signature."""
+        candidates = set()
+        for bucket in self._keys(signature):
+            candidates.update(self._buckets.get(bucket, []))
+        return candidates
+
+    def pairs(self):
+        """All candidate pairs in the index."""
+        pairs = set()
+        for keys in self._buckets.values():
+            for i, a in enumerate(keys):
+                for b in keys[i + 1:]:
+                    pairs.add((a, b) if a < b else (b, a))
+        return pairs
+
+
+def _signature(path, hasher):
+    return hasher.signature(read_lyrics(path))
+
+
+def signatures(paths, hasher, cache=None, jobs=None):
+    """{path: signature} of the files, files without lyrics are left out."""
+    result = cached_map(_signature, paths, cache, jobs, (hasher,))
+    return {p: s for p, s in result.items() if s is not None}
+
+
+def find_duplicates(sigs, threshold=0.5, bands=32):
+    """[(similarity, path, path)] of all pairs at least as similar as the threshold."""
+    index = LSHIndex(len(next(iter(sigs.values()))) if sigs else 128, bands)
+    for path, signature in sigs.items():
+        index.add(path, signature)
+    found = []
+    for a, b in index.pairs():
+        similarity = MinHasher.similarity(sigs[a], sigs[b])
+        if similarity >= threshold:
+            found.append((similarity, a, b))
+    return sorted(found, reverse=True)
+
+
+class ImportChecker(object):
+    """Near-duplicate check of songs to import against the songs of a corpus."""
+
+    def __init__(self, corpus, threshold=0.5, cache_path=".cache/minhash.json", jobs=None,
+                 bands=32):
+        self.hasher = MinHasher()
+        self.threshold = threshold
+        cache = SignatureCache(cache_path, self.hasher)
+        self.corpus_sigs = signatures(corpus, self.hasher, cache, jobs)
+        cache.save()
+        self.index = LSHIndex(self.hasher.num_perm, bands)
+        for path, signature in self.corpus_sigs.items():
+            self.index.add(path, signature)
+
+    def matches(self, signature, path=None):
+        """[(similarity, corpus path)] of a signature, most similar first; path itself is left out."""
+        found = []
+        for candidate in self.index.query(signature):
+            similarity = MinHasher.similarity(signature, self.corpus_sigs[candidate])
+            if similarity >= self.threshold and (
+                    path is None or os.path.abspath(candidate) != os.path.abspath(path)):
+                found.append((similarity, candidate))
+        return sorted(found, reverse=True)
+
+    def check_text(self, text):
+        """Matches of a song in the plain text import format (see txt2Latex)."""
+        signature = self.hasher.signature(_lyrics_from_text(text))
+        return [] if signature is None else self.matches(signature)
+
+
+def check_imports(paths, corpus, threshold=0.5, cache_path=".cache/minhash.json",
+                  jobs=None, bands=32):
+    """{path: [(similarity, corpus path)]} of the files to import that are
+    near-duplicates of songs in the corpus."""
+    checker = ImportChecker(corpus, threshold, cache_path, jobs, bands)
+    matches = {}
+    for path, signature in signatures(paths, checker.hasher, jobs=jobs).items():
+        found = checker.matches(signature, path)
+        if len(found) > 0:
+            matches[path] = found
+    return matches
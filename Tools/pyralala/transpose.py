@@ -0,0 +1,102 @@
+"""
+Transposition of chords
+
+Chords are written as in songs.sty (see chords.py), several chords may be
+given in one, e.g. "Dsus4/f#", "G--D" or "Am G Em F". Every chord between
+the separators (/, -, spaces, parentheses) is transposed. Chord strings with
+anything else in them (Bridge, N.C., "a capella", ...) are kept as they are.
+
+The transposed names of all notes are computed once on import, transposed
+chords are remembered, so transposing the same chords into several keys only
+costs dictionary lookups.
+"""
+import re
+
+from chords import parse as parse_chord
+
+__all__ = ["transpose_chord", "prefers_flats", "chord_root", "parse_shift"]
+
+# pitch classes of the note letters, German notation
+PITCHES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 10, "H": 11}
+ACCIDENTALS = {"": 0, "#": 1, "\\#": 1, "&": -1, "b": -1}
+
+SHARP_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "H"]
+FLAT_NAMES = ["C", "D&", "D", "E&", "E", "F", "G&", "G", "A&", "A", "B", "H"]
+
+# keys written with flats (pitch class of the root, minor)
+FLAT_KEYS = {(5, False), (10, False), (3, False), (8, False), (1, False),
+             (2, True), (7, True), (0, True), (5, True), (10, True), (3, True)}
+
+SEPARATOR_EX = re.compile(r"(\s+|-+|/|\(|\))")
+
+
+def _pitch(letter, accidental):
+    # B is already flat, "B&" is meant as B flat as well
+    if letter.upper() == "B" and accidental in ("&", "b"):
+        accidental = ""
+    return (PITCHES[letter.upper()] + ACCIDENTALS[accidental]) % 12
+
+
+# note (letter + accidental) -> pitch class
+NOTES = {letter + accidental: _pitch(letter, accidental)
+         for letter in PITCHES for accidental in ACCIDENTALS}
+NOTES.update({note.lower(): pitch for note, pitch in list(NOTES.items())})
+
+# (note, semitones, flats) -> transposed note
+NOTE_TABLE = {}
+for _note, _pitch_class in NOTES.items():
+    for _shift in range(12):
+        for _flats in (False, True):
+            _name = (FLAT_NAMES if _flats else SHARP_NAMES)[(_pitch_class + _shift) % 12]
+            NOTE_TABLE[_note, _shift, _flats] = _name.lower() if _note.islower() else _name
+
+_chords = {}
+
+
+def _tokens(chord):
+    """Parts of a chord string, separators have odd indices."""
+    return SEPARATOR_EX.split(chord)
+
+
+def _parse(chord):
+    """Tokens of a chord string and their parsed chords, None if it contains text."""
+    tokens = _tokens(chord)
+    parsed = [parse_chord(token) if i % 2 == 0 else None for i, token in enumerate(tokens)]
+    # text, not a chord ("a capella" is no a minor)
+    if any(p is None and token for p, token in zip(parsed[::2], tokens[::2])):
+        return None
+    return tokens, parsed
+
+
+def transpose_chord(chord, semitones, flats=False):
+    """Chord transposed by the number of semitones, chords with text are kept."""
+    semitones %= 12
+    key = (chord, semitones, flats)
+    if key not in _chords:
+        result = _parse(chord)
+        if result is None:
+            _chords[key] = chord
+        else:
+            tokens, parsed = result
+            _chords[key] = "".join(token if p is None else NOTE_TABLE[p.note, semitones, flats] + p.quality
+                                   for token, p in zip(tokens, parsed))
+    return _chords[key]
+
+
+def chord_root(chord):
+    """(pitch class, minor) of the first note of a chord, None if there is none."""
+    result = _parse(chord)
+    for parsed in (result[1] if result else ()):
+        if parsed is not None:
+            return NOTES[parsed.note], parsed.minor
+    return None
+
+
+def prefers_flats(root):
+    """Whether a key, given as (pitch class, minor), is written with flats."""
+    return root in FLAT_KEYS
+
+
+def parse_shift(value):
+    """Semitones of a \\transpose argument or a command line option ("+2", "-3")."""
+    return int(value.strip().strip("{}"))
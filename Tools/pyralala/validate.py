@@ -0,0 +1,281 @@
+"""
+Static checks of the song files in Lieder/
+
+The files are scanned with regular expressions instead of TexSoup, so every
+problem of a file is reported in one run, with its line number:
+
+- commands SongReader does not handle,
+- unbalanced verses, choruses, songs and environments,
+- ^ without a memorized chord to replay, following the chord registers of
+  songs.sty: the first verse of a song is memorized, verses and choruses
+  replay from the start of the current register,
+- malformed or unknown \\beginsong options.
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from pyralala import IGNORE_CMD, SongReader, iter_opt_args
+
+__all__ = ["Issue", "SONG_KEYS", "validate_text", "validate_file", "validate_files"]
+
+BASIC_TEX = os.path.join(os.path.dirname(__file__), "..", "..", "Misc", "basic.tex")
+
+# keys defined by songs.sty itself, the others come from \newsongkey in basic.tex
+SONGS_STY_KEYS = {"by", "cr", "li", "sr", "index", "ititle"}
+
+
+def _song_keys():
+    try:
+        with open(BASIC_TEX, "r", encoding="utf-8") as basic:
+            defined = re.findall(r"\\newsongkey\{(\w+)\}", basic.read())
+    except FileNotFoundError:
+        defined = []
+    return SONGS_STY_KEYS | set(defined)
+
+
+SONG_KEYS = _song_keys()
+
+COMMENT_EX = re.compile(r"(?<!\\)%[^\n]*")
+TOKEN_EX = re.compile(
+    r"\\(begin|end)\s*\{([^}]*)\}|\\\[([^\]]*)\]|\\([a-zA-Z@]+\*?)|\\.|(\^)")
+MUSIC_EX = re.compile(r"\\\[([^\]]*)\]|\\.|(\^)")
+
+# pairs of commands: opening command -> commands closing it
+BLOCKS = {
+    "beginsong": {"endsong"},
+    "beginverse": {"endverse", "endverse*"},
+    "beginverse*": {"endverse", "endverse*"},
+    "beginchorus": {"endchorus"},
+    "beginscripture": {"endscripture"},
+}
+CLOSERS = set().union(*BLOCKS.values())
+PART_ENDS = {"endverse", "endverse*", "endchorus"}
+
+
+class Issue(object):
+    def __init__(self, path, line, message):
+        self.path = path
+        self.line = line
+        self.message = message
+
+    def __lt__(self, other):
+        return (self.path, self.line) < (other.path, other.line)
+
+    def __str__(self):
+        return "{}:{}: {}".format(self.path, self.line, self.message)
+
+
+class _Part(object):
+    def __init__(self, line):
+        self.line = line
+        self.replays = []  # [register, number of ^] per \replay
+
+
+class _Scanner(object):
+    def __init__(self, path, text):
+        self.path = path
+        # blank out comments, keeping all offsets (and thus line numbers) intact
+        self.text = COMMENT_EX.sub(lambda m: " " * len(m.group(0)), text)
+        self.issues = []
+        self.stack = []
+        # chord registers (see songs.sty): name -> number of memorized chords
+        self.registers = {"": 0}
+        self.register = ""
+        self.tracking = False
+        self.part = None
+
+    def line(self, pos):
+        return self.text.count("\n", 0, pos) + 1
+
+    def report(self, pos, message, *args):
+        self.issues.append(Issue(self.path, self.line(pos), message.format(*args)))
+
+    def read_args(self, pos):
+        """Read the {} and [] groups directly following pos, return them and the new pos."""
+        args = []
+        while pos < len(self.text) and self.text[pos] in "{[":
+            close = "}" if self.text[pos] == "{" else "]"
+            depth = 0
+            for end in range(pos, len(self.text)):
+                c = self.text[end]
+                if c == self.text[pos]:
+                    depth += 1
+                elif c == close and self.text[end - 1] != "\\":
+                    depth -= 1
+                    if depth == 0:
+                        break
+            else:
+                self.report(pos, "unterminated argument {}", self.text[pos])
+                return args, len(self.text)
+            args.append((self.text[pos], self.text[pos + 1:end]))
+            pos = end + 1
+        return args, pos
+
+    def skip_environment(self, name, pos):
+        end_ex = re.compile(r"\\end\s*\{" + re.escape(name) + r"\}")
+        match = end_ex.search(self.text, pos)
+        if match is None:
+            self.report(pos, "unclosed environment {}", name)
+            return len(self.text)
+        self.music(self.text[pos:match.start()])
+        return match.end()
+
+    def open_block(self, name, pos, closers):
+        self.stack.append((name, pos, closers))
+
+    def close_block(self, name, pos):
+        for i in range(len(self.stack) - 1, -1, -1):
+            if name in self.stack[i][2]:
+                for opened, opened_pos, _ in self.stack[i + 1:]:
+                    self.report(opened_pos, "\\{} is not closed before \\{} (line {})",
+                                opened, name, self.line(pos))
+                del self.stack[i:]
+                return True
+        self.report(pos, "\\{} without matching begin", name)
+        return False
+
+    def scan(self):
+        pos = 0
+        while True:
+            match = TOKEN_EX.search(self.text, pos)
+            if match is None:
+                break
+            pos = match.end()
+            if match.group(1) == "begin":
+                name = match.group(2)
+                if name in IGNORE_CMD:
+                    pos = self.skip_environment(name, pos)
+                    continue
+                if name not in SongReader.handlers:
+                    self.report(match.start(), "unknown environment {}", name)
+                _, pos = self.read_args(pos)
+                self.open_block("begin{" + name + "}", match.start(), {"end{" + name + "}"})
+            elif match.group(1) == "end":
+                self.close_block("end{" + match.group(2) + "}", match.start())
+            elif match.group(4) is not None:
+                name = match.group(4)
+                if name not in SongReader.handlers:
+                    self.report(match.start(), "unknown command \\{}", name)
+                    continue
+                args, pos = self.read_args(pos)
+                self.command(name, args, match.start())
+            else:
+                self.chord(match.group(3), match.group(5))
+        for name, opened_pos, _ in self.stack:
+            self.report(opened_pos, "\\{} is not closed", name)
+        return self.issues
+
+    def command(self, name, args, start):
+        if name in BLOCKS:
+            self.open_block(name, start, BLOCKS[name])
+        elif name in CLOSERS:
+            if not self.close_block(name, start):
+                return
+        arg = "".join(a for _, a in args)
+
+        if name == "beginsong":
+            self.registers[""] = 0
+            self.check_options([a for kind, a in args if kind == "["], start)
+        elif name == "newchords":
+            self.registers.setdefault(arg, 0)
+        elif name in ("beginverse", "beginverse*", "interlude"):
+            self.begin_part(start)
+            if self.registers[""] == 0:
+                self.memorize("", start)
+            else:
+                self.replay("", start)
+            if name == "interlude":
+                self.music(arg)
+                self.end_part()
+        elif name in ("beginchorus", "printchorus", "repchorus"):
+            self.begin_part(start)
+            self.replay("", start)
+            if name != "beginchorus":
+                self.end_part()
+        elif name in PART_ENDS:
+            self.end_part()
+        elif name == "memorize":
+            self.memorize(arg, start)
+        elif name == "replay":
+            self.replay(arg, start)
+        elif name in ("echo", "emph", "rep"):
+            self.music(arg)
+
+    def begin_part(self, pos):
+        self.end_part()
+        self.part = _Part(self.line(pos))
+
+    def end_part(self):
+        """Report the replays of the current music part that ran out of chords."""
+        part, self.part = self.part, None
+        if part is None:
+            return
+        for register, carets in part.replays:
+            available = self.registers.get(register, 0)
+            if carets <= available:
+                continue
+            key = "[{}]".format(register) if register else ""
+            if available == 0:
+                message = "{} ^ without memorized chords in \\replay{}".format(carets, key)
+            else:
+                message = "{} ^ but only {} chords memorized in \\replay{}".format(
+                    carets, available, key)
+            self.issues.append(Issue(self.path, part.line, message))
+
+    def memorize(self, register, pos):
+        if register not in self.registers:
+            self.report(pos, "chord register {} is not declared by \\newchords", register)
+        self.registers[register] = 0
+        self.register = register
+        self.tracking = True
+
+    def replay(self, register, pos):
+        if register not in self.registers:
+            self.report(pos, "chord register {} is not declared by \\newchords", register)
+            self.registers[register] = 0
+        self.register = register
+        self.tracking = False
+        if self.part is not None:
+            self.part.replays.append([register, 0])
+
+    def chord(self, chord, caret):
+        if self.part is None:
+            return
+        if chord is not None and self.tracking and len(chord) > 0:
+            self.registers[self.register] += 1
+        elif caret is not None and not self.tracking and len(self.part.replays) > 0:
+            self.part.replays[-1][1] += 1
+
+    def music(self, text):
+        """Process the chords and ^ in an argument."""
+        for match in MUSIC_EX.finditer(text):
+            self.chord(match.group(1), match.group(2))
+
+    def check_options(self, options, pos):
+        if len(options) == 0:
+            return
+        for key, value in iter_opt_args(options[0]):
+            if key is None:
+                self.report(pos, "malformed \\beginsong option: {}", value)
+            elif key not in SONG_KEYS:
+                self.report(pos, "unknown \\beginsong option: {}", key)
+
+
+def validate_text(path, text):
+    """List of the issues found in the text of a song file."""
+    return _Scanner(path, text).scan()
+
+
+def validate_file(path):
+    with open(path, "r", encoding="utf-8") as song_file:
+        return validate_text(path, song_file.read())
+
+
+def validate_files(paths, jobs=None):
+    """Validate the files in parallel, return all issues sorted by file and line."""
+    issues = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for file_issues in pool.map(validate_file, paths, chunksize=16):
+            issues += file_issues
+    return sorted(issues)
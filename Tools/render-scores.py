@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+# Renders the ABC scores in ABC_Noten/ to the cropped PDFs (or SVGs for HTML) in Noten/.
+#
+# Scores are fingerprinted by their normalized content and the format file, only
+# changed scores are rendered (concurrently) and rendered PDFs are kept in a
+# content-addressed cache. Failures are recorded in one state file per score, so
+# concurrent runs (make -j Noten/...) do not overwrite each other.
+
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from buildtools.cache import build_cache
+from buildtools.scores import FORMATS, RenderError, fingerprint, render
+
+
+def load_state(directory, name):
+    try:
+        with open(os.path.join(directory, name + ".json"), "r") as state_file:
+            return json.load(state_file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(directory, name, entry):
+    # written to a temporary file and renamed, so readers never see a partial file
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as tmp_file:
+        json.dump(entry, tmp_file, indent=2, sort_keys=True)
+    os.replace(tmp_file.name, os.path.join(directory, name + ".json"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render ABC scores to cropped PDFs.")
+    parser.add_argument("scores", nargs="*", help="Score files (default: ABC_Noten/*.mcm).")
+    parser.add_argument("-o", "--out", default="Noten", help="Output directory.")
+    parser.add_argument("-F", "--fmt", default="Misc/abcm2ps.fmt", help="abcm2ps format file.")
+    parser.add_argument("-T", "--format", default="pdf", choices=sorted(FORMATS),
+                        help="Output format, svg is meant for HTML exports.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of concurrent renderings.")
+    parser.add_argument("--cache", default=".cache/Noten", help="Cache directory.")
+    parser.add_argument("--state", default=".cache/Noten-state",
+                        help="Directory of the state files.")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="Render all scores, even if unchanged.")
+    args = parser.parse_args()
+
+    scores = sorted(args.scores or glob.glob("ABC_Noten/*.mcm"))
+    cache = build_cache(args.cache)
+
+    def process(score):
+        name = os.path.splitext(os.path.basename(score))[0] + "." + args.format
+        out = os.path.join(args.out, name)
+        key = fingerprint(score, args.fmt, args.format)
+
+        previous = load_state(args.state, name)
+        if not args.force and previous.get("fingerprint") == key and os.path.exists(out):
+            return name, previous, "unchanged"
+        if not args.force and cache.get(key, out):
+            return name, {"fingerprint": key, "status": "ok"}, "cached"
+        try:
+            messages = render(score, out, args.fmt, args.format)
+        except RenderError as e:
+            return name, {"fingerprint": key, "status": "failed", "messages": str(e)}, "failed"
+        cache.put(key, out)
+        return name, {"fingerprint": key, "status": "ok", "messages": messages}, "rendered"
+
+    os.makedirs(args.out, exist_ok=True)
+    counts = {}
+    failed = []
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        for name, entry, result in pool.map(process, scores):
+            if result != "unchanged":
+                save_state(args.state, name, entry)
+            counts[result] = counts.get(result, 0) + 1
+            if entry.get("status") == "failed":
+                failed.append(name)
+            if result == "failed":
+                print("{}: FAILED\n{}".format(name, entry["messages"]), file=sys.stderr)
+
+    print(", ".join("{} {}".format(n, r) for r, n in sorted(counts.items())))
+    if len(failed) > 0:
+        print("Failed scores: {}".format(", ".join(sorted(failed))), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+# Queries the song metadata catalog (see pyralala/catalog.py), which is
+# updated from Lieder/ and Ausgaben/ before every query:
+#
+#   songdb.py --in pfiii --not-in PfadiralalaIV    songs of Pfadiralala III missing in IV
+#   songdb.py --author "Jonas Höchst"               songs by an author
+#   songdb.py --meta jahr=19%                       songs with a metadata value
+#   songdb.py --books                               all songbooks and editions
+#   songdb.py --sql "SELECT ..."                    any query (tables songs, meta, editions, books)
+
+import argparse
+import glob
+import sys
+
+from pyralala.catalog import Catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the song metadata.")
+    parser.add_argument("--in", dest="in_books", action="append", default=[], metavar="BOOK",
+                        help="Song is in this songbook or edition (repeatable).")
+    parser.add_argument("--not-in", dest="not_in_books", action="append", default=[],
+                        metavar="BOOK", help="Song is not in this songbook or edition (repeatable).")
+    parser.add_argument("--author", help="Part of the name in wuw, mel or txt.")
+    parser.add_argument("--title", help="Part of the title.")
+    parser.add_argument("--meta", action="append", default=[], metavar="KEY=VALUE",
+                        help="Metadata value, %% matches anything (repeatable).")
+    parser.add_argument("--books", action="store_true", help="List songbooks and editions.")
+    parser.add_argument("--sql", help="Run an SQL query.")
+    parser.add_argument("--db", default=".cache/songs.sqlite", help="Database file.")
+    args = parser.parse_args()
+
+    catalog = Catalog(args.db)
+    catalog.update(sorted(glob.glob("Lieder/*.tex")), sorted(glob.glob("Ausgaben/*.tex")))
+
+    if args.books:
+        rows = catalog.books()
+    elif args.sql:
+        rows = catalog.db.execute(args.sql).fetchall()
+    else:
+        meta = []
+        for item in args.meta:
+            key, sep, value = item.partition("=")
+            if not sep:
+                parser.error("--meta needs KEY=VALUE")
+            meta.append((key, value))
+        rows = catalog.query(args.in_books, args.not_in_books, args.author, args.title, meta)
+    for row in rows:
+        print("\t".join(str(v) for v in row))
+    print("{} rows".format(len(rows)), file=sys.stderr)
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()
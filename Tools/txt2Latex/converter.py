@@ -6,8 +6,11 @@ Created on Mon Mar  9 22:27:10 2020
 @author: Paul Steuernagel
 '''
 
-from typing import Collection, Set, Union
+from typing import Collection, Iterator, Set, Union
 from song_converter import SongKonverter
+import ndjson  # Tools/ (siehe song_converter)
+from lib.Heuristik.Heuristik import ist_Liedanfang
+import itertools
 import sys
 import os
 import typing
@@ -18,6 +21,8 @@ pfad = typing.Union[str, os.DirEntry]
 insuffixes = {'.txt', '.lied'}
 outsuffix = '.tex'
 templatePfad = 'Template.jinja'
+# Lieder, gegen die mit -d auf Duplikate geprüft wird
+liederPfad = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Lieder')
 
 
 def get_dir_content(directory:pfad) -> Set[os.DirEntry]:
@@ -73,6 +78,53 @@ def readfile(filename:pfad, mode='r') -> str:
     return data
 
 
+_konverter = None
+
+
+def get_konverter() -> SongKonverter:
+    # Der Konverter wird beim ersten Gebrauch geladen, in jedem Prozess einzeln
+    # (die Prozesse des Pipe-Modus erben ihn mit spawn nicht)
+    global _konverter
+    if _konverter is None:
+        _konverter = SongKonverter(templatePfad=templatePfad)
+    return _konverter
+
+
+def lieder_lesen(filename:pfad) -> Iterator[str]:
+    # Liest eine Datei mit mehreren Liedern zeilenweise und gibt jedes Lied zurück, sobald es vollständig ist.
+    # Ein neues Lied beginnt mit einem Block nach einer Leerzeile, der wie eine Überschrift aussieht
+    # (siehe ist_Liedanfang). Im Speicher liegt immer nur das aktuelle Lied.
+    lied = []   # Zeilen des aktuellen Liedes
+    block = []  # Zeilen seit der letzten Leerzeile
+    leer = []   # Leerzeilen vor dem Block
+    with open(filename, 'r') as file:
+        for zeile in itertools.chain(file, ['']):  # die letzte Leerzeile beendet den letzten Block
+            zeile = zeile.rstrip('\r\n')
+            if zeile.strip() != '':
+                block.append(zeile)
+                continue
+            if len(block) > 0:
+                if len(lied) > 0 and ist_Liedanfang(block):
+                    yield '\n'.join(lied) + '\n'
+                    lied = []
+                if len(lied) > 0:
+                    lied += leer
+                lied += block
+                block, leer = [], []
+            leer.append(zeile)
+    if len(lied) > 0:
+        yield '\n'.join(lied) + '\n'
+
+
+def get_liedname(lied:str) -> str:
+    # Dateiname (ohne Endung) für ein Lied aus dem Titel: "Möge die Straße [...]" -> "MoegeDieStrasse"
+    titel = lied.split('\n', 1)[0].split('[')[0]
+    for umlaut, ersatz in (('ä', 'ae'), ('ö', 'oe'), ('ü', 'ue'), ('Ä', 'Ae'), ('Ö', 'Oe'), ('Ü', 'Ue'), ('ß', 'ss')):
+        titel = titel.replace(umlaut, ersatz)
+    return ''.join(wort[:1].upper() + wort[1:] for wort in ''.join(
+        c if c.isalnum() else ' ' for c in titel).split()) or 'Lied'
+
+
 def writefile(filename:pfad, data:str, mode='w')->int:
     with open(filename, mode) as file:
         chars_written = file.write(data)
@@ -91,13 +143,50 @@ def convertFile(infile:pfad, outfile: pfad)-> None:
         indata = readfile(infile)
         # Datei Konvertieren
         print(' umwandeln… ', end='')
-        outdata = konverter.konvertiere(indata)  # multithreading nötig?
+        outdata = get_konverter().konvertiere(indata)  # multithreading nötig?
         # Datei speichern
         print(' speichern… ', end='')
         writefile(outfile, outdata)
         print('fertig')
 
 
+def convertMulti(infile:pfad, outdir:pfad, allow_overwrite=False, pruefer=None)-> None:
+        # Datei mit mehreren Liedern: jedes Lied wird umgewandelt und gespeichert, sobald es gelesen ist.
+        # Mit einem pruefer (ImportChecker, -d) werden Lieder, die es schon gibt, übersprungen.
+        namen = set()
+        for lied in lieder_lesen(infile):
+            name = get_liedname(lied)
+            if pruefer is not None:
+                aehnliche = pruefer.check_text(lied)[:1]
+                for aehnlichkeit, vorhanden in aehnliche:
+                    print(infile.name + ': ' + name, ' ist ähnlich zu ', os.path.basename(vorhanden),
+                          ' ({:.0%}) und wird übersprungen.'.format(aehnlichkeit), file=sys.stderr)
+                if len(aehnliche) > 0:
+                    continue
+            for i in itertools.count(2):
+                if name not in namen:
+                    break
+                name = get_liedname(lied) + str(i)
+            namen.add(name)
+            outpath = build_path(outdir, name + outsuffix)
+            if not fileIsWriteable(outpath, allow_overwrite):
+                print(name + outsuffix, ' darf nicht überschrieben werden und wird übersprungen.', file=sys.stderr)
+                continue
+            print((infile.name + ': ' + name).rjust(30), ' umwandeln… ', end='')
+            try:
+                writefile(outpath, get_konverter().konvertiere(lied))
+                print('fertig')
+            except Exception as e:
+                print('FEHLER', e, file=sys.stderr)
+
+
+def convertRequest(anfrage:dict) -> str:
+    # Anfrage im Pipe-Modus (siehe Tools/ndjson.py): {"id": ..., "source": "Text des Liedes"}
+    if anfrage.get('format', 'tex') != 'tex':
+        raise ValueError('unbekanntes Format ' + str(anfrage['format']))
+    return get_konverter().konvertiere(anfrage['source'])
+
+
 def getInfiles(directory:pfad) -> Set[pfad]:
     return get_accessable(filter_suffix(get_files(get_dir_content(directory)), insuffixes), os.R_OK)
 
@@ -120,6 +209,10 @@ def fileIsWriteable(datei:pfad, allow_overwrite=False)->bool:
 
 
 if __name__== '__main__':
+    # Pipe-Modus: Lieder als JSON-Zeilen von stdin lesen, Ergebnisse auf stdout
+    if sys.argv[1:] == ['-p']:
+        sys.exit(1 if ndjson.serve(convertRequest) > 0 else 0)
+
     # Aufrufparameter lesen
     if len(sys.argv) >= 3:
         indir, outdir = sys.argv[-2:]
@@ -132,8 +225,13 @@ if __name__== '__main__':
         if len(sys.argv) > 3 and '-a' in sys.argv[1:-2]:
             # jede Datei soll konvertiert werden
             insuffixes.add('')
+        # Lieder, die es schon gibt (siehe find-duplicates.py), werden übersprungen
+        check_duplicates = len(sys.argv) > 3 and '-d' in sys.argv[1:-2]
+        # jede Datei enthält mehrere Lieder
+        multi = len(sys.argv) > 3 and '-m' in sys.argv[1:-2]
     else:
-        print('Benutzung: converter.py [-o] [-a] Eingabeverzeichnis Ausgabeverzeichnis', file=sys.stderr)
+        print('Benutzung: converter.py [-o] [-a] [-d] [-m] Eingabeverzeichnis Ausgabeverzeichnis', file=sys.stderr)
+        print('           converter.py -p  (JSON-Zeilen von stdin)', file=sys.stderr)
         sys.exit(1)
     if not (os.path.isdir(indir) and os.path.isdir(outdir)):
         raise Exception('dirctory not found')
@@ -141,10 +239,31 @@ if __name__== '__main__':
     # Dateien, die gelesen werden können
     infiles = getInfiles(indir)
 
+    pruefer = None
+    if check_duplicates:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+        from glob import glob
+        from pyralala.similarity import ImportChecker, check_imports
+        korpus = glob(os.path.join(liederPfad, '*.tex'))
+    if check_duplicates and multi:
+        # jedes Lied wird einzeln geprüft, sobald es gelesen ist (siehe convertMulti)
+        pruefer = ImportChecker(korpus)
+    elif check_duplicates:
+        duplikate = check_imports([f.path for f in infiles], korpus)
+        for infile in set(infiles):
+            for aehnlichkeit, lied in duplikate.get(infile.path, [])[:1]:
+                print(infile.name, ' ist ähnlich zu ', os.path.basename(lied),
+                      ' ({:.0%}). '.format(aehnlichkeit), infile.name, ' wird übersprungen.', file=sys.stderr)
+                infiles.discard(infile)
+
     # Konverter laden:
-    konverter = SongKonverter(templatePfad=templatePfad)
+    get_konverter()
     
     for infile in infiles:
+        if multi:
+            convertMulti(infile, outdir, overwrite, pruefer)
+            continue
+
         outfilename = get_outfilename(infile.name, outsuffix, insuffixes) # Dateiname für die Ausgabe
         outpath = build_path(outdir, outfilename)                         # Ausgabepfad 
 
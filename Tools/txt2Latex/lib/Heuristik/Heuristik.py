@@ -1,6 +1,7 @@
 # Heuristik.py
 # Dieses Skript bestimmt die Warscheinlichkeit, dass eine Zeile eine Textzeile, überschrift, etc ist.
 import re
+from chords import is_chord, is_chord_line
 
 _typen = dict(Überschrift='Überschrift', Leer='Leer', Akkordzeile='Akkordzeile', Textzeile='Textzeile',
               Info='Info', none=None)
@@ -8,9 +9,7 @@ _typen = dict(Überschrift='Überschrift', Leer='Leer', Akkordzeile='Akkordzeile
 # Alle attributnamen, die in der überschrift erlaubt sind.
 _Ueber_starts = set('ww wuw  jahr j  mel melodie weise  melj meljahr weisej weisejahr  txt worte text  txtj wortej wortejahr textj txtjahr textjahr  alb album  lager  tonart key  bo bock  pf1 pfi pf  pf2 pfii  pf3 pfiii  ju jurten jurtenburg  gruen grün gruenes grünes  kss4 kssiv kssiiii  siru  biest  eg evg  eg+ evg+ egplus evgplus'.split())
 
-# Regex - Ausdrücke, die für die erkennung gebraucht werden.
-akkord_zeilen_regex = r'( *([:|]+|(\(?([A-Ha-h](#|b)?(sus|dim|add|maj)?\d*)(\/([A-Ha-h](#|b)?(sus|dim|add|maj)?\d*))*\)?)))+ *'
-akkord_regex = r'(\(?([A-Ha-h](#|b)?(sus|dim|add|maj)?\d*)(\/([A-Ha-h](#|b)?(sus|dim|add|maj)?\d*))*\)?)'
+# Akkorde werden mit der gemeinsamen Grammatik in Tools/chords.py erkannt.
 # TODO: LABEL-Regex?
 
 
@@ -92,14 +91,14 @@ def p_Textzeile(line, lineNr, prev):
 
 def p_Akkordzeile(line, lineNr, prev):
     # prüfe, ob die zeile der Grammatik entspricht:
-    if re.fullmatch(akkord_zeilen_regex, line.replace('\n', '')) is not None:
+    if is_chord_line(line.replace('\n', '')):
         return 1
     # zerlege in zusammenhängenden text und prüfe, wie groß der Anteil an akkorden ist.
     parts = line.split(' ')
     korrekte = 0   # Anzahl erkannter Akkorde
     inkorrekte = 0 # Anzahl nicht als Akkord erkannter Wörter
     for pot_Akk in parts:
-        if re.fullmatch(akkord_regex, pot_Akk) is not None:
+        if is_chord(pot_Akk):
             korrekte += 1
         else: 
             inkorrekte += 1
@@ -134,6 +133,22 @@ def p_Ueberschrift(line, lineNr, prev):
     return p
 
 
+def ist_Liedanfang(block):
+    # block:     Zeilen zwischen zwei Leerzeilen
+    # Ausgabe:   True, falls der Block die Überschrift eines neuen Liedes ist:
+    #            Titel mit Alternativtitel (Titel [Alternativtitel]) oder Titel mit Metadaten (wuw: ...)
+    titel = block[0].strip()
+    if titel == '' or is_chord_line(titel) or ':' in titel:
+        return False
+    # Strophen und Refrains sind keine Überschriften
+    if re.match(r'^(\d+[).:]|ref(rain)?[).: ])', titel, re.IGNORECASE) is not None:
+        return False
+    if titel.count('[') == 1 and titel.count(']') == 1 and titel.endswith(']'):
+        return True
+    return len(block) > 1 and all(any(zeile.lower().startswith(start + ':') for start in _Ueber_starts)
+                                  for zeile in block[1:])
+
+
 def p_Information(line, lineNr, prev):
     l = line.lower().strip()
     if l.startswith('@info') or l.startswith('info ') or l.startswith('info:'): # Markierte Zeile
@@ -3,6 +3,9 @@ import os
 from typing import Tuple, Union, List, Dict, Collection
 import re
 import sys
+# gemeinsame Module in Tools/ (chords.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from chords import parse as parse_chord
 from lib.Heuristik.Heuristik import Heuristik
 from lib.texttype.texttype import texttype
 # Erlaubt das einfache Arbeiten mit texen zugeordneten daten
@@ -100,49 +103,22 @@ class SongLaTexttype(texttype):
         '''Konvertiert den Akkordstil
         im Moment werden nur Mollschreibweisen umgewandelt
         stil: 'l' oder 'm'
-        'l': e -> Em
-        'm': Em -> e'''
+        'l': Em -> e
+        'm': e -> Em'''
         if stil not in {'l', 'm'}:
             return akkord
-        akkorde = akkord.split('/')  # für Doppelakkorde, etc.
-        erg = []
-        for akk in akkorde:
-            if stil == 'l':
-                if 'm' in akkord.lower():  # Mollakkord im m - Schreibweise
-                    erg.append(akkord.lower().replace('m', ''))
-                else:
-                    erg.append(akk)
-
-            elif stil == 'm':
-                fund = re.search(
-                    r'(^\s*)([abcdefgh])([#b]*)(m?)([\S\s]*)', akk, flags=re.IGNORECASE)
-                if fund is None:
-                    # seltsamer Akkord... wir nehmen ihn so, wie er ist.
-                    print('WARNung: Akkord "'+akkord +
-                          '" kann nicht konvertiert werden.', file=sys.stderr)
-                    erg.append(akk)
-                    break
-                g = list(fund.groups())
-                # g[0] ist leerraum vor dem Akkord
-                # g[1] ist jetzt der Akkordbuchstabe
-                # g[2] der halbton (# oder b)
-                # g[3] 'm' falls Moll in M-schreibweise, sonst leer
-                # g[4] der Rest des Akkordes
-                if g[3].lower() == 'm':  # Mollakkord in m-Schreibweise: Nichts zu tun
-                    pass
-                elif g[1].islower():  # Akkord ist kleingeschrieben und in l-schreibweise, also Moll
-                    g[1] = g[1].upper()
-                    g[3] = 'm'
-                # Akkord ist großgeschrieben und in l-schreibweise, also Dur. Nichts zu tun.
-                elif g[1].isupper():
-                    pass
-                else:  # Es wurde kein Akkordbuchstabe gefunden. Konvertierung kann nicht stattfinden.
-                    print('WARNung: Akkord "' + akkord +
-                          '" kann nicht konvertiert werden.', file=sys.stderr)
-                    pass
-                erg.append(''.join(g))
-
-        return '/'.join(erg)
+        akk = parse_chord(akkord)
+        if akk is None:
+            # seltsamer Akkord... wir nehmen ihn so, wie er ist.
+            print('WARNung: Akkord "' + akkord + '" kann nicht konvertiert werden.', file=sys.stderr)
+            return akkord
+        if stil == 'l' and akk.minor and akk.root.isupper():
+            # Em -> e
+            akk = akk._replace(root=akk.root.lower(), quality=akk.quality[1:])
+        elif stil == 'm' and akk.minor and akk.root.islower():
+            # e -> Em
+            akk = akk._replace(root=akk.root.upper(), quality='m' + akk.quality)
+        return str(akk)
 
     
 
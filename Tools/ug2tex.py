@@ -1,14 +1,11 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import sys, re
-
-legit_chords = ["A","B","H","C","C#","D","D#","E","F","F#","G","G#"]
-legit_chords += [chord+"m" for chord in legit_chords]
-legit_chords += ["Cadd9","Dsus4","Dsus2"]
+from chords import is_chord
 
 def isChordLine(line):
     # criteria: more than half of the words are legit chords
-    chord_count = sum([c in legit_chords for c in line.split()])
+    chord_count = sum([is_chord(c) for c in line.split()])
     # sys.stderr.write("{} / {} chords are legit: {}\n".format(chord_count, len(line.split()), line))
     if chord_count > 0 and float(chord_count) / len(line.split()) > 0.5: 
         return True
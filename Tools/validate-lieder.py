@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+# Checks the song files for problems pdflatex or pyralala would fail on:
+# unknown commands, unbalanced verses/choruses/environments, \replay parts with
+# more ^ than memorized chords and malformed \beginsong options.
+#
+# All files are checked in parallel and every problem is reported with its
+# file and line number. Exits with 1 if any problem was found.
+
+import argparse
+import glob
+import os
+import sys
+
+from pyralala.validate import validate_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate song files.")
+    parser.add_argument("songs", nargs="*", help="Song files (default: Lieder/*.tex).")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of files checked concurrently.")
+    args = parser.parse_args()
+
+    songs = sorted(args.songs or glob.glob("Lieder/*.tex"))
+    issues = validate_files(songs, args.jobs)
+    for issue in issues:
+        print(issue)
+
+    files = len(set(issue.path for issue in issues))
+    print("{} songs checked, {} problems in {} files".format(len(songs), len(issues), files),
+          file=sys.stderr)
+    if len(issues) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()